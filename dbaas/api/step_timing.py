@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from rest_framework import viewsets, serializers, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from notification.models import TaskStepTiming, REPORT_DAYS
+
+FILTER_FIELDS = ('step', 'engine', 'topology', 'outcome')
+
+
+def filter_timings(params):
+    try:
+        days = int(params.get('days', REPORT_DAYS))
+    except ValueError:
+        days = REPORT_DAYS
+
+    filters = dict((field, params.get(field)) for field in FILTER_FIELDS)
+    return TaskStepTiming.recent(days=days, **filters)
+
+
+class StepTimingSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = TaskStepTiming
+        fields = (
+            'id',
+            'task',
+            'step',
+            'instance',
+            'engine',
+            'topology',
+            'undo',
+            'started_at',
+            'ended_at',
+            'duration',
+            'outcome',
+        )
+
+
+class StepTimingAPI(viewsets.ReadOnlyModelViewSet):
+
+    """
+    Step Timing API
+
+    Filters: step, engine, topology, outcome and days (default 30)
+    """
+
+    model = TaskStepTiming
+    serializer_class = StepTimingSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+
+    def get_queryset(self):
+        return filter_timings(self.request.GET)
+
+
+class StepTimingSummaryAPI(APIView):
+
+    """
+    Count, failures, p50, p95 and max duration in seconds of each step
+
+    Filters: step, engine, topology, outcome and days (default 30)
+    """
+
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+
+    def get(self, request, format=None):
+        return Response(
+            TaskStepTiming.summary(filter_timings(request.GET))
+        )
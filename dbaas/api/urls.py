@@ -16,6 +16,7 @@ from .task import TaskAPI
 from .team import TeamAPI
 from .user import UserAPI
 from .snapshot import SnapshotAPI
+from .step_timing import StepTimingAPI, StepTimingSummaryAPI
 
 
 router = DefaultRouter()
@@ -33,6 +34,12 @@ router.register(r'database', DatabaseAPI)
 router.register(r'credential', CredentialAPI)
 router.register(r'extra_dns', ExtraDnsAPI)
 router.register(r'task', TaskAPI, base_name="task")
+router.register(r'step_timing', StepTimingAPI, base_name="step_timing")
+urlpatterns += patterns(
+    '',
+    url(r'^step_timing_summary/$', StepTimingSummaryAPI.as_view(),
+        name='step_timing_summary'),
+)
 
 if settings.CLOUD_STACK_ENABLED:
     from .integration_type import CredentialTypeAPI
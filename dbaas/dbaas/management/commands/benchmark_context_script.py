@@ -0,0 +1,79 @@
+from __future__ import print_function
+import os
+import time
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from util import build_context_script, TEMPLATE_CACHE
+
+SCRIPTS_PATH = os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', 'physical', 'scripts'
+)
+DEPLOY_SCRIPTS = (
+    'mongodb_initialization.sh',
+    'mongodb_34_configuration.sh',
+    'mongodb_start_database.sh',
+    'mongodb_start_replication.sh',
+)
+MAINTENANCE_SCRIPT = 'mongodb_34_configuration.sh'
+
+
+def read_script(file_name):
+    with open(os.path.join(SCRIPTS_PATH, file_name)) as f:
+        return f.read()
+
+
+def render_without_cache(contextdict, script):
+    script = script.replace('\r', '')
+    return Template(script).render(Context(contextdict))
+
+
+class Command(BaseCommand):
+
+    '''
+        Compares the cost of rendering workflow scripts compiling the
+        template on every render and with the compiled template cache.
+        Usage: python manage.py benchmark_context_script
+    '''
+
+    def scenario(self, name, renders):
+        for label, render in (
+            ('without cache', render_without_cache),
+            ('with cache', build_context_script),
+        ):
+            TEMPLATE_CACHE.clear()
+            started_at = time.time()
+            for contextdict, script in renders:
+                render(contextdict, script)
+            elapsed = time.time() - started_at
+
+            print('{}: {} renders {}: {:.2f}ms total, {:.3f}ms per '
+                  'render'.format(name, len(renders), label, elapsed * 1000,
+                                  elapsed * 1000 / len(renders)))
+
+    def context(self, number):
+        return {
+            'HOSTADDRESS': '10.0.0.{}'.format(number % 250),
+            'PORT': 27017,
+            'DBPASSWORD': 'password',
+            'HOST': 'host-{:03d}'.format(number),
+            'ENGINE': 'mongodb',
+            'DATABASENAME': 'database',
+            'ONLY_ONE_VM': False,
+            'REPLICASETNAME': 'ReplicaSet_database',
+            'MONGODBKEY': 'key',
+            'IS_HA': True,
+        }
+
+    def handle(self, *args, **options):
+        deploy = [
+            (self.context(number), read_script(script))
+            for number in range(3) for script in DEPLOY_SCRIPTS
+        ]
+        self.scenario('3 node deploy', deploy)
+
+        maintenance_script = read_script(MAINTENANCE_SCRIPT)
+        maintenance = [
+            (self.context(number), maintenance_script)
+            for number in range(500)
+        ]
+        self.scenario('500 host maintenance', maintenance)
@@ -302,6 +302,21 @@ CACHES = {
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         }
+    },
+    "configuration": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://{}{}:{}/2".format(
+            ':' + REDIS_PASSWORD + '@' if REDIS_PASSWORD else '',
+            REDIS_HOST,
+            os.getenv('DBAAS_NOTIFICATION_BROKER_PORT', '6379')),
+        "TIMEOUT": int(os.getenv('DBAAS_CONFIGURATION_CACHE_TIMEOUT', '3600')),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "SOCKET_CONNECT_TIMEOUT": int(
+                os.getenv('DBAAS_CONFIGURATION_CACHE_CONNECT_TIMEOUT', '2')),
+            "SOCKET_TIMEOUT": int(
+                os.getenv('DBAAS_CONFIGURATION_CACHE_SOCKET_TIMEOUT', '2')),
+        }
     }
 }
 
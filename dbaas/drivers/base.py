@@ -1,14 +1,32 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 import logging
+import time
+from django.core.cache import cache
 from django.utils.translation import ugettext_lazy as _
 from django_services.service.exceptions import InternalException
+from util.cache import LRUCache
 
 LOG = logging.getLogger(__name__)
 
 __all__ = ['GenericDriverError', 'ConnectionError',
            'AuthenticationError', 'DatabaseAlreadyExists', 'CredentialAlreadyExists', 'InvalidCredential',
-           'BaseDriver', 'DatabaseStatus', 'DatabaseInfraStatus', 'DatabaseDoesNotExist']
+           'BaseDriver', 'DatabaseStatus', 'DatabaseInfraStatus', 'DatabaseDoesNotExist',
+           'TopologySnapshot', 'invalidate_endpoints']
+
+TOPOLOGY_CACHE_TIMEOUT = 10  # seconds
+SWITCH_REPLICATION_DEADLINE = 1000  # seconds, it used to be 100 checks 10s apart
+SWITCH_MASTER_DEADLINE = 50
+
+# Connection strings built from the instances of each databaseinfra. Saving
+# an instance or databaseinfra clears them in this process, other processes
+# rebuild them after ENDPOINT_CACHE_TIMEOUT seconds
+ENDPOINT_CACHE = LRUCache(max_size=1024)
+ENDPOINT_CACHE_TIMEOUT = 60
+
+
+def invalidate_endpoints(databaseinfra_id):
+    ENDPOINT_CACHE.delete(databaseinfra_id)
 
 
 class GenericDriverError(InternalException):
@@ -77,6 +95,9 @@ class BaseDriver(object):
     # must be overwritten by subclasses
     default_port = 0
 
+    # seconds a replica may be behind for master to be switched to it
+    max_switch_lag = 0
+
     def __init__(self, *args, **kwargs):
 
         if 'databaseinfra' in kwargs:
@@ -85,6 +106,21 @@ class BaseDriver(object):
         else:
             raise TypeError(_("DatabaseInfra is not defined"))
 
+    def cached_endpoint(self, name, build):
+        """ Value of build, kept in ENDPOINT_CACHE under name """
+        databaseinfra_id = self.databaseinfra.pk
+        if not databaseinfra_id:
+            return build()
+
+        entry = ENDPOINT_CACHE.get(databaseinfra_id)
+        if entry is None or entry['expires_at'] < time.time():
+            entry = {'expires_at': time.time() + ENDPOINT_CACHE_TIMEOUT}
+            ENDPOINT_CACHE.set(databaseinfra_id, entry)
+
+        if name not in entry:
+            entry[name] = build()
+        return entry[name]
+
     @property
     def replication_topology(self):
         return self.databaseinfra.plan.replication_topology
@@ -186,6 +222,19 @@ class BaseDriver(object):
     def get_replication_info(self, instance):
         raise NotImplementedError()
 
+    def get_replication_lags(self, instances):
+        """ Seconds each instance is behind master. Drivers able to read
+        every member in one call should override it """
+        return dict(
+            (instance, self.get_replication_info(instance))
+            for instance in instances
+        )
+
+    def get_switch_lag(self, instance):
+        """ Seconds the switch from instance has to wait for replication,
+        None when unknown """
+        return self.get_replication_info(instance)
+
     def is_replication_ok(self, instance):
         raise NotImplementedError()
 
@@ -204,28 +253,64 @@ class BaseDriver(object):
             driver_name) else None for instance in self.databaseinfra.instances.all()]
         return filter(None, instances)
 
-    def get_master_instance(self, ):
+    def topology_cache_key(self):
+        return 'topology:%d' % self.databaseinfra.pk
+
+    def get_topology(self, force_refresh=False):
+        """ Master, replicas and replication lag of the databaseinfra. The
+        snapshot is cached for a few seconds, so pages and steps asking
+        for the master do not connect to every instance each time """
         instances = self.get_database_instances()
+        if not self.databaseinfra.pk:
+            return self.build_topology(instances)
+
+        key = self.topology_cache_key()
+        state = None if force_refresh else cache.get(key)
+        if state is not None:
+            return TopologySnapshot.from_state(state, instances)
+
+        topology = self.build_topology(instances)
+        if topology.master is None:
+            # Probably an election going on, ask again next time
+            return topology
+
+        from system.models import Configuration
+        timeout = Configuration.get_by_name_as_int(
+            'topology_cache_timeout', default=TOPOLOGY_CACHE_TIMEOUT
+        )
+        cache.set(key, topology.to_state(), timeout)
+        return topology
 
+    def build_topology(self, instances):
+        """ Asks each instance whether it is the master. Drivers able to
+        read the whole topology in one call should override it """
+        master = None
         for instance in instances:
             try:
                 if self.check_instance_is_master(instance):
-                    return instance
+                    master = instance
+                    break
             except ConnectionError:
                 continue
 
-        return None
+        return TopologySnapshot(
+            master=master,
+            replicas=[instance for instance in instances if instance != master]
+        )
 
-    def get_slave_instances(self, ):
-        instances = self.get_database_instances()
-        master = self.get_master_instance()
+    def invalidate_topology(self):
+        if self.databaseinfra.pk:
+            cache.delete(self.topology_cache_key())
+
+    def get_master_instance(self, force_refresh=False):
+        return self.get_topology(force_refresh).master
 
-        try:
-            instances.remove(master)
-        except ValueError:
+    def get_slave_instances(self, force_refresh=False):
+        topology = self.get_topology(force_refresh)
+        if topology.master is None:
             raise Exception("Master could not be detected")
 
-        return instances
+        return list(topology.replicas)
 
     def start_slave(self, instance):
         pass
@@ -252,27 +337,42 @@ class BaseDriver(object):
                 )
             )
 
-    def check_replication_and_switch(self, instance, attempts=100, check_is_master_attempts=5):
-        from time import sleep
-        for attempt in range(0, attempts):
-            if self.is_replication_ok(instance):
-                self.switch_master()
-                LOG.info("Switch master returned ok...")
+    def check_replication_and_switch(
+            self, instance, deadline=SWITCH_REPLICATION_DEADLINE,
+            switch_deadline=SWITCH_MASTER_DEADLINE):
+        """
+        Waits for replication to catch up, switches master and waits for
+        instance to stop being master. Returns how long, in seconds, each
+        of the waits took.
+        """
+        from util.waiter import wait_for_lag, wait_until
 
-                check_is_master_attempts_count = check_is_master_attempts
-                while self.check_instance_is_master(instance):
-                    if check_is_master_attempts_count == 0:
-                        break
-                    check_is_master_attempts_count -= 1
-                    sleep(10)
-                else:
-                    return
+        replication = wait_for_lag(
+            lambda: self.get_switch_lag(instance), self.max_switch_lag,
+            deadline
+        )
+        LOG.info("Waited %.1fs for replication of %s, %s checks, lag %s",
+                 replication.waited, instance, replication.attempts,
+                 replication.value)
+        if not replication:
+            raise Exception(
+                "Could not switch master because of replication's delay"
+            )
+
+        self.switch_master()
+        LOG.info("Switch master returned ok...")
 
-                raise Exception("Could not change master")
+        switch = wait_until(
+            lambda: not self.check_instance_is_master(instance),
+            switch_deadline
+        )
+        LOG.info("Waited %.1fs for %s to stop being master",
+                 switch.waited, instance)
+        if not switch:
+            raise Exception("Could not change master")
 
-            LOG.info("Waiting 10s to check replication...")
-            sleep(10)
-        raise Exception("Could not switch master because of replication's delay")
+        self.invalidate_topology()
+        return {'replication': replication.waited, 'switch': switch.waited}
 
     def get_database_agents(self):
         """ Returns database agents list"""
@@ -317,6 +417,45 @@ class BaseDriver(object):
         return self.configuration_parameters(instance)
 
 
+class TopologySnapshot(object):
+
+    """ Master, replicas and seconds behind master of the replicas of a
+    databaseinfra, read at the same time """
+
+    def __init__(self, master=None, replicas=None, lag=None):
+        self.master = master
+        self.replicas = replicas or []
+        self.lag = lag or {}
+
+    def is_master(self, instance):
+        return self.master is not None and self.master.pk == instance.pk
+
+    def get_lag(self, instance):
+        """ Seconds instance is behind master, None when unknown """
+        if self.is_master(instance):
+            return 0
+        return self.lag.get(instance.pk)
+
+    def to_state(self):
+        """ Only ids are cached, instances are loaded again on reading """
+        return {
+            'master': self.master.pk if self.master else None,
+            'replicas': [instance.pk for instance in self.replicas],
+            'lag': self.lag,
+        }
+
+    @classmethod
+    def from_state(cls, state, instances):
+        by_id = dict((instance.pk, instance) for instance in instances)
+        return cls(
+            master=by_id.get(state['master']),
+            replicas=[
+                by_id[pk] for pk in state['replicas'] if pk in by_id
+            ],
+            lag=state['lag'],
+        )
+
+
 class DatabaseStatus(object):
 
     def __init__(self, database_model):
@@ -5,6 +5,9 @@ import re
 
 __all__ = ['DriverFactory']
 
+# driver class of each engine type name
+DRIVER_CLASSES = {}
+
 
 class DriverFactory(object):
 
@@ -19,6 +22,12 @@ class DriverFactory(object):
     @classmethod
     def get_driver_class(cls, driver_name):
         driver_name = driver_name.lower()
+        if driver_name not in DRIVER_CLASSES:
+            DRIVER_CLASSES[driver_name] = cls.__find_driver_class(driver_name)
+        return DRIVER_CLASSES[driver_name]
+
+    @classmethod
+    def __find_driver_class(cls, driver_name):
         # TODO: import Engines dynamically
         if re.match(r'^mongo.*', driver_name):
             from .mongodb import MongoDB
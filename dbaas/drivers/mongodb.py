@@ -9,15 +9,17 @@ from . import DatabaseInfraStatus
 from . import DatabaseStatus
 from . import AuthenticationError
 from . import ConnectionError
+from . import TopologySnapshot
+from .pool import POOL_REGISTRY, pool_key
 from physical.models import Instance
 from util import make_db_random_password
 from system.models import Configuration
-from dateutil import tz
 
 LOG = logging.getLogger(__name__)
 
 CLONE_DATABASE_SCRIPT_NAME = "mongodb_clone.sh"
 MONGO_CONNECTION_DEFAULT_TIMEOUT = 5
+MAX_REPLICATION_LAG = 2  # seconds
 
 
 class MongoDB(BaseDriver):
@@ -26,6 +28,8 @@ class MongoDB(BaseDriver):
 
     RESERVED_DATABASES_NAME = ['admin', 'config', 'local']
 
+    max_switch_lag = MAX_REPLICATION_LAG
+
     def get_replica_name(self):
         """ Get replica name from databaseinfra. Use cache """
         if not self.databaseinfra.pk:
@@ -52,19 +56,33 @@ class MongoDB(BaseDriver):
 
         return repl_name
 
+    def __connection_instances(self):
+        return self.databaseinfra.instances.filter(
+            instance_type=Instance.MONGODB, is_active=True, read_only=False
+        ).all()
+
     def __concatenate_instances(self):
-        return ",".join(["%s:%s" % (instance.address, instance.port)
-                         for instance in self.databaseinfra.instances.filter(instance_type=Instance.MONGODB, is_active=True, read_only=False).all()])
+        return self.cached_endpoint('instances', lambda: ",".join(
+            ["%s:%s" % (instance.address, instance.port)
+                for instance in self.__connection_instances()]
+        ))
 
     def __concatenate_instances_dns(self):
-        return ",".join(
+        return self.cached_endpoint('instances_dns', lambda: ",".join(
             ["%s:%s" % (instance.dns, instance.port)
-                for instance in self.databaseinfra.instances.filter(instance_type=Instance.MONGODB, is_active=True, read_only=False).all() if not instance.dns.startswith('10.')]
-        )
+                for instance in self.__connection_instances() if not instance.dns.startswith('10.')]
+        ))
 
     def __concatenate_instances_dns_only(self):
-        return ",".join(["%s" % (instance.dns)
-                         for instance in self.databaseinfra.instances.filter(instance_type=Instance.MONGODB, is_active=True, read_only=False).all() if not instance.dns.startswith('10.')])
+        return self.cached_endpoint('dns', lambda: ",".join(
+            ["%s" % (instance.dns)
+                for instance in self.__connection_instances() if not instance.dns.startswith('10.')]
+        ))
+
+    def __is_replica_set(self):
+        return self.cached_endpoint(
+            'is_replica_set', lambda: self.databaseinfra.instances.count() > 1
+        )
 
     def get_dns_port(self):
         port = self.databaseinfra.instances.filter(
@@ -77,7 +95,7 @@ class MongoDB(BaseDriver):
         if database:
             uri = "%s/%s" % (uri, database.name)
 
-        if (len(self.databaseinfra.instances.all()) > 1):
+        if self.__is_replica_set():
             repl_name = self.get_replica_name()
             if repl_name:
                 uri = "%s?replicaSet=%s" % (uri, repl_name)
@@ -92,14 +110,14 @@ class MongoDB(BaseDriver):
                 instances=self.__concatenate_instances()
             )
 
-            if (len(self.databaseinfra.instances.all()) > 1):
+            if self.__is_replica_set():
                 repl_name = self.get_replica_name()
                 if repl_name:
                     uri = "%s?replicaSet=%s" % (uri, repl_name)
         else:
             uri = "{instances}".format(instances=self.__concatenate_instances())
 
-            if (len(self.databaseinfra.instances.all()) > 1):
+            if self.__is_replica_set():
                 repl_name = self.get_replica_name()
                 if repl_name:
                     uri = "{repl_name}/{uri}".format(
@@ -117,7 +135,7 @@ class MongoDB(BaseDriver):
         if database:
             uri = "%s/%s" % (uri, database.name)
 
-        if (len(self.databaseinfra.instances.all()) > 1):
+        if self.__is_replica_set():
             repl_name = self.get_replica_name()
             if repl_name:
                 uri = "%s?replicaSet=%s" % (uri, repl_name)
@@ -162,15 +180,19 @@ class MongoDB(BaseDriver):
 
     @contextmanager
     def pymongo(self, instance=None, database=None):
-        client = None
         try:
-            client = self.__mongo_client__(instance)
-
-            if database is None:
-                return_value = client
-            else:
-                return_value = getattr(client, database.name)
-            yield return_value
+            with POOL_REGISTRY.connection(
+                key=pool_key(self.databaseinfra, instance),
+                factory=lambda: self.__mongo_client__(instance),
+                close=self.__close_client,
+                health_check=lambda client: client.admin.command('ping'),
+                discard_on=(pymongo.errors.ConnectionFailure,)
+            ) as client:
+                if database is None:
+                    return_value = client
+                else:
+                    return_value = getattr(client, database.name)
+                yield return_value
         except pymongo.errors.OperationFailure, e:
             if e.code == 18:
                 raise AuthenticationError('Invalid credentials to databaseinfra %s: %s' %
@@ -180,13 +202,10 @@ class MongoDB(BaseDriver):
         except pymongo.errors.PyMongoError, e:
             raise ConnectionError('Error connecting to databaseinfra %s (%s): %s' %
                                   (self.databaseinfra, self.__get_admin_connection(), e.message))
-        finally:
-            try:
-                if client:
-                    client.close()
-            except:
-                LOG.warn('Error disconnecting from databaseinfra %s. Ignoring...',
-                         self.databaseinfra, exc_info=True)
+
+    def __close_client(self, client):
+        LOG.debug('Disconnecting mongodb databaseinfra %s', self.databaseinfra)
+        client.close()
 
     def check_status(self, instance=None):
         with self.pymongo(instance=instance) as client:
@@ -214,6 +233,8 @@ class MongoDB(BaseDriver):
                     'Error connection to databaseinfra %s: %s' % (self.databaseinfra, e.message))
 
     def info(self):
+        """ Collects version, sizes and liveness using one connection, one
+        listDatabases and one dbStats per existing database """
         databaseinfra_status = DatabaseInfraStatus(
             databaseinfra_model=self.databaseinfra)
 
@@ -226,18 +247,19 @@ class MongoDB(BaseDriver):
             databaseinfra_status.used_size_in_bytes = json_list_databases.get(
                 'totalSize', 0)
 
-            list_databases = self.list_databases()
+            list_databases = set(
+                db['name'] for db in json_list_databases['databases']
+            )
             for database in self.databaseinfra.databases.all():
                 database_name = database.name
-                json_db_status = getattr(
-                    client, database_name).command('dbStats')
                 db_status = DatabaseStatus(database)
-                # is_alive?
-                try:
-                    if self.check_status() and (database_name in list_databases):
-                        db_status.is_alive = True
-                except:
-                    pass
+
+                json_db_status = {}
+                if database_name in list_databases:
+                    # listDatabases answered, so the databaseinfra is alive
+                    db_status.is_alive = True
+                    json_db_status = getattr(
+                        client, database_name).command('dbStats')
 
                 storageSize = json_db_status.get("storageSize") or 0
                 db_status.used_size_in_bytes = storageSize
@@ -318,58 +340,122 @@ class MongoDB(BaseDriver):
                 raise ConnectionError(
                     'Error connection to databaseinfra %s: %s' % (self.databaseinfra, e.message))
 
-    def get_replication_info(self, instance):
-        if self.check_instance_is_master(instance=instance):
-            return 0
+    def member_name(self, instance):
+        return "{}:{}".format(instance.address, instance.port)
 
+    def get_replica_set_status(self):
+        """
+        State and seconds behind primary of every member, keyed by
+        address:port, from one replSetGetStatus. Lag is None when the set
+        has no primary.
+        """
         with self.pymongo() as client:
+            members = client.admin.command('replSetGetStatus')['members']
+
+        primary_optime = None
+        for member in members:
+            if member['stateStr'] == 'PRIMARY':
+                primary_optime = member['optimeDate']
+
+        status = {}
+        for member in members:
+            lag = None
+            if primary_optime is not None and 'optimeDate' in member:
+                delay = primary_optime - member['optimeDate']
+                lag = delay.days * 24 * 3600 + delay.seconds
+            status[member['name']] = {
+                'id': member['_id'],
+                'state': member['stateStr'],
+                'lag': lag,
+            }
+        return status
+
+    def get_replication_lags(self, instances):
+        """ Seconds each instance is behind primary, from one
+        replSetGetStatus """
+        status = self.get_replica_set_status()
+        return dict(
+            (instance, self.__member_lag(instance, status))
+            for instance in instances
+        )
 
-            replSetGetStatus = client.admin.command('replSetGetStatus')
-            primary_opttime = None
-            for member in replSetGetStatus['members']:
-                if member['stateStr'] == 'PRIMARY':
-                    primary_opttime = member['optimeDate'].replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
-
-            if primary_opttime is None:
-                raise Exception("There is not any Primary in the Replica Set")
+    def __member_lag(self, instance, status):
+        member = status.get(self.member_name(instance))
+        if member is None:
+            raise Exception("Could not find the instance in the Replica Set")
+        if member['state'] == 'PRIMARY':
+            return 0
+        if member['lag'] is None:
+            raise Exception("There is not any Primary in the Replica Set")
+
+        LOG.info("The instance {} is {} seconds behind Primary".format(
+            instance, member['lag']
+        ))
+        if member['lag'] == 0 and member['state'] != 'SECONDARY':
+            LOG.info("The instance {} is 0 seconds behind Primary, but it is not Secondary. It is {}".format(instance, member['state']))
+            return 100000
 
-            instance_opttime = None
-            for member in replSetGetStatus['members']:
-                if member["name"] == "{}:{}".format(instance.address, instance.port):
-                    instance_opttime = member['optimeDate'].replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
-                    instance_member = member
+        return member['lag']
 
-            if instance_opttime is None:
-                raise Exception("Could not find the instance in the Replica Set")
+    def build_topology(self, instances):
+        """ Reads master, replicas and lag from one replSetGetStatus """
+        if self.databaseinfra.instances.count() == 1:
+            return super(MongoDB, self).build_topology(instances)
 
-        delay = primary_opttime - instance_opttime
-        seconds_delay = delay.days * 24 * 3600 + delay.seconds
-        LOG.info("The instance {} is {} seconds behind Primary".format(instance, seconds_delay))
+        try:
+            status = self.get_replica_set_status()
+        except ConnectionError as e:
+            LOG.warning("Could not get replica set status of %s: %s",
+                        self.databaseinfra, e)
+            return super(MongoDB, self).build_topology(instances)
+
+        master, lag = None, {}
+        for instance in instances:
+            member = status.get(self.member_name(instance))
+            if member is None:
+                continue
+            if member['state'] == 'PRIMARY':
+                master = instance
+            elif member['state'] == 'SECONDARY' and member['lag'] is not None:
+                lag[instance.pk] = member['lag']
+
+        return TopologySnapshot(
+            master=master,
+            replicas=[instance for instance in instances if instance != master],
+            lag=lag
+        )
 
-        if seconds_delay == 0 and instance_member["stateStr"] not in ["PRIMARY", "SECONDARY"]:
-            LOG.info("The instance {} is 0 seconds behind Primary, but it is not Secondary. It is {}".format(instance, instance_member["stateStr"]))
-            return 100000
+    def get_replication_info(self, instance):
+        if self.databaseinfra.instances.count() == 1:
+            return 0
 
-        return seconds_delay
+        return self.get_replication_lags([instance])[instance]
 
     def get_max_replica_id(self, ):
-        with self.pymongo() as client:
-            replSetGetStatus = client.admin.command('replSetGetStatus')
-            max_id = 0
-            for member in replSetGetStatus['members']:
-                repl_id = member["_id"]
-                if repl_id > max_id:
-                    max_id = repl_id
-            return max_id
+        return max([0] + [
+            member['id'] for member in self.get_replica_set_status().values()
+        ])
 
-    def is_replication_ok(self, instance):
-        if self.check_instance_is_master(instance=instance):
-            return True
+    def get_switch_lag(self, instance):
+        """ A primary can step down when a secondary is caught up, so its
+        lag is the one of the most up to date secondary """
+        if self.databaseinfra.instances.count() == 1:
+            return 0
 
-        if self.get_replication_info(instance=instance) <= 2:
-            return True
+        status = self.get_replica_set_status()
+        member = status.get(self.member_name(instance))
+        if member and member['state'] == 'PRIMARY':
+            lags = [
+                other['lag'] for other in status.values()
+                if other['state'] == 'SECONDARY' and other['lag'] is not None
+            ]
+            return min(lags) if lags else None
+
+        return self.__member_lag(instance, status)
 
-        return False
+    def is_replication_ok(self, instance):
+        lag = self.get_switch_lag(instance)
+        return lag is not None and lag <= self.max_switch_lag
 
     def initialization_script_path(self, host=None):
         return "/etc/init.d/mongodb {option}"
@@ -386,6 +472,8 @@ class MongoDB(BaseDriver):
             client.admin.command('replSetStepDown', 10)
         except pymongo.errors.AutoReconnect, e:
             pass
+        finally:
+            self.invalidate_topology()
 
     def get_database_agents(self):
         return []
@@ -15,6 +15,7 @@ from . import InvalidCredential
 from . import DatabaseStatus
 from . import DatabaseDoesNotExist
 from . import CredentialAlreadyExists
+from .pool import POOL_REGISTRY, pool_key
 from util import make_db_random_password
 from system.models import Configuration
 from physical.models import Instance
@@ -97,9 +98,15 @@ class MySQL(BaseDriver):
 
     @contextmanager
     def mysqldb(self, instance=None, database=None):
-        client = None
         try:
-            yield self.__mysql_client__(instance)
+            with POOL_REGISTRY.connection(
+                key=pool_key(self.databaseinfra, instance),
+                factory=lambda: self.__mysql_client__(instance),
+                close=self.__close_client,
+                health_check=lambda client: client.ping(),
+                shared=False
+            ) as client:
+                yield client
         except _mysql_exceptions.OperationalError as e:
             if e.args[0] == ER_ACCESS_DENIED_ERROR:
                 raise AuthenticationError(e.args[1])
@@ -109,85 +116,76 @@ class MySQL(BaseDriver):
                 raise ConnectionError(e.args[1])
             else:
                 raise GenericDriverError(e.args)
-        finally:
-            try:
-                if client:
-                    LOG.debug(
-                        'Disconnecting mysql databaseinfra %s', self.databaseinfra)
-                    client.close()
-            except:
-                LOG.warn('Error disconnecting from databaseinfra %s. Ignoring...',
-                         self.databaseinfra, exc_info=True)
+
+    def __close_client(self, client):
+        LOG.debug('Disconnecting mysql databaseinfra %s', self.databaseinfra)
+        client.close()
 
     def __query(self, query_string, instance=None):
         with self.mysqldb(instance=instance) as client:
-            try:
-                LOG.debug("query_string: %s" % query_string)
-                client.query(query_string)
-                r = client.store_result()
-                if r is not None:
-                    return r.fetch_row(maxrows=0, how=1)
-            except _mysql_exceptions.ProgrammingError as e:
-                LOG.error("__query ProgrammingError: %s" % e)
-                if e.args[0] == ER_DB_CREATE_EXISTS:
-                    raise DatabaseAlreadyExists(e.args[1])
-                else:
-                    raise GenericDriverError(e.args)
-            except _mysql_exceptions.OperationalError as e:
-                LOG.error("__query OperationalError: %s" % e)
-                if e.args[0] == ER_DB_DROP_EXISTS:
-                    raise DatabaseDoesNotExist(e.args[1])
-                elif e.args[0] == ER_CANNOT_USER:
-                    raise InvalidCredential(e.args[1])
-                elif e.args[0] == ER_WRONG_STRING_LENGTH:
-                    raise InvalidCredential(e.args[1])
-                else:
-                    raise GenericDriverError(e.args)
-            except Exception as e:
-                GenericDriverError(e.args)
+            return self.__execute(client, query_string)
+
+    def __execute(self, client, query_string):
+        try:
+            LOG.debug("query_string: %s" % query_string)
+            client.query(query_string)
+            r = client.store_result()
+            if r is not None:
+                return r.fetch_row(maxrows=0, how=1)
+        except _mysql_exceptions.ProgrammingError as e:
+            LOG.error("__query ProgrammingError: %s" % e)
+            if e.args[0] == ER_DB_CREATE_EXISTS:
+                raise DatabaseAlreadyExists(e.args[1])
+            else:
+                raise GenericDriverError(e.args)
+        except _mysql_exceptions.OperationalError as e:
+            LOG.error("__query OperationalError: %s" % e)
+            if e.args[0] == ER_DB_DROP_EXISTS:
+                raise DatabaseDoesNotExist(e.args[1])
+            elif e.args[0] == ER_CANNOT_USER:
+                raise InvalidCredential(e.args[1])
+            elif e.args[0] == ER_WRONG_STRING_LENGTH:
+                raise InvalidCredential(e.args[1])
+            else:
+                raise GenericDriverError(e.args)
+        except Exception as e:
+            GenericDriverError(e.args)
 
     def query(self, query_string, instance=None):
         return self.__query(query_string, instance)
 
     def info(self):
-        from logical.models import Database
-
+        """ Collects version and sizes using a single mysql session. Answering
+        the queries is the liveness check of the databaseinfra """
         databaseinfra_status = DatabaseInfraStatus(
             databaseinfra_model=self.databaseinfra)
 
-        r = self.__query("SELECT VERSION()")
-        databaseinfra_status.version = r[0]['VERSION()']
+        with self.mysqldb() as client:
+            r = self.__execute(client, "SELECT VERSION()")
+            databaseinfra_status.version = r[0]['VERSION()']
 
-        my_all_dbs = self.__query("SHOW DATABASES")
-        db_sizes = self.__query("SELECT s.schema_name 'Database', ifnull(SUM( t.data_length + t.index_length), 0) 'Size' \
-                                FROM information_schema.SCHEMATA s \
-                                  left outer join information_schema.TABLES t on s.schema_name = t.table_schema \
-                                GROUP BY s.schema_name")
+            list_databases = set(
+                result["Database"]
+                for result in self.__execute(client, "SHOW DATABASES")
+            )
+            db_sizes = self.__execute(client, "SELECT s.schema_name 'Database', ifnull(SUM( t.data_length + t.index_length), 0) 'Size' \
+                                    FROM information_schema.SCHEMATA s \
+                                      left outer join information_schema.TABLES t on s.schema_name = t.table_schema \
+                                    GROUP BY s.schema_name")
 
         all_dbs = {}
         for database in db_sizes:
             all_dbs[database['Database']] = int(database['Size'])
 
-        list_databases = self.list_databases()
+        database_models = {
+            database.name: database
+            for database in self.databaseinfra.databases.all()
+        }
         for database_name in all_dbs.keys():
-            database_model = None
-            try:
-                # LOG.debug("checking status for database %s" % database_name)
-                database_model = Database.objects.get(
-                    name=database_name, databaseinfra=self.databaseinfra)
-            except Database.DoesNotExist:
-                pass
-
+            database_model = database_models.get(database_name)
             if database_model:
                 db_status = DatabaseStatus(database_model)
-                # is_alive?
-                try:
-                    if self.check_status() and (database_name in list_databases):
-                        db_status.is_alive = True
-                except Exception as e:
-                    LOG.warning(
-                        "could not retrieve db status for %s: %s" % (database_name, e))
-
+                db_status.is_alive = database_name in list_databases
                 db_status.total_size_in_bytes = 0
                 db_status.used_size_in_bytes = all_dbs[database_name]
 
@@ -319,7 +317,10 @@ class MySQL(BaseDriver):
         return '/data/data/'
 
     def switch_master(self):
-        return self.replication_topology_driver.switch_master(driver=self)
+        try:
+            return self.replication_topology_driver.switch_master(driver=self)
+        finally:
+            self.invalidate_topology()
 
     def start_slave(self, instance):
         client = self.get_client(instance)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from util.pool import ConnectionPoolRegistry, credentials_hash
+
+__all__ = ['ConnectionPoolRegistry', 'POOL_REGISTRY', 'pool_key',
+           'credentials_hash']
+
+
+def pool_key(databaseinfra, instance=None):
+    """ Key used to share connections: (databaseinfra, instance, credentials).
+    Returns None when the databaseinfra is not persisted, which disables
+    pooling for that connection """
+    if not databaseinfra or not databaseinfra.pk:
+        return None
+
+    instance_id = instance.pk if instance else None
+    return (
+        databaseinfra.pk,
+        instance_id,
+        credentials_hash(databaseinfra.user, databaseinfra.password)
+    )
+
+
+POOL_REGISTRY = ConnectionPoolRegistry()
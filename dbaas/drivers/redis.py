@@ -8,6 +8,8 @@ from . import BaseDriver
 from . import DatabaseInfraStatus
 from . import DatabaseStatus
 from . import ConnectionError
+from . import TopologySnapshot
+from .pool import POOL_REGISTRY, pool_key
 from system.models import Configuration
 from physical.models import Instance
 from util import exec_remote_command
@@ -24,21 +26,26 @@ class Redis(BaseDriver):
 
     default_port = 6379
 
-    def __concatenate_instances(self):
+    def __connection_instances(self):
         if self.databaseinfra.plan.is_ha:
-            return ",".join(["%s:%s" % (instance.address, instance.port)
-                             for instance in self.databaseinfra.instances.filter(instance_type=Instance.REDIS_SENTINEL, is_active=True).all()])
+            instance_type = Instance.REDIS_SENTINEL
         else:
-            return ",".join(["%s:%s" % (instance.address, instance.port)
-                             for instance in self.databaseinfra.instances.filter(instance_type=Instance.REDIS, is_active=True).all()])
+            instance_type = Instance.REDIS
+        return self.databaseinfra.instances.filter(
+            instance_type=instance_type, is_active=True
+        ).all()
+
+    def __concatenate_instances(self):
+        return self.cached_endpoint('instances', lambda: ",".join(
+            ["%s:%s" % (instance.address, instance.port)
+                for instance in self.__connection_instances()]
+        ))
 
     def __concatenate_instances_dns(self):
-        if self.databaseinfra.plan.is_ha:
-            return ",".join(["%s:%s" % (instance.dns, instance.port)
-                             for instance in self.databaseinfra.instances.filter(instance_type=Instance.REDIS_SENTINEL, is_active=True).all() if not instance.dns.startswith('10.')])
-        else:
-            return ",".join(["%s:%s" % (instance.dns, instance.port)
-                             for instance in self.databaseinfra.instances.filter(instance_type=Instance.REDIS, is_active=True).all() if not instance.dns.startswith('10.')])
+        return self.cached_endpoint('instances_dns', lambda: ",".join(
+            ["%s:%s" % (instance.dns, instance.port)
+                for instance in self.__connection_instances() if not instance.dns.startswith('10.')]
+        ))
 
     def get_connection(self, database=None):
         if self.databaseinfra.plan.is_ha:
@@ -93,8 +100,10 @@ class Redis(BaseDriver):
         return instances[0].address, instances[0].port
 
     def __concatenate_instances_dns_only(self):
-        return ",".join(["%s" % (instance.dns)
-                         for instance in self.databaseinfra.instances.filter(instance_type=Instance.REDIS_SENTINEL, is_active=True).all()])
+        return self.cached_endpoint('dns', lambda: ",".join(
+            ["%s" % (instance.dns)
+                for instance in self.databaseinfra.instances.filter(instance_type=Instance.REDIS_SENTINEL, is_active=True).all()]
+        ))
 
     def get_dns_port(self):
         if self.databaseinfra.plan.is_ha:
@@ -155,16 +164,23 @@ class Redis(BaseDriver):
 
     @contextmanager
     def redis(self, instance=None, database=None):
-        client = None
         try:
-            client = self.__redis_client__(instance)
-
-            return_value = client
-            yield return_value
+            with POOL_REGISTRY.connection(
+                key=pool_key(self.databaseinfra, instance),
+                factory=lambda: self.__redis_client__(instance),
+                close=self.__close_client,
+                health_check=lambda client: client.ping(),
+                discard_on=(redis.ConnectionError, redis.TimeoutError)
+            ) as client:
+                yield client
         except Exception as e:
             raise ConnectionError(
                 'Error connecting to databaseinfra %s : %s' % (self.databaseinfra, str(e)))
 
+    def __close_client(self, client):
+        LOG.debug('Disconnecting redis databaseinfra %s', self.databaseinfra)
+        client.connection_pool.disconnect()
+
     def check_status(self, instance=None):
         with self.redis(instance=instance) as client:
             try:
@@ -297,6 +313,30 @@ class Redis(BaseDriver):
                 raise ConnectionError(
                     'Error connection to databaseinfra %s: %s' % (self.databaseinfra, str(e)))
 
+    def build_topology(self, instances):
+        """ Asks sentinel which instance is the master """
+        if not self.databaseinfra.plan.is_ha:
+            return super(Redis, self).build_topology(instances)
+
+        try:
+            address, port = self.get_sentinel_client().discover_master(
+                self.databaseinfra.name
+            )
+        except Exception as e:
+            LOG.warning("Could not get master of %s from sentinel: %s",
+                        self.databaseinfra, e)
+            return super(Redis, self).build_topology(instances)
+
+        master = None
+        for instance in instances:
+            if instance.address == address and int(instance.port) == int(port):
+                master = instance
+
+        return TopologySnapshot(
+            master=master,
+            replicas=[instance for instance in instances if instance != master]
+        )
+
     def initialization_script_path(self, host=None):
         if not host:
             return '/etc/init.d/redis {option}'
@@ -352,6 +392,7 @@ class Redis(BaseDriver):
                                           password=host_attr.vm_password,
                                           command=script,
                                           output=output)
+        self.invalidate_topology()
         LOG.info(output)
         if return_code != 0:
             raise Exception(str(output))
@@ -392,7 +433,7 @@ class Redis(BaseDriver):
     def configuration_parameters(self, instance):
         variables = {}
 
-        master = self.get_master_instance()
+        master = self.get_master_instance(force_refresh=True)
         if master:
             variables.update(self.master_parameters(instance, master))
 
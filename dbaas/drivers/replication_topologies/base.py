@@ -1,4 +1,9 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+PARALLEL_STEPS_MAX_WORKERS = 5
+
+
 class BaseTopology(object):
 
     def deploy_first_steps(self):
@@ -100,6 +105,18 @@ class BaseTopology(object):
             ),
         }]
 
+    def get_parallel_groups_of_steps(self):
+        """ Descriptions of the groups of steps that can run on many instances
+        at the same time, with the max number of instances running together.
+        Only groups whose steps touch nothing but their own instance or host
+        must be declared here """
+        return {
+            self.get_upgrade_steps_initial_description():
+                PARALLEL_STEPS_MAX_WORKERS,
+            self.get_upgrade_steps_final_description():
+                PARALLEL_STEPS_MAX_WORKERS,
+        }
+
     def get_add_database_instances_first_steps(self):
         return (
             'workflow.steps.util.vm.CreateVirtualMachineHorizontalElasticity',
@@ -207,3 +224,26 @@ class BaseTopology(object):
                 'workflow.steps.util.database.CheckIfSwitchMaster',
             )
         }]
+
+    def get_all_steps(self):
+        """ Class paths of every step returned by the get_*_steps methods """
+        steps = []
+        for name in sorted(dir(self)):
+            if not (name.startswith('get_') and name.endswith('_steps')):
+                continue
+            if name == 'get_all_steps':
+                continue
+
+            try:
+                value = getattr(self, name)()
+            except NotImplementedError:
+                continue
+
+            for item in value:
+                if isinstance(item, dict):
+                    for group_steps in item.values():
+                        steps.extend(group_steps)
+                else:
+                    steps.append(item)
+
+        return list(OrderedDict.fromkeys(steps))
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.test import TestCase
+from physical.tests import factory as factory_physical
+from ..base import ENDPOINT_CACHE
+
+
+class DriverCacheTestCase(TestCase):
+
+    def setUp(self):
+        ENDPOINT_CACHE.clear()
+        self.databaseinfra = factory_physical.DatabaseInfraFactory(
+            engine__engine_type__name='mongodb'
+        )
+        self.instance = factory_physical.InstanceFactory(
+            databaseinfra=self.databaseinfra, address='10.0.0.1'
+        )
+
+    def tearDown(self):
+        ENDPOINT_CACHE.clear()
+
+    def test_driver_is_memoized(self):
+        driver = self.databaseinfra.get_driver()
+        self.assertIs(self.databaseinfra.get_driver(), driver)
+
+    def test_save_builds_a_new_driver(self):
+        driver = self.databaseinfra.get_driver()
+        self.databaseinfra.save()
+        self.assertIsNot(self.databaseinfra.get_driver(), driver)
+
+    def test_connection_is_built_once(self):
+        driver = self.databaseinfra.get_driver()
+        uri = driver.get_connection()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(driver.get_connection(), uri)
+
+    def test_saving_instance_invalidates_connection(self):
+        driver = self.databaseinfra.get_driver()
+        self.assertEqual(
+            driver.get_connection(), 'mongodb://<user>:<password>@10.0.0.1:27017'
+        )
+
+        self.instance.address = '10.0.0.2'
+        self.instance.save()
+
+        self.assertEqual(
+            driver.get_connection(), 'mongodb://<user>:<password>@10.0.0.2:27017'
+        )
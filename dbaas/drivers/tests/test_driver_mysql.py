@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 import logging
+import mock
 from django.test import TestCase
 from drivers import DriverFactory
 from physical.tests import factory as factory_physical
 from logical.tests import factory as factory_logical
 from logical.models import Database
 from ..mysqldb import MySQL
+from ..pool import POOL_REGISTRY
 from django.conf import settings
 
 LOG = logging.getLogger(__name__)
@@ -139,3 +141,80 @@ class ManageCredentialsMySQLTestCase(AbstractTestDriverMysql):
         self.assertTrue(self.credential.user in self.driver.list_users())
         self.driver.remove_user(self.credential)
         self.assertFalse(self.credential.user in self.driver.list_users())
+
+
+class FakeMySQLResult(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetch_row(self, maxrows=0, how=1):
+        return self.rows
+
+
+class FakeMySQLClient(object):
+
+    def __init__(self, databases):
+        self.databases = databases
+        self.queries = []
+        self.last_query = None
+
+    def query(self, query_string):
+        self.queries.append(query_string)
+        self.last_query = query_string
+
+    def store_result(self):
+        if 'VERSION()' in self.last_query:
+            return FakeMySQLResult([{'VERSION()': '5.6.35'}])
+        if 'SHOW DATABASES' in self.last_query:
+            return FakeMySQLResult(
+                [{'Database': name} for name in self.databases]
+            )
+        return FakeMySQLResult(
+            [{'Database': name, 'Size': '1024'} for name in self.databases]
+        )
+
+    def ping(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class InfoMySQLTestCase(AbstractTestDriverMysql):
+
+    """ Regression test of queries and sessions made to collect info """
+
+    def setUp(self):
+        super(InfoMySQLTestCase, self).setUp()
+        POOL_REGISTRY.clear()
+        self.databases = [
+            factory_logical.DatabaseFactory(databaseinfra=self.databaseinfra)
+            for _ in range(10)
+        ]
+        self.client = FakeMySQLClient(
+            ['mysql', 'information_schema'] +
+            [database.name for database in self.databases]
+        )
+
+    def tearDown(self):
+        POOL_REGISTRY.clear()
+        super(InfoMySQLTestCase, self).tearDown()
+
+    @mock.patch.object(MySQL, '__mysql_client__')
+    def test_info_queries(self, mysql_client):
+        mysql_client.return_value = self.client
+
+        with self.assertNumQueries(1):
+            info = self.driver.info()
+
+        self.assertEqual(mysql_client.call_count, 1)
+        self.assertEqual(len(self.client.queries), 3)
+
+        self.assertEqual(info.version, '5.6.35')
+        self.assertEqual(info.used_size_in_bytes, 1024 * 12)
+        self.assertEqual(len(info.databases_status), 10)
+        for database in self.databases:
+            status = info.get_database_status(database.name)
+            self.assertTrue(status.is_alive)
+            self.assertEqual(status.used_size_in_bytes, 1024)
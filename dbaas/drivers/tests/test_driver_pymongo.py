@@ -8,6 +8,7 @@ from physical.tests import factory as factory_physical
 from logical.tests import factory as factory_logical
 from logical.models import Database
 from ..mongodb import MongoDB
+from ..pool import POOL_REGISTRY
 
 
 class AbstractTestDriverMongo(TestCase):
@@ -172,3 +173,87 @@ class ManageCredentialsMongoDBTestCase(AbstractTestDriverMongo):
             self.credential), "Error creating user %s. Invalid test" % self.credential)
         self.driver.remove_user(self.credential)
         self.assertIsNone(self.__find_user__(self.credential))
+
+
+class FakeMongoDatabase(object):
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def command(self, command, *args, **kwargs):
+        self.client.round_trips.append((self.name, command))
+        if command == 'listDatabases':
+            return {
+                'totalSize': 300,
+                'databases': [{'name': name} for name in self.client.databases]
+            }
+        if command == 'dbStats':
+            return {'storageSize': 100, 'fileSize': 200}
+        return {'ok': 1.0}
+
+
+class FakeMongoClient(object):
+
+    def __init__(self, databases):
+        self.databases = databases
+        self.round_trips = []
+        self.admin = FakeMongoDatabase(self, 'admin')
+
+    def __getattr__(self, name):
+        return FakeMongoDatabase(self, name)
+
+    def server_info(self):
+        self.round_trips.append(('admin', 'buildinfo'))
+        return {'version': '3.4.1'}
+
+    def close(self):
+        pass
+
+
+class InfoMongoDBTestCase(AbstractTestDriverMongo):
+
+    """ Counts the round trips made to collect databaseinfra info """
+
+    def setUp(self):
+        super(InfoMongoDBTestCase, self).setUp()
+        POOL_REGISTRY.clear()
+        self.databases = [
+            factory_logical.DatabaseFactory(databaseinfra=self.databaseinfra)
+            for _ in range(5)
+        ]
+        self.client = FakeMongoClient(
+            [database.name for database in self.databases[:4]]
+        )
+
+    def tearDown(self):
+        POOL_REGISTRY.clear()
+        super(InfoMongoDBTestCase, self).tearDown()
+
+    @mock.patch.object(MongoDB, '__mongo_client__')
+    def test_info_uses_one_connection(self, mongo_client):
+        mongo_client.return_value = self.client
+        self.driver.info()
+        self.assertEqual(mongo_client.call_count, 1)
+
+    @mock.patch.object(MongoDB, '__mongo_client__')
+    def test_info_round_trips(self, mongo_client):
+        mongo_client.return_value = self.client
+        info = self.driver.info()
+
+        commands = [command for _, command in self.client.round_trips]
+        self.assertEqual(commands.count('listDatabases'), 1)
+        self.assertEqual(commands.count('dbStats'), 4)
+        self.assertNotIn('ping', commands)
+        self.assertEqual(len(commands), 2 + 4)
+
+        self.assertEqual(info.version, '3.4.1')
+        self.assertEqual(info.used_size_in_bytes, 300)
+        for database in self.databases[:4]:
+            status = info.get_database_status(database.name)
+            self.assertTrue(status.is_alive)
+            self.assertEqual(status.used_size_in_bytes, 100)
+
+        missing = info.get_database_status(self.databases[4].name)
+        self.assertFalse(missing.is_alive)
+        self.assertEqual(missing.used_size_in_bytes, 0)
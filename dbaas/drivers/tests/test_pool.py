@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import mock
+from django.test import TestCase
+from physical.tests import factory as factory_physical
+from ..pool import POOL_REGISTRY, pool_key
+
+
+class PoolKeyTestCase(TestCase):
+
+    def setUp(self):
+        self.databaseinfra = factory_physical.DatabaseInfraFactory()
+        self.instance = factory_physical.InstanceFactory(
+            databaseinfra=self.databaseinfra
+        )
+
+    def test_key_changes_with_password(self):
+        key = pool_key(self.databaseinfra, self.instance)
+        self.databaseinfra.password = 'new_password'
+        self.assertNotEqual(key, pool_key(self.databaseinfra, self.instance))
+
+    def test_no_key_for_not_persisted_infra(self):
+        databaseinfra = factory_physical.DatabaseInfraFactory.build()
+        self.assertIsNone(pool_key(databaseinfra))
+
+    @mock.patch.object(POOL_REGISTRY, 'invalidate')
+    def test_invalidate_when_instance_address_changes(self, invalidate):
+        self.instance.address = '10.0.0.2'
+        self.instance.save()
+        invalidate.assert_called_once_with(
+            self.databaseinfra.pk, self.instance.pk
+        )
+
+    @mock.patch.object(POOL_REGISTRY, 'invalidate')
+    def test_keep_pool_when_only_status_changes(self, invalidate):
+        self.instance.save(update_fields=['status'])
+        self.assertFalse(invalidate.called)
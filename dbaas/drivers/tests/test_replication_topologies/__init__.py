@@ -298,3 +298,8 @@ class AbstractReplicationTopologySettingsTestCase(TestCase):
             self._get_switch_write_instance_steps(),
             self.replication_topology.get_switch_write_instance_steps()
         )
+
+    @skip_unless_not_abstract
+    def test_all_steps_can_be_imported(self):
+        from workflow.workflow import validate_topology_steps
+        validate_topology_steps(self.replication_topology)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from django.core.cache import cache
+from django.test import TestCase
+from mock import patch, MagicMock
+from physical.tests import factory as factory_physical
+from ..base import TopologySnapshot
+from ..mongodb import MongoDB
+
+
+class AbstractTestMongoDBReplicaSet(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.databaseinfra = factory_physical.DatabaseInfraFactory(
+            engine__engine_type__name='mongodb'
+        )
+        self.instances = [
+            factory_physical.InstanceFactory(
+                databaseinfra=self.databaseinfra, address='10.0.0.{}'.format(i)
+            ) for i in range(1, 4)
+        ]
+        self.driver = MongoDB(databaseinfra=self.databaseinfra)
+
+    def tearDown(self):
+        cache.clear()
+
+    def replica_set(self, primary, lags=(0, 1, 2)):
+        now = datetime.now()
+        client = MagicMock()
+        client.admin.command.return_value = {'members': [
+            {
+                'name': '{}:{}'.format(instance.address, instance.port),
+                'stateStr': 'PRIMARY' if instance == primary else 'SECONDARY',
+                'optimeDate': now - timedelta(seconds=lag),
+                '_id': i,
+            } for i, (instance, lag) in enumerate(zip(self.instances, lags))
+        ]}
+
+        @contextmanager
+        def pymongo(instance=None, database=None):
+            yield client
+
+        return patch.object(MongoDB, 'pymongo', side_effect=pymongo)
+
+
+class MongoDBTopologyTestCase(AbstractTestMongoDBReplicaSet):
+
+    def test_topology_from_one_replica_set_status(self):
+        with self.replica_set(primary=self.instances[0]) as pymongo:
+            topology = self.driver.get_topology()
+
+        self.assertEqual(pymongo.call_count, 1)
+        self.assertEqual(topology.master, self.instances[0])
+        self.assertEqual(topology.replicas, self.instances[1:])
+        self.assertEqual(topology.get_lag(self.instances[0]), 0)
+        self.assertEqual(topology.get_lag(self.instances[2]), 2)
+
+    def test_topology_is_cached(self):
+        with self.replica_set(primary=self.instances[0]) as pymongo:
+            self.driver.get_topology()
+            master = self.driver.get_master_instance()
+            slaves = self.driver.get_slave_instances()
+
+        self.assertEqual(pymongo.call_count, 1)
+        self.assertEqual(master, self.instances[0])
+        self.assertEqual(slaves, self.instances[1:])
+
+    def test_switch_master_invalidates_topology(self):
+        with self.replica_set(primary=self.instances[0]):
+            self.driver.get_topology()
+
+        with patch.object(MongoDB, 'get_client'):
+            self.driver.switch_master()
+
+        with self.replica_set(primary=self.instances[1]):
+            self.assertEqual(
+                self.driver.get_master_instance(), self.instances[1]
+            )
+
+    def test_force_refresh(self):
+        with self.replica_set(primary=self.instances[0]):
+            self.driver.get_topology()
+
+        with self.replica_set(primary=self.instances[1]):
+            self.assertEqual(
+                self.driver.get_master_instance(), self.instances[0]
+            )
+            self.assertEqual(
+                self.driver.get_master_instance(force_refresh=True),
+                self.instances[1]
+            )
+
+    def test_topology_without_master_is_not_cached(self):
+        with self.replica_set(primary=None):
+            self.assertIsNone(self.driver.get_master_instance())
+
+        with self.replica_set(primary=self.instances[0]):
+            self.assertEqual(
+                self.driver.get_master_instance(), self.instances[0]
+            )
+
+    def test_is_current_write(self):
+        with self.replica_set(primary=self.instances[1]):
+            self.assertFalse(self.instances[0].is_current_write)
+            self.assertTrue(self.instances[1].is_current_write)
+
+
+class MongoDBReplicationTestCase(AbstractTestMongoDBReplicaSet):
+
+    def test_lags_of_every_member_in_one_call(self):
+        with self.replica_set(primary=self.instances[0]) as pymongo:
+            lags = self.driver.get_replication_lags(self.instances)
+
+        self.assertEqual(pymongo.call_count, 1)
+        self.assertEqual(
+            lags,
+            {self.instances[0]: 0, self.instances[1]: 1, self.instances[2]: 2}
+        )
+
+    def test_replication_info_does_not_check_master_first(self):
+        with self.replica_set(primary=self.instances[0]) as pymongo:
+            self.assertEqual(
+                self.driver.get_replication_info(self.instances[2]), 2
+            )
+
+        self.assertEqual(pymongo.call_count, 1)
+
+    def test_primary_is_ok_when_a_secondary_caught_up(self):
+        with self.replica_set(self.instances[0], lags=(0, 30, 1)):
+            self.assertTrue(self.driver.is_replication_ok(self.instances[0]))
+            self.assertFalse(
+                self.driver.is_replication_ok(self.instances[1])
+            )
+
+        with self.replica_set(self.instances[0], lags=(0, 30, 40)):
+            self.assertFalse(
+                self.driver.is_replication_ok(self.instances[0])
+            )
+
+    def test_max_replica_id(self):
+        with self.replica_set(primary=self.instances[0]):
+            self.assertEqual(self.driver.get_max_replica_id(), 2)
+
+
+class TopologySnapshotTestCase(TestCase):
+
+    def test_state_keeps_only_ids(self):
+        instances = [
+            factory_physical.InstanceFactory() for _ in range(2)
+        ]
+        topology = TopologySnapshot(
+            master=instances[0], replicas=instances[1:],
+            lag={instances[1].pk: 3}
+        )
+
+        state = topology.to_state()
+        self.assertEqual(state['master'], instances[0].pk)
+
+        loaded = TopologySnapshot.from_state(state, instances)
+        self.assertTrue(loaded.is_master(instances[0]))
+        self.assertEqual(loaded.replicas, instances[1:])
+        self.assertEqual(loaded.get_lag(instances[1]), 3)
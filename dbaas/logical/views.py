@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 import json
+import logging
 from collections import OrderedDict
 from django.contrib import messages
 from django.core.exceptions import ValidationError, PermissionDenied
@@ -26,6 +27,8 @@ from .forms.database import DatabaseDetailsForm
 from .models import Credential, Database, Project
 from .validators import check_is_database_enabled, check_is_database_dead
 
+LOG = logging.getLogger(__name__)
+
 
 class CredentialView(BaseDetailView):
     model = Credential
@@ -626,6 +629,11 @@ def database_hosts(request, context, database):
 
     context['instances_core'] = []
     context['instances_read_only'] = []
+    try:
+        topology = database.infra.get_driver().get_topology()
+    except Exception as e:
+        LOG.warning("Could not get topology of %s: %s", database.infra, e)
+        topology = None
     current_write_found = False
     for host, instances in hosts.items():
         attributes = []
@@ -639,7 +647,8 @@ def database_hosts(request, context, database):
             if not instance.is_database:
                 context['non_database_attribute'] = instance.get_instance_type_display()
                 attributes.append(context['non_database_attribute'])
-            elif not current_write_found and instance.is_current_write:
+            elif not current_write_found and topology and \
+                    topology.is_master(instance):
                 attributes.append(context['core_attribute'])
                 current_write_found = True
                 if database.databaseinfra.plan.is_ha:
@@ -1,4 +1,4 @@
-from util import exec_remote_command
+from util import exec_remote_command_streaming
 from datetime import datetime
 from dbaas.celery import app
 import models
@@ -64,11 +64,17 @@ def execute_scheduled_maintenance(self, maintenance_id):
             param_function = _get_function(param.function_name)
             param_dict[param.parameter_name] = param_function(host.id)
 
+        def task_history_line(line, stream):
+            task_history.add_detail(line, level=2)
+
         main_script = build_context_script(param_dict, maintenance.main_script)
-        exit_status = exec_remote_command(server=host.address,
-                                          username=cloudstack_host_attributes.vm_user,
-                                          password=cloudstack_host_attributes.vm_password,
-                                          command=main_script, output=main_output)
+        task_history.add_detail("Running main script on {}".format(host))
+        exit_status = exec_remote_command_streaming(
+            server=host.address, username=cloudstack_host_attributes.vm_user,
+            password=cloudstack_host_attributes.vm_password,
+            command=main_script, output=main_output,
+            callback=task_history_line
+        )
 
         if exit_status == 0:
             hm.status = hm.SUCCESS
@@ -81,10 +87,16 @@ def execute_scheduled_maintenance(self, maintenance_id):
 
                 rollback_script = build_context_script(
                     param_dict, maintenance.rollback_script)
-                exit_status = exec_remote_command(server=host.address,
-                                                  username=cloudstack_host_attributes.vm_user,
-                                                  password=cloudstack_host_attributes.vm_password,
-                                                  command=rollback_script, output=rollback_output)
+                task_history.add_detail(
+                    "Running rollback script on {}".format(host)
+                )
+                exit_status = exec_remote_command_streaming(
+                    server=host.address,
+                    username=cloudstack_host_attributes.vm_user,
+                    password=cloudstack_host_attributes.vm_password,
+                    command=rollback_script, output=rollback_output,
+                    callback=task_history_line
+                )
 
                 if exit_status == 0:
                     hm.status = hm.ROLLBACK_SUCCESS
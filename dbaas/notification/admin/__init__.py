@@ -3,5 +3,7 @@ from __future__ import absolute_import, unicode_literals
 from django.contrib import admin
 from .. import models
 from .task_history import TaskHistoryAdmin
+from .step_timing import TaskStepTimingAdmin
 
 admin.site.register(models.TaskHistory, TaskHistoryAdmin)
+admin.site.register(models.TaskStepTiming, TaskStepTimingAdmin)
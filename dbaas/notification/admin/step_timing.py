@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.conf.urls import url
+from django.contrib import admin
+from django.shortcuts import render_to_response
+from django.template import RequestContext
+
+from ..models import TaskStepTiming, REPORT_DAYS
+
+
+class TaskStepTimingAdmin(admin.ModelAdmin):
+    actions = None
+    list_display = ("step", "instance", "engine", "topology", "undo",
+                    "friendly_duration", "outcome", "started_at")
+    list_filter = ("outcome", "undo", "engine", "topology")
+    search_fields = ("step", "instance")
+    readonly_fields = ("task", "step", "instance", "engine", "topology",
+                       "undo", "started_at", "ended_at", "duration",
+                       "outcome")
+    change_list_template = "admin/notification/tasksteptiming/change_list.html"
+
+    def friendly_duration(self, timing):
+        return "{:.2f}s".format(timing.duration)
+
+    friendly_duration.short_description = "Duration"
+    friendly_duration.admin_order_field = "duration"
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def report(self, request):
+        engine = request.GET.get('engine')
+        topology = request.GET.get('topology')
+        timings = TaskStepTiming.recent(
+            engine=engine, topology=topology
+        )
+        context = {
+            'summary': TaskStepTiming.summary(timings),
+            'days': REPORT_DAYS,
+            'engine': engine,
+            'topology': topology,
+            'engines': TaskStepTiming.objects.exclude(
+                engine=None
+            ).values_list('engine', flat=True).distinct().order_by('engine'),
+            'topologies': TaskStepTiming.objects.exclude(
+                topology=None
+            ).values_list(
+                'topology', flat=True
+            ).distinct().order_by('topology'),
+        }
+        return render_to_response(
+            "admin/notification/tasksteptiming/report.html", context,
+            context_instance=RequestContext(request)
+        )
+
+    def get_urls(self):
+        urls = super(TaskStepTimingAdmin, self).get_urls()
+        my_urls = [
+            url(
+                r'^report/$', self.admin_site.admin_view(self.report),
+                name="notification_tasksteptiming_report"
+            )
+        ]
+        return my_urls + urls
@@ -1,19 +1,38 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils.datastructures import SortedDict
 from django.utils.translation import ugettext_lazy as _
 import logging
 
 from ..models import TaskHistory
+from ..tasks import TaskRegister
 from dbaas import constants
 from account.models import Team
 
 LOG = logging.getLogger(__name__)
 
 
+def action_retry_create_database(modeladmin, request, queryset):
+    for task_history in queryset:
+        can_do_retry, error = task_history.can_do_create_database_retry()
+        if not can_do_retry:
+            modeladmin.message_user(request, error, level=messages.ERROR)
+            continue
+
+        TaskRegister.database_create_retry(
+            failed_task=task_history, user=request.user
+        )
+        modeladmin.message_user(
+            request, "Retrying task {}".format(task_history.id)
+        )
+action_retry_create_database.short_description = \
+    "Retry failed database create"
+
+
 class TaskHistoryAdmin(admin.ModelAdmin):
     perm_add_database_infra = constants.PERM_ADD_DATABASE_INFRA
-    actions = None
+    actions = [action_retry_create_database]
     list_display_basic = ["task_id", "friendly_task_name", "task_status", "arguments", "friendly_details", "created_at",
                           "ended_at"]
     list_display_advanced = list_display_basic + ["user"]
@@ -23,7 +42,7 @@ class TaskHistoryAdmin(admin.ModelAdmin):
     list_filter_advanced = list_filter_basic + ["task_name", "user", ]
     readonly_fields = ('created_at', 'ended_at', 'task_name', 'task_id', 'task_status', 'user', 'context', 'arguments',
                        'friendly_details_read', "db_id")
-    exclude = ('details', "object_id", "object_class")
+    exclude = ('legacy_details', "object_id", "object_class")
 
     def friendly_task_name(self, task_history):
         if task_history.task_name:
@@ -34,10 +53,7 @@ class TaskHistoryAdmin(admin.ModelAdmin):
     friendly_task_name.short_description = "Task Name"
 
     def friendly_details(self, task_history):
-        if task_history.details:
-            return task_history.details.split("\n")[-1]
-        else:
-            return "N/A"
+        return task_history.last_detail_line() or "N/A"
 
     friendly_details.short_description = "Current Step"
 
@@ -47,6 +63,13 @@ class TaskHistoryAdmin(admin.ModelAdmin):
 
     friendly_details_read.short_description = "Details"
 
+    def get_actions(self, request):
+        if not request.user.has_perm(self.perm_add_database_infra):
+            return SortedDict()
+        actions = super(TaskHistoryAdmin, self).get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
     def has_delete_permission(self, request, obj=None):  # note the obj=None
         return False
 
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import threading
+import time
+from itertools import izip_longest
+from celery.utils.log import get_task_logger
+from logical.models import Database
+from physical.models import DatabaseInfra, Instance
+from system.models import Configuration
+from util.models import bulk_update
+from util.parallel import run_in_parallel
+
+LOG = get_task_logger(__name__)
+
+PROBE_MAX_WORKERS = 50
+PROBE_ENGINE_MAX_WORKERS = 20
+PROBE_DEADLINE = 150  # seconds, must be lower than the task lock timeout
+
+COLLECT_MAX_WORKERS = 20
+COLLECT_DEADLINE = 150  # seconds, must be lower than the task lock timeout
+
+
+class InstanceStatusProber(object):
+
+    """
+    Checks the status of many instances concurrently.
+
+    At most max_workers instances are checked at the same time and at most
+    engine_max_workers of them for the same engine type. Instances not
+    checked before the deadline keep their current status.
+    """
+
+    def __init__(self, max_workers=None, engine_max_workers=None,
+                 deadline=None):
+        self.max_workers = max_workers or Configuration.get_by_name_as_int(
+            'instance_probe_max_workers', default=PROBE_MAX_WORKERS
+        )
+        self.engine_max_workers = engine_max_workers or \
+            Configuration.get_by_name_as_int(
+                'instance_probe_engine_max_workers',
+                default=PROBE_ENGINE_MAX_WORKERS
+            )
+        self.deadline = deadline or Configuration.get_by_name_as_int(
+            'instance_probe_deadline', default=PROBE_DEADLINE
+        )
+        self._semaphores = {}
+
+    @staticmethod
+    def engine_name(instance):
+        return instance.databaseinfra.engine.engine_type.name
+
+    def _interleave_by_engine(self, instances):
+        """ Sorts instances round robin by engine, so a slow engine does not
+        hold every worker waiting for its semaphore """
+        by_engine = {}
+        for instance in instances:
+            by_engine.setdefault(self.engine_name(instance), []).append(
+                instance
+            )
+
+        for engine_name in by_engine:
+            self._semaphores.setdefault(
+                engine_name, threading.BoundedSemaphore(self.engine_max_workers)
+            )
+
+        interleaved = []
+        for group in izip_longest(*by_engine.values()):
+            interleaved.extend(instance for instance in group if instance)
+        return interleaved
+
+    def check_status(self, instance):
+        with self._semaphores[self.engine_name(instance)]:
+            return instance.check_status()
+
+    def probe(self, instances):
+        """ Returns a dict of instance -> Instance status """
+        instances = self._interleave_by_engine(instances)
+        started_at = time.time()
+
+        results = run_in_parallel(
+            self.check_status, instances, max_workers=self.max_workers,
+            deadline=started_at + self.deadline
+        )
+
+        statuses = {}
+        timed_out = 0
+        for result in results:
+            if result.timed_out:
+                timed_out += 1
+                continue
+            statuses[result.item] = Instance.ALIVE if result.value \
+                else Instance.DEAD
+
+        LOG.info(
+            "%s instances checked in %.2f seconds, %s not checked before "
+            "the deadline", len(statuses), time.time() - started_at, timed_out
+        )
+        return statuses
+
+    @staticmethod
+    def save(statuses):
+        """ Writes only the instances whose status changed """
+        for instance, status in statuses.items():
+            instance.status = status
+
+        return bulk_update(
+            Instance,
+            {instance.pk: {'status': status}
+             for instance, status in statuses.items()},
+            ['status']
+        )
+
+
+class DatabaseStatusCollector(object):
+
+    """
+    Collects status and used size of every database calling the driver
+    info() only once per databaseinfra, concurrently.
+
+    The info() of a databaseinfra with a single instance talks to that
+    instance, so its result is kept as the instance status too. Instances of
+    bigger databaseinfras are left to InstanceStatusProber.
+
+    Database rows and instances health are loaded before starting the
+    threads, so the threads only talk to the databases.
+    """
+
+    FIELDS = ['status', 'used_size_in_bytes']
+
+    def __init__(self, max_workers=None, deadline=None):
+        self.max_workers = max_workers or Configuration.get_by_name_as_int(
+            'databases_collect_max_workers', default=COLLECT_MAX_WORKERS
+        )
+        self.deadline = deadline or Configuration.get_by_name_as_int(
+            'databases_collect_deadline', default=COLLECT_DEADLINE
+        )
+        self.instances_status = {}
+
+    @staticmethod
+    def get_info(databaseinfra):
+        return databaseinfra.get_info(force_refresh=True)
+
+    @staticmethod
+    def single_instances(databaseinfras):
+        """ Returns a dict of databaseinfra id -> instance for the
+        databaseinfras with only one instance """
+        instances = {}
+        for instance in Instance.objects.filter(
+            databaseinfra__in=databaseinfras
+        ):
+            instances.setdefault(instance.databaseinfra_id, []).append(
+                instance
+            )
+        return {
+            databaseinfra_id: infra_instances[0]
+            for databaseinfra_id, infra_instances in instances.items()
+            if len(infra_instances) == 1
+        }
+
+    @staticmethod
+    def database_values(database, database_status, instances_status):
+        if database_status and database_status.is_alive:
+            status = Database.ALIVE
+            if instances_status == DatabaseInfra.ALERT:
+                status = Database.ALERT
+        else:
+            status = Database.DEAD
+
+        used_size_in_bytes = 0.0
+        if database_status:
+            used_size_in_bytes = float(database_status.used_size_in_bytes)
+
+        return {'status': status, 'used_size_in_bytes': used_size_in_bytes}
+
+    def collect(self, databases):
+        """ Returns a dict of database -> {'status', 'used_size_in_bytes'}
+        and keeps the status of single instances in instances_status """
+        databases_by_infra = {}
+        for database in databases:
+            databases_by_infra.setdefault(
+                database.databaseinfra, []
+            ).append(database)
+        instances_status = DatabaseInfra.instances_status_by_databaseinfra()
+        single_instances = self.single_instances(databases_by_infra.keys())
+        self.instances_status = {}
+
+        started_at = time.time()
+        results = run_in_parallel(
+            self.get_info, databases_by_infra.keys(),
+            max_workers=self.max_workers, deadline=started_at + self.deadline
+        )
+
+        values = {}
+        timed_out = 0
+        for result in results:
+            databaseinfra = result.item
+            if result.timed_out:
+                timed_out += 1
+                continue
+
+            info = result.value
+            instance = single_instances.get(databaseinfra.pk)
+            if instance:
+                self.instances_status[instance] = Instance.ALIVE if info \
+                    else Instance.DEAD
+
+            infra_instances_status = instances_status.get(
+                databaseinfra.pk, DatabaseInfra.ALIVE
+            )
+            for database in databases_by_infra[databaseinfra]:
+                database_status = None
+                if info:
+                    database_status = info.get_database_status(database.name)
+                values[database] = self.database_values(
+                    database, database_status, infra_instances_status
+                )
+
+        LOG.info(
+            "%s databaseinfras collected in %.2f seconds, %s not collected "
+            "before the deadline", len(results) - timed_out,
+            time.time() - started_at, timed_out
+        )
+        return values
+
+    def save(self, values):
+        """ Writes only the databases whose status or used size changed """
+        for database, database_values in values.items():
+            for field, value in database_values.items():
+                setattr(database, field, value)
+
+        return bulk_update(
+            Database,
+            {database.pk: database_values
+             for database, database_values in values.items()},
+            self.FIELDS
+        )
+
+    def save_instances(self):
+        """ Writes only the collected instances whose status changed """
+        return InstanceStatusProber.save(self.instances_status)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'TaskStepTiming'
+        db.create_table(u'notification_tasksteptiming', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('task', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name=u'step_timings', null=True, on_delete=models.SET_NULL, to=orm['notification.TaskHistory'])),
+            ('step', self.gf('django.db.models.fields.CharField')(max_length=255, db_index=True)),
+            ('instance', self.gf('django.db.models.fields.CharField')(max_length=255, null=True, blank=True)),
+            ('engine', self.gf('django.db.models.fields.CharField')(max_length=100, null=True, blank=True)),
+            ('topology', self.gf('django.db.models.fields.CharField')(max_length=255, null=True, blank=True)),
+            ('undo', self.gf('django.db.models.fields.BooleanField')(default=False)),
+            ('started_at', self.gf('django.db.models.fields.DateTimeField')(db_index=True)),
+            ('ended_at', self.gf('django.db.models.fields.DateTimeField')()),
+            ('duration', self.gf('django.db.models.fields.FloatField')()),
+            ('outcome', self.gf('django.db.models.fields.CharField')(max_length=10)),
+        ))
+        db.send_create_signal(u'notification', ['TaskStepTiming'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'TaskStepTiming'
+        db.delete_table(u'notification_tasksteptiming')
+
+
+    models = {
+        u'notification.taskhistory': {
+            'Meta': {'object_name': 'TaskHistory'},
+            'arguments': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'context': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'created_at': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'db_id': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'ended_at': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'legacy_details': ('django.db.models.fields.TextField', [], {'null': 'True', 'db_column': "'details'", 'blank': 'True'}),
+            'object_class': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'object_id': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'task_id': ('django.db.models.fields.CharField', [], {'max_length': '200', 'null': 'True', 'blank': 'True'}),
+            'task_name': ('django.db.models.fields.CharField', [], {'max_length': '200', 'null': 'True', 'blank': 'True'}),
+            'task_status': ('django.db.models.fields.CharField', [], {'default': "u'WAITING'", 'max_length': '100', 'db_index': 'True'}),
+            'updated_at': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'}),
+            'user': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'})
+        },
+        u'notification.taskhistoryline': {
+            'Meta': {'ordering': "(u'seq', u'id')", 'object_name': 'TaskHistoryLine'},
+            'created_at': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'inline': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'level': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'message': ('django.db.models.fields.TextField', [], {}),
+            'seq': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'task': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "u'lines'", 'to': u"orm['notification.TaskHistory']"})
+        },
+        u'notification.tasksteptiming': {
+            'Meta': {'ordering': "(u'-started_at',)", 'object_name': 'TaskStepTiming'},
+            'duration': ('django.db.models.fields.FloatField', [], {}),
+            'ended_at': ('django.db.models.fields.DateTimeField', [], {}),
+            'engine': ('django.db.models.fields.CharField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'instance': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'outcome': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'started_at': ('django.db.models.fields.DateTimeField', [], {'db_index': 'True'}),
+            'step': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'task': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "u'step_timings'", 'null': 'True', 'on_delete': 'models.SET_NULL', 'to': u"orm['notification.TaskHistory']"}),
+            'topology': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'undo': ('django.db.models.fields.BooleanField', [], {'default': 'False'})
+        }
+    }
+
+    complete_apps = ['notification']
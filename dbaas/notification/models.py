@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 import logging
+import math
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from django.db.models.signals import post_save
@@ -14,6 +15,8 @@ from util.models import BaseModel
 
 LOG = logging.getLogger(__name__)
 
+REPORT_DAYS = 30
+
 
 class TaskHistory(BaseModel):
 
@@ -29,6 +32,9 @@ class TaskHistory(BaseModel):
     _STATUS = [STATUS_RUNNING, STATUS_SUCCESS,
                STATUS_ERROR, STATUS_WARNING, STATUS_WAITING]
 
+    # Tasks whose deploy is checkpointed and can be resumed
+    RESUMABLE_TASKS = ('create_database', 'create_database_retry')
+
     task_id = models.CharField(
         _('Task ID'), max_length=200, null=True, blank=True, editable=False
     )
@@ -43,9 +49,13 @@ class TaskHistory(BaseModel):
         _('Task Status'), max_length=100, default=STATUS_WAITING, db_index=True
     )
     context = models.TextField(null=True, blank=True)
-    details = models.TextField(
-        verbose_name=_("Details"), null=True, blank=True
+    # Details written before TaskHistoryLine existed, see details property
+    legacy_details = models.TextField(
+        verbose_name=_("Details"), null=True, blank=True, db_column='details'
     )
+    # Last line of details, kept when lines are flushed so listings do not
+    # query the lines of each task
+    last_detail = models.TextField(null=True, blank=True, editable=False)
     arguments = models.TextField(
         verbose_name=_("Arguments"), null=True, blank=True
     )
@@ -55,9 +65,100 @@ class TaskHistory(BaseModel):
     object_id = models.IntegerField(null=True, blank=True)
     object_class = models.CharField(max_length=255, null=True, blank=True)
 
+    LINES_BUFFER_SIZE = 50
+    LINES_FLUSH_INTERVAL = 5  # seconds
+
+    def __init__(self, *args, **kwargs):
+        super(TaskHistory, self).__init__(*args, **kwargs)
+        self._lines_buffer = []
+        self._rendered_lines = None
+        self._next_seq = None
+        self._last_flush = time.time()
+
     def __unicode__(self):
         return u"%s" % self.task_id
 
+    def save(self, *args, **kwargs):
+        super(TaskHistory, self).save(*args, **kwargs)
+        self.flush_lines()
+
+    @property
+    def details(self):
+        """ Full text of the task details, assembled from its lines """
+        lines = self._get_rendered_lines()
+        if not lines:
+            return None
+        return "\n".join(lines)
+
+    def _get_rendered_lines(self):
+        if self._rendered_lines is None:
+            rendered = []
+            if self.legacy_details:
+                rendered.append(self.legacy_details)
+            lines = list(self.lines.all()) if self.pk else []
+            for line in lines + self._lines_buffer:
+                line.render_into(rendered)
+            self._rendered_lines = rendered
+        return self._rendered_lines
+
+    def last_detail_line(self):
+        """ Last line of details, without querying the lines """
+        last_detail = self.last_detail
+        if last_detail is None and self.legacy_details:
+            last_detail = self.legacy_details.split("\n")[-1]
+
+        rendered = [last_detail] if last_detail is not None else []
+        for line in self._lines_buffer:
+            line.render_into(rendered)
+
+        if not rendered:
+            return None
+        return rendered[-1].split("\n")[-1]
+
+    def _append_line(self, message, level=None, inline=False):
+        if self._next_seq is None:
+            self._next_seq = 0
+            if self.pk:
+                last_seq = self.lines.aggregate(
+                    last_seq=models.Max('seq')
+                )['last_seq']
+                if last_seq is not None:
+                    self._next_seq = last_seq + 1
+
+        line = TaskHistoryLine(
+            seq=self._next_seq, level=level or 0, inline=inline,
+            message=message
+        )
+        self._next_seq += 1
+        self._lines_buffer.append(line)
+        if self._rendered_lines is not None:
+            line.render_into(self._rendered_lines)
+
+    def _flush_lines_if_needed(self):
+        if len(self._lines_buffer) >= self.LINES_BUFFER_SIZE or \
+                time.time() - self._last_flush >= self.LINES_FLUSH_INTERVAL:
+            self.flush_lines()
+
+    def flush_lines(self):
+        """ Inserts the buffered lines with a single query """
+        if not self._lines_buffer:
+            return
+
+        if not self.pk:
+            # save() flushes the lines once the task has a pk
+            self.save()
+            return
+
+        for line in self._lines_buffer:
+            line.task_id = self.pk
+        TaskHistoryLine.objects.bulk_create(self._lines_buffer)
+        self.last_detail = self.last_detail_line()
+        TaskHistory.objects.filter(pk=self.pk).update(
+            last_detail=self.last_detail
+        )
+        self._lines_buffer = []
+        self._last_flush = time.time()
+
     def load_context_data(self):
         if self.context == '':
             self.context = '{}'
@@ -66,33 +167,27 @@ class TaskHistory(BaseModel):
 
     def update_details(self, details, persist=False):
         """
-        Method to update the details of a task history.
-        TODO: should we put a timestamp in details? should we append the details?
+        Appends details to the current line of the task history.
         """
-
-        if self.details:
-            self.details = "\n%s%s" % (self.details, details)
-        else:
-            self.details = details
+        self._append_line(details, inline=True)
 
         if persist:
-            self.save()
+            self.flush_lines()
+        else:
+            self._flush_lines_if_needed()
 
     def add_detail(self, message, level=None):
-        extra = ''
-        if level > 0:
-            extra = '{}> '.format('-' * level)
-
-        self.details = "{}\n".format(self.details) if self.details else ""
-        self.details = '{}{}{}'.format(self.details, extra, message)
-        self.save()
+        self._append_line(message, level=level)
+        self._flush_lines_if_needed()
 
     def add_step(self, step, total, description):
         current_time = str(time.strftime("%m/%d/%Y %H:%M:%S"))
         message = '{} - Step {} of {} - {}'.format(
             current_time, step, total, description
         )
-        self.add_detail(message, level=2)
+        self._append_line(message, level=2)
+        # steps are the progress shown to users, so they are never buffered
+        self.flush_lines()
         LOG.info(message)
 
     def update_status_for(self, status, details=None):
@@ -100,7 +195,7 @@ class TaskHistory(BaseModel):
             raise RuntimeError("Invalid task status")
 
         self.task_status = status
-        self.details = (self.details or " ") + "\n" + str(details)
+        self._append_line(str(details))
         if status in [TaskHistory.STATUS_SUCCESS, TaskHistory.STATUS_ERROR, TaskHistory.STATUS_WARNING]:
             self.update_ended_at()
         else:
@@ -164,6 +259,23 @@ class TaskHistory(BaseModel):
     def is_status_error(self):
         return self.task_status == self.STATUS_ERROR
 
+    def can_do_create_database_retry(self):
+        error = None
+        if (self.task_name or '').split('.')[-1] not in self.RESUMABLE_TASKS:
+            error = "Task {} is not a database create.".format(self.id)
+        elif not self.is_status_error:
+            error = "Cannot do retry, task {} status is '{}'!".format(
+                self.id, self.task_status
+            )
+        elif not TaskCheckpoint.objects.filter(task=self).exists():
+            error = "Task {} was rolled back or already retried.".format(
+                self.id
+            )
+
+        if error:
+            return False, error
+        return True, None
+
     def error_in_lock(self, database):
         self.add_detail("FAILED!")
         self.add_detail("Database {} is not allocated for this task.".format(
@@ -187,6 +299,178 @@ class TaskHistory(BaseModel):
             database_unpin.unpin_task()
 
 
+class TaskHistoryLine(models.Model):
+
+    """ Append only line of TaskHistory details """
+
+    task = models.ForeignKey(
+        TaskHistory, related_name='lines', on_delete=models.CASCADE
+    )
+    seq = models.PositiveIntegerField()
+    level = models.PositiveSmallIntegerField(default=0)
+    inline = models.BooleanField(
+        default=False, help_text="Continues the previous line"
+    )
+    created_at = models.DateTimeField(default=datetime.now)
+    message = models.TextField()
+
+    class Meta:
+        ordering = ('seq', 'id')
+
+    def __unicode__(self):
+        return u"%s" % self.message
+
+    @property
+    def text(self):
+        if self.level > 0:
+            return '{}> {}'.format('-' * self.level, self.message)
+        return self.message
+
+    def render_into(self, rendered_lines):
+        if self.inline and rendered_lines:
+            rendered_lines[-1] = '{}{}'.format(
+                rendered_lines[-1], self.message
+            )
+        else:
+            rendered_lines.append(self.text)
+
+
+class TaskCheckpoint(models.Model):
+
+    """ State to resume a failed task: the workflow_dict of start_workflow
+    after its last step done, or the steps steps_for_instances finished
+    after the one that failed """
+
+    task = models.OneToOneField(
+        TaskHistory, related_name='checkpoint', on_delete=models.CASCADE
+    )
+    step = models.PositiveIntegerField(help_text="Last step done")
+    state = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return "{} - step {}".format(self.task, self.step)
+
+
+class TaskStepTiming(models.Model):
+
+    """ How long a workflow step took to run """
+
+    OUTCOME_SUCCESS = 'SUCCESS'
+    OUTCOME_FAILED = 'FAILED'
+    OUTCOME_CHOICES = (
+        (OUTCOME_SUCCESS, 'Success'),
+        (OUTCOME_FAILED, 'Failed'),
+    )
+
+    task = models.ForeignKey(
+        TaskHistory, related_name='step_timings', null=True, blank=True,
+        on_delete=models.SET_NULL
+    )
+    step = models.CharField(max_length=255, db_index=True)
+    instance = models.CharField(max_length=255, null=True, blank=True)
+    engine = models.CharField(max_length=100, null=True, blank=True)
+    topology = models.CharField(max_length=255, null=True, blank=True)
+    undo = models.BooleanField(default=False)
+    started_at = models.DateTimeField(db_index=True)
+    ended_at = models.DateTimeField()
+    duration = models.FloatField(help_text="Seconds")
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES)
+
+    class Meta:
+        ordering = ('-started_at',)
+
+    def __unicode__(self):
+        return "{} - {:.2f}s".format(self.step, self.duration)
+
+    @classmethod
+    def register(cls, step_class, started_at, succeeded, task=None,
+                 instance=None, databaseinfra=None, undo=False):
+        """ Never raises, timings must not break a workflow """
+        try:
+            if databaseinfra is None and instance is not None:
+                databaseinfra = instance.databaseinfra
+
+            engine = topology = None
+            if databaseinfra is not None:
+                engine = '{}'.format(databaseinfra.engine)
+                topology = '{}'.format(
+                    databaseinfra.plan.replication_topology
+                )
+
+            ended_at = datetime.now()
+            return cls.objects.create(
+                task=task if task and task.pk else None,
+                step='{}.{}'.format(
+                    step_class.__module__, step_class.__name__
+                ),
+                instance='{}'.format(instance) if instance else None,
+                engine=engine,
+                topology=topology,
+                undo=undo,
+                started_at=started_at,
+                ended_at=ended_at,
+                duration=(ended_at - started_at).total_seconds(),
+                outcome=(
+                    cls.OUTCOME_SUCCESS if succeeded else cls.OUTCOME_FAILED
+                ),
+            )
+        except Exception as e:
+            LOG.warn("Could not register step timing: {}".format(e))
+
+    @classmethod
+    def recent(cls, days=REPORT_DAYS, **filters):
+        """ Timings of the last days, ignoring empty filters """
+        queryset = cls.objects.filter(
+            started_at__gte=datetime.now() - timedelta(days=days)
+        )
+        filters = dict(
+            (field, value) for field, value in filters.items() if value
+        )
+        return queryset.filter(**filters)
+
+    @classmethod
+    def summary(cls, queryset=None):
+        """
+        Count, failures, p50, p95 and max durations of each step, slowest
+        p95 first
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+
+        durations = {}
+        failures = {}
+        for step, duration, outcome in queryset.values_list(
+            'step', 'duration', 'outcome'
+        ).order_by():
+            durations.setdefault(step, []).append(duration)
+            if outcome == cls.OUTCOME_FAILED:
+                failures[step] = failures.get(step, 0) + 1
+
+        summary = []
+        for step, values in durations.items():
+            values.sort()
+            summary.append({
+                'step': step,
+                'count': len(values),
+                'failures': failures.get(step, 0),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'max': values[-1],
+            })
+
+        summary.sort(key=lambda item: item['p95'], reverse=True)
+        return summary
+
+
+def percentile(sorted_values, percent):
+    """ Nearest rank percentile of an already sorted list """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
 ###########
 # SIGNALS #
 ###########
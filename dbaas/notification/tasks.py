@@ -10,20 +10,25 @@ from account.models import Team
 from logical.models import Database
 from physical.models import Plan, DatabaseInfra, Instance
 from util import email_notifications, get_worker_name, full_stack
-from util.decorators import only_one
+from util.decorators import only_one, REDIS_CLIENT
 from util.providers import make_infra, clone_infra, destroy_infra, \
-    get_database_upgrade_setting, get_resize_settings, \
+    resume_infra, get_database_upgrade_setting, get_resize_settings, \
     get_database_change_parameter_setting, \
-    get_database_change_parameter_retry_steps_count
+    get_database_change_parameter_retry_steps_count, \
+    get_parallel_groups_of_steps
 from simple_audit.models import AuditRequest
 from system.models import Configuration
 from .models import TaskHistory
+from .fleet import InstanceStatusProber, DatabaseStatusCollector
 from workflow.workflow import steps_for_instances
 from maintenance.models import DatabaseUpgrade, DatabaseResize
 from maintenance.models import DatabaseChangeParameter
 
 LOG = get_task_logger(__name__)
 
+DATABASES_COLLECTED_KEY = "databases_status_collected"
+INSTANCES_COLLECTED_KEY = "instances_status_collected"
+
 
 def get_history_for_task_id(task_id):
     try:
@@ -39,6 +44,30 @@ def rollback_database(dest_database):
     dest_database.delete()
 
 
+def update_task_with_infra_result(task_history, result):
+    if result['created'] is False:
+        if 'exceptions' in result:
+            error = "\n".join(
+                ": ".join(err) for err in result['exceptions']['error_codes']
+            )
+            traceback = "\nException Traceback\n".join(
+                result['exceptions']['traceback']
+            )
+            error = "{}\n{}\n{}".format(error, traceback, error)
+        else:
+            error = "There is not any infra-structure to allocate this database."
+
+        task_history.update_status_for(
+            TaskHistory.STATUS_ERROR, details=error
+        )
+        return
+
+    task_history.update_dbid(db=result['database'])
+    task_history.update_status_for(
+        TaskHistory.STATUS_SUCCESS, details='Database created successfully'
+    )
+
+
 @app.task(bind=True)
 def create_database(
     self, name, plan, environment, team, project, description,
@@ -70,28 +99,38 @@ def create_database(
             task=task_history, is_protected=is_protected
         )
 
-        if result['created'] is False:
-            if 'exceptions' in result:
-                error = "\n".join(
-                    ": ".join(err) for err in result['exceptions']['error_codes']
-                )
-                traceback = "\nException Traceback\n".join(
-                    result['exceptions']['traceback']
-                )
-                error = "{}\n{}\n{}".format(error, traceback, error)
-            else:
-                error = "There is not any infra-structure to allocate this database."
+        update_task_with_infra_result(task_history, result)
+        return
 
-            task_history.update_status_for(
-                TaskHistory.STATUS_ERROR, details=error
-            )
-            return
+    except Exception as e:
+        traceback = full_stack()
+        LOG.error("Ops... something went wrong: %s" % e)
+        LOG.error(traceback)
+
+        if 'result' in locals() and result['created']:
+            destroy_infra(
+                databaseinfra=result['databaseinfra'], task=task_history)
 
-        task_history.update_dbid(db=result['database'])
         task_history.update_status_for(
-            TaskHistory.STATUS_SUCCESS, details='Database created successfully'
+            TaskHistory.STATUS_ERROR, details=traceback)
+        return
+
+    finally:
+        AuditRequest.cleanup_request()
+
+
+@app.task(bind=True)
+def create_database_retry(self, failed_task, task_history=None, user=None):
+    AuditRequest.new_request("create_database_retry", user, "localhost")
+    try:
+        worker_name = get_worker_name()
+        task_history = TaskHistory.register(
+            request=self.request, task_history=task_history, user=user,
+            worker_name=worker_name
         )
 
+        result = resume_infra(failed_task=failed_task, task=task_history)
+        update_task_with_infra_result(task_history, result)
         return
 
     except Exception as e:
@@ -99,10 +138,6 @@ def create_database(
         LOG.error("Ops... something went wrong: %s" % e)
         LOG.error(traceback)
 
-        if 'result' in locals() and result['created']:
-            destroy_infra(
-                databaseinfra=result['databaseinfra'], task=task_history)
-
         task_history.update_status_for(
             TaskHistory.STATUS_ERROR, details=traceback)
         return
@@ -350,30 +385,49 @@ def database_notification(self):
     return
 
 
-@app.task(bind=True)
-@only_one(key="get_databases_status", timeout=180)
-def update_database_status(self):
+def collect_databases_status(task):
+    """
+    Updates status and used size of every database calling info() once per
+    databaseinfra. Skipped when the databases were collected less than
+    databases_collect_interval seconds ago, so the tasks sharing this
+    collection do not repeat it in the same cycle.
+    """
+    if REDIS_CLIENT.get(DATABASES_COLLECTED_KEY):
+        LOG.info("Databases status were collected recently, skipping")
+        return
+
     LOG.info("Retrieving all databases")
     try:
         worker_name = get_worker_name()
         task_history = TaskHistory.register(
-            request=self.request, user=None, worker_name=worker_name)
-        databases = Database.objects.all()
-        msgs = []
-        for database in databases:
-            if database.database_status and database.database_status.is_alive:
-                database.status = Database.ALIVE
-
-                instances_status = database.databaseinfra.check_instances_status()
-                if instances_status == database.databaseinfra.ALERT:
-                    database.status = Database.ALERT
-
-            else:
-                database.status = Database.DEAD
+            request=task.request, user=None, worker_name=worker_name)
+        databases = Database.objects.select_related(
+            'databaseinfra__engine__engine_type', 'databaseinfra__plan'
+        )
+        collector = DatabaseStatusCollector()
+        values = collector.collect(databases)
+        written = collector.save(values)
+        LOG.info("{} of {} databases changed".format(written, len(values)))
+        written = collector.save_instances()
+        LOG.info("{} of {} instances changed".format(
+            written, len(collector.instances_status)))
+
+        collect_interval = Configuration.get_by_name_as_int(
+            'databases_collect_interval', default=60
+        )
+        REDIS_CLIENT.set(DATABASES_COLLECTED_KEY, 1, ex=collect_interval)
+        # update_instances_status does not probe these instances again
+        REDIS_CLIENT.set(
+            INSTANCES_COLLECTED_KEY,
+            ','.join(str(instance.pk) for instance in collector.instances_status),
+            ex=collect_interval
+        )
 
-            database.save(update_fields=['status'])
-            msg = "\nUpdating status for database: {}, status: {}".format(
-                database, database.status)
+        msgs = []
+        for database, database_values in values.items():
+            msg = "\nUpdating status for database: {}, status: {}, used size: {}".format(
+                database, database_values['status'],
+                database_values['used_size_in_bytes'])
             msgs.append(msg)
             LOG.info(msg)
 
@@ -382,37 +436,25 @@ def update_database_status(self):
     except Exception as e:
         task_history.update_status_for(TaskHistory.STATUS_ERROR, details=e)
 
+
+@app.task(bind=True)
+@only_one(key="get_databases_status", timeout=180)
+def update_databases_status_and_used_size(self):
+    collect_databases_status(self)
     return
 
 
 @app.task(bind=True)
-@only_one(key="get_databases_used_size", timeout=180)
-def update_database_used_size(self):
-    LOG.info("Retrieving all databases")
-    try:
-        worker_name = get_worker_name()
-        task_history = TaskHistory.register(
-            request=self.request, user=None, worker_name=worker_name)
-        databases = Database.objects.all()
-        msgs = []
-        for database in databases:
-            if database.database_status:
-                database.used_size_in_bytes = float(
-                    database.database_status.used_size_in_bytes)
-            else:
-                database.used_size_in_bytes = 0.0
-
-            database.save(update_fields=['used_size_in_bytes'])
-            msg = "\nUpdating used size in bytes for database: {}, used size: {}".format(
-                database, database.used_size_in_bytes)
-            msgs.append(msg)
-            LOG.info(msg)
+@only_one(key="get_databases_status", timeout=180)
+def update_database_status(self):
+    collect_databases_status(self)
+    return
 
-        task_history.update_status_for(TaskHistory.STATUS_SUCCESS, details="\n".join(
-            value for value in msgs))
-    except Exception as e:
-        task_history.update_status_for(TaskHistory.STATUS_ERROR, details=e)
 
+@app.task(bind=True)
+@only_one(key="get_databases_status", timeout=180)
+def update_database_used_size(self):
+    collect_databases_status(self)
     return
 
 
@@ -425,23 +467,24 @@ def update_instances_status(self):
         request=self.request, user=None, worker_name=worker_name)
 
     try:
-        infras = DatabaseInfra.objects.all()
-        msgs = []
-        for databaseinfra in infras:
-            LOG.info("Retrieving all instances for {}".format(databaseinfra))
-
-            for instance in Instance.objects.filter(databaseinfra=databaseinfra):
-                if instance.check_status():
-                    instance.status = Instance.ALIVE
-                else:
-                    instance.status = Instance.DEAD
-
-                instance.save(update_fields=['status'])
+        instances = Instance.objects.select_related(
+            'databaseinfra__engine__engine_type', 'databaseinfra__plan'
+        )
+        collected = REDIS_CLIENT.get(INSTANCES_COLLECTED_KEY)
+        if collected:
+            LOG.info("Skipping instances checked by the databases collector")
+            instances = instances.exclude(pk__in=collected.split(','))
+        prober = InstanceStatusProber()
+        statuses = prober.probe(instances)
+        written = prober.save(statuses)
+        LOG.info("{} of {} instances changed".format(written, len(statuses)))
 
-                msg = "\nUpdating instance status, instance: {}, status: {}".format(
-                    instance, instance.status)
-                msgs.append(msg)
-                LOG.info(msg)
+        msgs = []
+        for instance, status in statuses.items():
+            msg = "\nUpdating instance status, instance: {}, status: {}".format(
+                instance, status)
+            msgs.append(msg)
+            LOG.info(msg)
 
         task_history.update_status_for(TaskHistory.STATUS_SUCCESS, details="\n".join(
             value for value in msgs))
@@ -472,6 +515,7 @@ def purge_task_history(self):
                 'notification.tasks.update_database_used_size',
                 'notification.tasks.update_disk_used_size',
                 'notification.tasks.update_database_status',
+                'notification.tasks.update_databases_status_and_used_size',
                 'notification.tasks.update_instances_status',
                 'sync_celery_tasks',
                 'purge_unused_exports_task',
@@ -765,7 +809,8 @@ def upgrade_database(self, database, user, task, since_step=0):
 
     success = steps_for_instances(
         steps, instances, task,
-        database_upgrade.update_step, since_step
+        database_upgrade.update_step, since_step,
+        parallel_groups=get_parallel_groups_of_steps(class_path)
     )
 
     if success:
@@ -840,7 +885,8 @@ def change_parameters_database(self, database, user, task, since_step=0):
 
     success = steps_for_instances(
         steps, instances_to_change_parameters, task,
-        database_change_parameter.update_step, since_step
+        database_change_parameter.update_step, since_step,
+        parallel_groups=get_parallel_groups_of_steps(class_path)
     )
 
     if success:
@@ -963,7 +1009,8 @@ def resize_database(self, database, user, task, cloudstackpack, original_cloudst
     instances_to_resize = infra.get_driver().get_database_instances()
     success = steps_for_instances(
         steps, instances_to_resize, task,
-        database_resize.update_step, since_step
+        database_resize.update_step, since_step,
+        parallel_groups=get_parallel_groups_of_steps(class_path)
     )
 
     if success:
@@ -1203,6 +1250,22 @@ class TaskRegister(object):
 
         return result
 
+    @classmethod
+    def database_create_retry(cls, failed_task, user):
+        task_params = {
+            'task_name': "create_database_retry",
+            'arguments': "Retrying {} from task {}".format(
+                failed_task.arguments, failed_task.id
+            ),
+            'user': user,
+        }
+
+        task = cls.create_task(task_params)
+
+        return create_database_retry.delay(
+            failed_task=failed_task, task_history=task, user=user
+        )
+
     @classmethod
     def database_backup(cls, database, user):
         from backup.tasks import make_database_backup
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import threading
+import time
+import mock
+from django.test import TestCase
+from drivers import DatabaseInfraStatus, DatabaseStatus
+from logical.models import Database
+from logical.tests import factory as factory_logical
+from physical.models import Instance
+from physical.tests import factory as factory_physical
+from notification.fleet import InstanceStatusProber, DatabaseStatusCollector
+
+
+class InstanceStatusProberTestCase(TestCase):
+
+    def setUp(self):
+        self.databaseinfra = factory_physical.DatabaseInfraFactory()
+        self.instances = [
+            factory_physical.InstanceFactory(
+                databaseinfra=self.databaseinfra, port=27017 + i,
+                status=Instance.INITIALIZING
+            ) for i in range(6)
+        ]
+        self.prober = InstanceStatusProber(
+            max_workers=3, engine_max_workers=2, deadline=10
+        )
+
+    @mock.patch.object(Instance, 'check_status')
+    def test_probe(self, check_status):
+        check_status.side_effect = [True, False, True, True, False, True]
+        statuses = self.prober.probe(self.instances)
+
+        self.assertEqual(len(statuses), 6)
+        self.assertEqual(statuses.values().count(Instance.ALIVE), 4)
+        self.assertEqual(statuses.values().count(Instance.DEAD), 2)
+
+    @mock.patch.object(Instance, 'check_status')
+    def test_probe_runs_concurrently(self, check_status):
+        lock = threading.Lock()
+        in_flight = [0]
+        peak = [0]
+        engine_limit_reached = threading.Event()
+
+        def probe():
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+                if in_flight[0] == 2:
+                    engine_limit_reached.set()
+            # only goes on when the engine limit of probes are in flight
+            engine_limit_reached.wait(5)
+            with lock:
+                in_flight[0] -= 1
+            return True
+
+        check_status.side_effect = probe
+        statuses = self.prober.probe(self.instances)
+
+        # 6 instances of the same engine, 2 at a time with 3 workers
+        self.assertTrue(engine_limit_reached.is_set())
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(len(statuses), 6)
+
+    @mock.patch.object(Instance, 'check_status')
+    def test_instances_after_deadline_are_not_updated(self, check_status):
+        check_status.side_effect = lambda: time.sleep(1.5) or True
+        self.prober.deadline = 1
+
+        statuses = self.prober.probe(self.instances)
+        self.assertEqual(statuses, {})
+
+    def test_save(self):
+        statuses = {
+            self.instances[0]: Instance.ALIVE,
+            self.instances[1]: Instance.DEAD,
+            self.instances[2]: Instance.INITIALIZING,
+        }
+        # one select and one update for each changed status
+        with self.assertNumQueries(3):
+            self.assertEqual(self.prober.save(statuses), 2)
+
+        self.assertEqual(
+            Instance.objects.get(pk=self.instances[0].pk).status,
+            Instance.ALIVE
+        )
+        self.assertEqual(
+            Instance.objects.get(pk=self.instances[1].pk).status,
+            Instance.DEAD
+        )
+        self.assertEqual(
+            Instance.objects.get(pk=self.instances[2].pk).status,
+            Instance.INITIALIZING
+        )
+
+
+class DatabaseStatusCollectorTestCase(TestCase):
+
+    def setUp(self):
+        self.alive = factory_logical.DatabaseFactory()
+        self.dead = factory_logical.DatabaseFactory()
+        self.alert = factory_logical.DatabaseFactory()
+        factory_physical.InstanceFactory(
+            databaseinfra=self.alert.databaseinfra, status=Instance.ALIVE,
+            port=27017
+        )
+        factory_physical.InstanceFactory(
+            databaseinfra=self.alert.databaseinfra, status=Instance.DEAD,
+            port=27018
+        )
+        self.databases = [self.alive, self.dead, self.alert]
+        self.collector = DatabaseStatusCollector(max_workers=2, deadline=10)
+
+    def get_info(self, databaseinfra):
+        # Runs out of the test transaction, so it must not query the database
+        info = DatabaseInfraStatus(databaseinfra_model=databaseinfra)
+        for database in self.databases:
+            if database.databaseinfra_id != databaseinfra.pk:
+                continue
+            status = DatabaseStatus(database)
+            status.is_alive = database != self.dead
+            status.used_size_in_bytes = 1024
+            info.databases_status[database.name] = status
+        return info
+
+    def test_collect_calls_info_once_per_databaseinfra(self):
+        self.databases.append(factory_logical.DatabaseFactory(
+            databaseinfra=self.alive.databaseinfra
+        ))
+        with mock.patch.object(
+            DatabaseStatusCollector, 'get_info', side_effect=self.get_info
+        ) as get_info:
+            values = self.collector.collect(Database.objects.all())
+
+        self.assertEqual(get_info.call_count, 3)
+        self.assertEqual(len(values), 4)
+
+    def test_collect_and_save(self):
+        with mock.patch.object(
+            DatabaseStatusCollector, 'get_info', side_effect=self.get_info
+        ):
+            values = self.collector.collect(Database.objects.all())
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.collector.save(values), 3)
+
+        expected = [
+            (self.alive, Database.ALIVE, 1024),
+            (self.dead, Database.DEAD, 1024),
+            (self.alert, Database.ALERT, 1024),
+        ]
+        for database, status, used_size_in_bytes in expected:
+            database = Database.objects.get(pk=database.pk)
+            self.assertEqual(database.status, status)
+            self.assertEqual(database.used_size_in_bytes, used_size_in_bytes)
+
+    def test_save_skips_unchanged_databases(self):
+        with mock.patch.object(
+            DatabaseStatusCollector, 'get_info', side_effect=self.get_info
+        ):
+            values = self.collector.collect(Database.objects.all())
+        self.collector.save(values)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.collector.save(values), 0)
+
+    def test_collect_keeps_status_of_single_instances(self):
+        alive_instance = factory_physical.InstanceFactory(
+            databaseinfra=self.alive.databaseinfra, status=Instance.DEAD,
+            port=27017
+        )
+        dead_instance = factory_physical.InstanceFactory(
+            databaseinfra=self.dead.databaseinfra, status=Instance.ALIVE,
+            port=27017
+        )
+
+        def get_info(databaseinfra):
+            if databaseinfra.pk == self.dead.databaseinfra_id:
+                raise Exception('unreachable')
+            return self.get_info(databaseinfra)
+
+        with mock.patch.object(
+            DatabaseStatusCollector, 'get_info', side_effect=get_info
+        ):
+            self.collector.collect(Database.objects.all())
+
+        # the alert databaseinfra has two instances, left to the prober
+        self.assertEqual(self.collector.instances_status, {
+            alive_instance: Instance.ALIVE,
+            dead_instance: Instance.DEAD,
+        })
+        self.assertEqual(self.collector.save_instances(), 2)
+        self.assertEqual(
+            Instance.objects.get(pk=alive_instance.pk).status, Instance.ALIVE
+        )
+        self.assertEqual(
+            Instance.objects.get(pk=dead_instance.pk).status, Instance.DEAD
+        )
+
+    def test_databaseinfra_without_info_is_dead(self):
+        with mock.patch.object(
+            DatabaseStatusCollector, 'get_info', side_effect=Exception()
+        ):
+            values = self.collector.collect(Database.objects.all())
+
+        for database_values in values.values():
+            self.assertEqual(database_values['status'], Database.DEAD)
+            self.assertEqual(database_values['used_size_in_bytes'], 0.0)
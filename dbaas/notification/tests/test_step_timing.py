@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from datetime import datetime, timedelta
+from django.test import TestCase
+from notification.models import TaskStepTiming, percentile
+from notification.tests.factory import TaskHistoryFactory
+from physical.tests.factory import InstanceFactory
+from workflow.steps.tests.factory import TestInstanceStep
+
+
+class TaskStepTimingTestCase(TestCase):
+
+    def setUp(self):
+        self.task = TaskHistoryFactory()
+        self.instance = InstanceFactory()
+
+    def create_timing(self, step, duration,
+                      outcome=TaskStepTiming.OUTCOME_SUCCESS):
+        started_at = datetime.now()
+        return TaskStepTiming.objects.create(
+            step=step, started_at=started_at,
+            ended_at=started_at + timedelta(seconds=duration),
+            duration=duration, outcome=outcome
+        )
+
+    def test_register(self):
+        started_at = datetime.now() - timedelta(seconds=2)
+        timing = TaskStepTiming.register(
+            TestInstanceStep, started_at, True, task=self.task,
+            instance=self.instance
+        )
+
+        self.assertEqual(
+            timing.step, 'workflow.steps.tests.factory.TestInstanceStep'
+        )
+        self.assertEqual(timing.task, self.task)
+        self.assertEqual(timing.outcome, TaskStepTiming.OUTCOME_SUCCESS)
+        self.assertEqual(
+            timing.engine, '{}'.format(self.instance.databaseinfra.engine)
+        )
+        self.assertGreaterEqual(timing.duration, 2)
+
+    def test_register_never_raises(self):
+        self.assertIsNone(TaskStepTiming.register(
+            TestInstanceStep, None, False, task=self.task
+        ))
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summary(self):
+        for duration in range(1, 21):
+            self.create_timing('step.Slow', duration)
+        self.create_timing('step.Fast', 1)
+        self.create_timing('step.Fast', 3, TaskStepTiming.OUTCOME_FAILED)
+
+        slow, fast = TaskStepTiming.summary()
+
+        self.assertEqual(slow['step'], 'step.Slow')
+        self.assertEqual(slow['count'], 20)
+        self.assertEqual(slow['p50'], 10)
+        self.assertEqual(slow['p95'], 19)
+        self.assertEqual(slow['max'], 20)
+        self.assertEqual(fast['failures'], 1)
+        self.assertEqual(fast['p95'], 3)
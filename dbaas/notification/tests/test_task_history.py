@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 from django.test import TestCase
-from notification.models import TaskHistory
+from notification.models import TaskHistory, TaskCheckpoint
 from notification.tests.factory import TaskHistoryFactory
 from logical.tests.factory import DatabaseFactory
 from logical.models import Database
@@ -105,3 +105,86 @@ class TaskHistoryTestCase(TestCase):
     def test_is_not_error(self):
         self.task.task_status = TaskHistory.STATUS_SUCCESS
         self.assertFalse(self.task.is_status_error)
+
+    def test_can_do_create_database_retry(self):
+        self.task.task_name = 'notification.tasks.create_database'
+        self.task.task_status = TaskHistory.STATUS_ERROR
+        can_do_retry, error = self.task.can_do_create_database_retry()
+        self.assertFalse(can_do_retry)
+
+        TaskCheckpoint.objects.create(task=self.task, step=1, state='{}')
+        can_do_retry, error = self.task.can_do_create_database_retry()
+        self.assertTrue(can_do_retry)
+        self.assertIsNone(error)
+
+    def test_cannot_retry_other_tasks(self):
+        self.task.task_name = 'notification.tasks.destroy_database'
+        self.task.task_status = TaskHistory.STATUS_ERROR
+        TaskCheckpoint.objects.create(task=self.task, step=1, state='{}')
+
+        can_do_retry, error = self.task.can_do_create_database_retry()
+        self.assertFalse(can_do_retry)
+
+    def test_details_are_stored_as_lines(self):
+        self.task.add_detail(message='Testing')
+        self.task.add_detail(message='Again', level=1)
+        self.task.flush_lines()
+
+        lines = list(self.task.lines.values_list('seq', 'level', 'message'))
+        self.assertEqual(lines, [(0, 0, 'Testing'), (1, 1, 'Again')])
+
+        task = TaskHistory.objects.get(pk=self.task.pk)
+        self.assertEqual('Testing\n-> Again', task.details)
+
+    def test_lines_are_flushed_in_a_single_insert(self):
+        self.task.LINES_FLUSH_INTERVAL = 3600
+        with self.assertNumQueries(1):
+            for i in range(10):
+                self.task.add_detail(message='Line {}'.format(i))
+        # the insert and the update of last_detail
+        with self.assertNumQueries(2):
+            self.task.flush_lines()
+
+        self.assertEqual(self.task.lines.count(), 10)
+
+    def test_update_details_continues_last_line(self):
+        self.task.add_detail(message='Loading')
+        self.task.update_details('... done', persist=True)
+
+        task = TaskHistory.objects.get(pk=self.task.pk)
+        self.assertEqual('Loading... done', task.details)
+
+    def test_last_detail_line(self):
+        self.assertIsNone(self.task.last_detail_line())
+
+        self.task.add_step(step=1, total=2, description='first')
+        self.task.add_detail(message='Checking')
+        self.task.update_details('\nDone', persist=True)
+
+        task = TaskHistory.objects.get(pk=self.task.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual('Done', task.last_detail_line())
+
+    def test_last_detail_line_of_legacy_details(self):
+        self.task.legacy_details = 'Old line\nLast old line'
+        self.task.save()
+
+        task = TaskHistory.objects.get(pk=self.task.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual('Last old line', task.last_detail_line())
+
+    def test_legacy_details_come_first(self):
+        self.task.legacy_details = 'Old line'
+        self.task.save()
+        self.task.add_detail(message='New line')
+        self.task.flush_lines()
+
+        task = TaskHistory.objects.get(pk=self.task.pk)
+        self.assertEqual('Old line\nNew line', task.details)
+
+    def test_lines_are_saved_with_the_task(self):
+        task = TaskHistory(task_name='test')
+        task.add_detail(message='Testing')
+        task.save()
+
+        self.assertEqual(task.lines.count(), 1)
@@ -54,7 +54,7 @@ def database_tasks(self, database_id):
         name = task.task_name.split('.')[-1]
         name = name.replace("_", " ")
 
-        step = task.details.split('\n')[-1]
+        step = task.last_detail_line() or ''
         if "Step" in step:
             step = step.split(" - ", 1)[1]
 
@@ -12,12 +12,22 @@ from django.utils.html import format_html
 from django.utils.translation import ugettext_lazy as _
 from django_extensions.db.fields.encrypted import EncryptedCharField
 from util.models import BaseModel
-from drivers import DatabaseInfraStatus
+from util.cache import LRUCache
+from drivers import DatabaseInfraStatus, invalidate_endpoints
+from drivers.pool import POOL_REGISTRY
 from system.models import Configuration
 from .errors import NoDiskOfferingGreaterError, NoDiskOfferingLesserError
 
 LOG = logging.getLogger(__name__)
 
+SCRIPT_CONTENT_CACHE = LRUCache(max_size=100)
+
+# Changes on these fields close the pooled connections to the databaseinfra
+POOL_INFRA_FIELDS = {'user', 'password', 'endpoint'}
+POOL_INSTANCE_FIELDS = {
+    'address', 'port', 'is_active', 'instance_type', 'databaseinfra'
+}
+
 
 class Environment(BaseModel):
     name = models.CharField(
@@ -163,8 +173,16 @@ class Script(BaseModel):
             physical_path = os.path.dirname(os.path.abspath(__file__))
             path = '{}/scripts/{}'.format(physical_path, file_name)
 
+        # Cached by modification time, so edited scripts are read again
+        modified_at = os.path.getmtime(path)
+        cached = SCRIPT_CONTENT_CACHE.get(path)
+        if cached and cached[0] == modified_at:
+            return cached[1]
+
         with open(path) as f:
-            return f.read()
+            content = f.read()
+        SCRIPT_CONTENT_CACHE.set(path, (modified_at, content))
+        return content
 
     @property
     def initialization_template(self):
@@ -571,19 +589,47 @@ class DatabaseInfra(BaseModel):
     def check_instances_status(self):
         alive_instances = self.instances.filter(status=Instance.ALIVE).count()
         dead_instances = self.instances.filter(status=Instance.DEAD).count()
+        return self.instances_status_for(alive_instances, dead_instances)
 
+    @classmethod
+    def instances_status_for(cls, alive_instances, dead_instances):
         if dead_instances == 0:
-            status = self.ALIVE
+            status = cls.ALIVE
         elif alive_instances == 0:
-            status = self.DEAD
+            status = cls.DEAD
         else:
-            status = self.ALERT
+            status = cls.ALERT
 
         return status
 
+    @classmethod
+    def instances_status_by_databaseinfra(cls):
+        """ check_instances_status for every databaseinfra in one query """
+        counts = {}
+        instances = Instance.objects.values(
+            'databaseinfra_id', 'status'
+        ).annotate(total=models.Count('id'))
+        for row in instances:
+            alive_dead = counts.setdefault(row['databaseinfra_id'], [0, 0])
+            if row['status'] == Instance.ALIVE:
+                alive_dead[0] += row['total']
+            elif row['status'] == Instance.DEAD:
+                alive_dead[1] += row['total']
+
+        return {
+            databaseinfra_id: cls.instances_status_for(alive, dead)
+            for databaseinfra_id, (alive, dead) in counts.items()
+        }
+
     def get_driver(self):
-        import drivers
-        return drivers.factory_for(self)
+        """ The driver is built once and kept while this object lives,
+        usually a request or a task """
+        driver = self.__dict__.get('_driver')
+        if driver is None:
+            import drivers
+            driver = drivers.factory_for(self)
+            self._driver = driver
+        return driver
 
     def get_info(self, force_refresh=False):
         if not self.pk:
@@ -847,7 +893,7 @@ class Instance(BaseModel):
     def is_current_write(self):
         try:
             driver = self.databaseinfra.get_driver()
-            return driver.check_instance_is_master(instance=self)
+            return driver.get_topology().is_master(self)
         except:
             return False
 
@@ -1012,6 +1058,9 @@ def instance_pre_delete(sender, **kwargs):
         snapshot.purge_at = datetime.datetime.now()
         snapshot.save()
 
+    POOL_REGISTRY.invalidate(instance.databaseinfra_id, instance.pk)
+    invalidate_endpoints(instance.databaseinfra_id)
+
     LOG.debug("instance pre-delete triggered")
 
 
@@ -1025,6 +1074,28 @@ def databaseinfra_post_save(sender, **kwargs):
     LOG.debug("databaseinfra %s endpoint: %s" %
               (databaseinfra, databaseinfra.endpoint))
 
+    update_fields = kwargs.get('update_fields')
+    if not update_fields or set(update_fields) & POOL_INFRA_FIELDS:
+        POOL_REGISTRY.invalidate(databaseinfra.pk)
+
+    # engine or plan may have changed the driver and its endpoints
+    databaseinfra.__dict__.pop('_driver', None)
+    invalidate_endpoints(databaseinfra.pk)
+
+
+@receiver(post_save, sender=Instance)
+def instance_post_save(sender, **kwargs):
+    """
+    instance post save
+    """
+    instance = kwargs.get('instance')
+
+    update_fields = kwargs.get('update_fields')
+    if not update_fields or set(update_fields) & POOL_INSTANCE_FIELDS:
+        POOL_REGISTRY.invalidate(instance.databaseinfra_id, instance.pk)
+
+    invalidate_endpoints(instance.databaseinfra_id)
+
 
 simple_audit.register(
     EngineType, Engine, Plan, PlanAttribute, DatabaseInfra, Instance)
@@ -1,19 +1,139 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 import logging
+import os
+import threading
+import time
+import redis
 import simple_audit
-from django.core.cache import cache
-from django.db import models
+from django.core.cache import get_cache
+from django.db import connection as db_connection, models, transaction
 from django.utils.translation import ugettext_lazy as _
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django_redis import get_redis_connection
 from util.models import BaseModel
+from util.cache import LRUCache
 import datetime
 
 
 CACHE_MISS = object()
 LOG = logging.getLogger(__name__)
 
+# Configurations are read from LOCAL_CACHE, then from the shared redis cache
+# and only then from the database. Changes are published on
+# INVALIDATION_CHANNEL so every process drops its local copy at once, local
+# copies also expire in case a message is missed.
+SHARED_CACHE_ALIAS = 'configuration'
+INVALIDATION_CHANNEL = 'dbaas:configuration:invalidate'
+LOCAL_CACHE = LRUCache(max_size=1024)
+LOCAL_CACHE_TIMEOUT = 60  # seconds
+LISTENER_RETRY_SECONDS = 5
+COMMIT_WAIT_TIMEOUT = 60  # seconds
+COMMIT_POLL_INTERVAL = 0.1  # seconds
+_listener = {'pid': None}
+_listener_lock = threading.Lock()
+
+
+def shared_cache():
+    return get_cache(SHARED_CACHE_ALIAS)
+
+
+def invalidate_local_cache(name):
+    LOCAL_CACHE.delete(name)
+
+
+def after_commit(function, *args):
+    """
+    Calls function(*args) once the transaction of this thread ends. Django
+    1.6 has no commit hooks, so a thread waits for the connection to leave
+    its atomic block. The transaction may have been rolled back, function
+    must read what it needs from the database.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        function(*args)
+        return
+
+    def wait():
+        try:
+            started_at = time.time()
+            while connection.in_atomic_block and \
+                    time.time() - started_at < COMMIT_WAIT_TIMEOUT:
+                time.sleep(COMMIT_POLL_INTERVAL)
+            function(*args)
+        except Exception as e:
+            LOG.warning("Error running %s after commit: %s", function, e)
+        finally:
+            # the database connection of this thread
+            db_connection.close()
+
+    thread = threading.Thread(target=wait, name='configuration-after-commit')
+    thread.daemon = True
+    thread.start()
+
+
+def refresh_shared_cache(*names):
+    """ Writes the committed value of each configuration to the shared
+    cache, None when it does not exist, and publishes the change """
+    for name in names:
+        invalidate_local_cache(name)
+        try:
+            value = Configuration.objects.filter(name=name).values_list(
+                'value', flat=True
+            ).first()
+            shared_cache().set(Configuration.get_cache_key(name), value)
+            get_redis_connection(SHARED_CACHE_ALIAS).publish(
+                INVALIDATION_CHANNEL, name
+            )
+        except Exception as e:
+            LOG.warning("Could not invalidate configuration %s: %s", name, e)
+
+
+def start_invalidation_listener():
+    """ Subscribes this process to configuration changes, once per pid so
+    forked workers subscribe again """
+    pid = os.getpid()
+    if _listener['pid'] == pid:
+        return
+
+    with _listener_lock:
+        if _listener['pid'] == pid:
+            return
+        _listener['pid'] = pid
+        thread = threading.Thread(
+            target=_listen_invalidations, name='configuration-invalidation'
+        )
+        thread.daemon = True
+        thread.start()
+
+
+def _subscriber_connection():
+    """ A connection like the shared cache's, but without its socket
+    timeout, which would break a subscription idle for that long """
+    pool = get_redis_connection(SHARED_CACHE_ALIAS).connection_pool
+    kwargs = dict(pool.connection_kwargs, socket_timeout=None)
+    return redis.StrictRedis(connection_pool=redis.ConnectionPool(
+        connection_class=pool.connection_class, **kwargs
+    ))
+
+
+def _listen_invalidations():
+    while True:
+        try:
+            pubsub = _subscriber_connection().pubsub(
+                ignore_subscribe_messages=True
+            )
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # changes published while disconnected were missed
+            LOCAL_CACHE.clear()
+            for message in pubsub.listen():
+                if message['type'] == 'message':
+                    invalidate_local_cache(message['data'])
+        except Exception as e:
+            LOG.warning("Configuration invalidation listener: %s", e)
+        time.sleep(LISTENER_RETRY_SECONDS)
+
 
 class Configuration(BaseModel):
 
@@ -24,11 +144,6 @@ class Configuration(BaseModel):
     description = models.TextField(
         verbose_name=_("Description"), null=True, blank=True)
 
-    def clear_cache(self):
-        key = self.get_cache_key(self.name)
-        cache.delete(key)
-        # cache.clear()
-
     @classmethod
     def get_cache_key(cls, configuration_name):
         return 'cfg:%s' % configuration_name
@@ -59,11 +174,29 @@ class Configuration(BaseModel):
 
     @classmethod
     def get_by_name(cls, name):
+        start_invalidation_listener()
+
+        now = time.time()
+        entry = LOCAL_CACHE.get(name)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
         key = cls.get_cache_key(name)
-        value = cache.get(key, CACHE_MISS)
+        try:
+            value = shared_cache().get(key, CACHE_MISS)
+        except Exception as e:
+            LOG.warning("Could not read configuration cache: %s", e)
+            value = CACHE_MISS
+
         if value is CACHE_MISS:
             value = Configuration.__get_by_name(name)
-            cache.set(key, value)
+            try:
+                # add never replaces a value refreshed after the read
+                shared_cache().add(key, value)
+            except Exception as e:
+                LOG.warning("Could not write configuration cache: %s", e)
+
+        LOCAL_CACHE.set(name, (now + LOCAL_CACHE_TIMEOUT, value))
         return value
 
     @classmethod
@@ -81,11 +214,32 @@ class Configuration(BaseModel):
             return None
 
 
-@receiver([post_save, post_delete], sender=Configuration)
+@receiver(pre_save, sender=Configuration)
+def keep_previous_configuration_name(sender, **kwargs):
+    configuration = kwargs.get("instance")
+    configuration.previous_name = None
+    if configuration.pk:
+        configuration.previous_name = Configuration.objects.filter(
+            pk=configuration.pk
+        ).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Configuration)
+def update_configuration_cache(sender, **kwargs):
+    configuration = kwargs.get("instance")
+    LOG.info('Updating configuration cache for name=%s', configuration.name)
+    names = [configuration.name]
+    previous_name = getattr(configuration, 'previous_name', None)
+    if previous_name and previous_name != configuration.name:
+        names.append(previous_name)
+    after_commit(refresh_shared_cache, *names)
+
+
+@receiver(post_delete, sender=Configuration)
 def clear_configuration_cache(sender, **kwargs):
     configuration = kwargs.get("instance")
     LOG.info('Clearing configuration for name=%s', configuration.name)
-    configuration.clear_cache()
+    after_commit(refresh_shared_cache, configuration.name)
 
 
 simple_audit.register(Configuration)
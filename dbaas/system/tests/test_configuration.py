@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
+import time
+from mock import patch
 from django.test import TestCase
 from django.db import IntegrityError
 # from . import factory
-from ..models import Configuration
+from ..models import Configuration, LOCAL_CACHE, INVALIDATION_CHANNEL, \
+    invalidate_local_cache, after_commit
 
 
 import logging
@@ -21,3 +24,129 @@ class ConfigurationTest(TestCase):
         Tests get empty list when variable name does not exists
         """
         self.assertEquals(Configuration.get_by_name_as_list("abc"), [])
+
+
+@patch('system.models.start_invalidation_listener')
+@patch('system.models.get_redis_connection')
+@patch('system.models.shared_cache')
+class ConfigurationCacheTest(TestCase):
+
+    def setUp(self):
+        LOCAL_CACHE.clear()
+        self.shared = {}
+        # TestCase never commits, refresh as if it did
+        self.after_commit = patch(
+            'system.models.after_commit',
+            side_effect=lambda function, *args: function(*args)
+        )
+        self.after_commit.start()
+
+    def tearDown(self):
+        self.after_commit.stop()
+        LOCAL_CACHE.clear()
+
+    def fake_shared_cache(self, shared_cache):
+        shared_cache.return_value.get.side_effect = self.shared.get
+        shared_cache.return_value.set.side_effect = self.shared.__setitem__
+        shared_cache.return_value.add.side_effect = self.shared.setdefault
+
+    def test_value_is_read_from_memory(self, shared_cache, redis, listener):
+        self.fake_shared_cache(shared_cache)
+        Configuration.objects.create(name='abc', value='10')
+        LOCAL_CACHE.clear()
+
+        self.assertEqual(Configuration.get_by_name_as_int('abc'), 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(Configuration.get_by_name_as_int('abc'), 10)
+        self.assertEqual(shared_cache.return_value.get.call_count, 1)
+
+    def test_value_is_read_from_shared_cache(self, shared_cache, redis,
+                                             listener):
+        self.fake_shared_cache(shared_cache)
+        self.shared[Configuration.get_cache_key('abc')] = '20'
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Configuration.get_by_name('abc'), '20')
+
+    def test_change_is_published(self, shared_cache, redis, listener):
+        self.fake_shared_cache(shared_cache)
+        configuration = Configuration.objects.create(name='abc', value='10')
+        Configuration.get_by_name('abc')
+
+        configuration.value = '30'
+        configuration.save()
+
+        redis.return_value.publish.assert_called_with(
+            INVALIDATION_CHANNEL, 'abc'
+        )
+        self.assertEqual(self.shared[Configuration.get_cache_key('abc')], '30')
+        self.assertNotIn('abc', LOCAL_CACHE)
+
+    def test_delete_is_published(self, shared_cache, redis, listener):
+        self.fake_shared_cache(shared_cache)
+        configuration = Configuration.objects.create(name='abc', value='10')
+        Configuration.get_by_name('abc')
+
+        configuration.delete()
+
+        redis.return_value.publish.assert_called_with(
+            INVALIDATION_CHANNEL, 'abc'
+        )
+        self.assertIsNone(self.shared[Configuration.get_cache_key('abc')])
+        self.assertNotIn('abc', LOCAL_CACHE)
+
+    def test_rename_refreshes_previous_name(self, shared_cache, redis,
+                                            listener):
+        self.fake_shared_cache(shared_cache)
+        configuration = Configuration.objects.create(name='abc', value='10')
+        Configuration.get_by_name('abc')
+
+        configuration.name = 'xyz'
+        configuration.save()
+
+        self.assertIsNone(self.shared[Configuration.get_cache_key('abc')])
+        self.assertEqual(self.shared[Configuration.get_cache_key('xyz')], '10')
+        redis.return_value.publish.assert_any_call(INVALIDATION_CHANNEL, 'abc')
+        redis.return_value.publish.assert_any_call(INVALIDATION_CHANNEL, 'xyz')
+
+    def test_read_does_not_replace_refreshed_value(self, shared_cache, redis,
+                                                   listener):
+        self.fake_shared_cache(shared_cache)
+        Configuration.objects.create(name='abc', value='10')
+        LOCAL_CACHE.clear()
+        # another process refreshes the value after this one missed it
+        shared_cache.return_value.get.side_effect = lambda key, default: \
+            default
+        self.shared[Configuration.get_cache_key('abc')] = '30'
+
+        Configuration.get_by_name('abc')
+
+        self.assertEqual(self.shared[Configuration.get_cache_key('abc')], '30')
+
+    def test_published_change_drops_local_value(self, shared_cache, redis,
+                                                listener):
+        LOCAL_CACHE.set('abc', (time.time() + 60, '10'))
+
+        invalidate_local_cache('abc')
+
+        self.assertNotIn('abc', LOCAL_CACHE)
+
+    def test_refresh_waits_for_commit(self, shared_cache, redis, listener):
+        self.after_commit.stop()
+        called = []
+        with patch('system.models.transaction') as transaction, \
+                patch('system.models.threading') as threading:
+            transaction.get_connection.return_value.in_atomic_block = True
+
+            after_commit(called.append, 'abc')
+
+            self.assertEqual(called, [])
+            self.assertTrue(threading.Thread.return_value.start.called)
+        self.after_commit.start()
+
+    def test_works_without_shared_cache(self, shared_cache, redis, listener):
+        shared_cache.return_value.get.side_effect = Exception('down')
+        Configuration.objects.create(name='abc', value='10')
+        LOCAL_CACHE.clear()
+
+        self.assertEqual(Configuration.get_by_name('abc'), '10')
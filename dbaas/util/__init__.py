@@ -1,39 +1,31 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
-from time import sleep
-import paramiko
-import socket
+import hashlib
 import re
 from slugify import slugify as slugify_function
 from django.contrib.auth.models import User
 from django.http import HttpResponse
 import json
 import logging
-import subprocess
-import signal
 import os
 import traceback
 import sys
+import time
 from billiard import current_process
 from django.utils.module_loading import import_by_path
+from util.ssh import exec_command, ssh_session, ssh_pool_stats, \
+    stream_output, wait_for_ssh, CommandTimeout, SSH_ERRORS, \
+    SSH_READY_DEADLINE, STREAM_TAIL_SIZE
+from util.parallel import run_in_parallel
+from util.process import run_process, PROCESS_TAIL_SIZE
+from util.cache import LRUCache
 
 
 LOG = logging.getLogger(__name__)
 
-# See http://docs.python.org/2/library/subprocess.html#popen-constructor if you
-# have questions about this variable
-DEFAULT_OUTPUT_BUFFER_SIZE = 16384
 PROCESS_TIMEOUT = 4 * 60 * 60  # 4 horas
 
 
-class AlarmException(Exception):
-    pass
-
-
-def alarm_handler(signum, frame):
-    raise AlarmException
-
-
 def slugify(string):
     return slugify_function(string, separator="_")
 
@@ -54,8 +46,19 @@ def as_json(f):
     return wrapper
 
 
+def log_script_line(line, stream):
+    """ call_script callback logging each line of the script output """
+    LOG.info("Script: %s", line)
+
+
 def call_script(script_name, working_dir=None, split_lines=True, args=[],
-                envs={}, shell=False, python_bin=None):
+                envs={}, shell=False, python_bin=None, callback=None,
+                timeout=PROCESS_TIMEOUT, tail_size=PROCESS_TAIL_SIZE):
+    """
+    Runs a script from working_dir. The output is read while the script
+    runs and callback(line, stream) is called for each line; only the last
+    tail_size bytes of output are returned.
+    """
 
     args_copy = []
     for arg in args:
@@ -83,12 +86,6 @@ def call_script(script_name, working_dir=None, split_lines=True, args=[],
         if envs:
             envs_with_path.update(envs)
 
-        # For future, if scripts have lot of output can be better
-        # create a temporary file for stdout. Scripts with lot
-        # of output and subprocess.PIPE
-        # can lock because this method not consume stdout without script finish
-        # execute.
-
         LOG.info("Args: {}".format(args))
 
         if python_bin:
@@ -96,31 +93,21 @@ def call_script(script_name, working_dir=None, split_lines=True, args=[],
         else:
             exec_script = [working_dir + script_name] + args
 
-        process = subprocess.Popen(
+        result = run_process(
             exec_script,
-            bufsize=DEFAULT_OUTPUT_BUFFER_SIZE,
-            stdin=None,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,  # stderr and stdout are the same
-            close_fds=True,
             cwd=working_dir,
             env=envs_with_path,
-            universal_newlines=True,
-            shell=shell)
-
-        if not shell:
-            signal.signal(signal.SIGALRM, alarm_handler)
-            signal.alarm(PROCESS_TIMEOUT)
-        try:
-            process.wait()
-            signal.alarm(0)  # Disable the alarm
-        except AlarmException:
-            LOG.error("Timeout %s exceeded for process id %s" %
-                      (PROCESS_TIMEOUT, process.pid))
-            process.kill()
-
-        output = process.stdout.read()
-        return_code = process.returncode
+            shell=shell,
+            timeout=timeout,
+            callback=callback,
+            tail_size=tail_size
+        )
+
+        output = result.output
+        return_code = result.return_code
+        if result.truncated:
+            LOG.info("Output of %s truncated to the last %s bytes",
+                     script_name, tail_size)
 
         LOG.debug("output: {} \n return_code: {}".format(output, return_code))
 
@@ -138,47 +125,20 @@ def call_script(script_name, working_dir=None, split_lines=True, args=[],
         return return_code, output
 
 
-def check_nslookup(dns_to_check, dns_server, retries=90, wait=10):
-    try:
-        LOG.info("Cheking dns...")
-        for attempt in range(0, retries):
-            LOG.info("Cheking dns... attempt number %s..." % str(attempt + 1))
-
-            result = subprocess.Popen("nslookup %s %s" % (
-                dns_to_check, dns_server), stdout=subprocess.PIPE, shell=True)
-            (output, err) = result.communicate()
-            indexes = [i for i, x in enumerate(output.split('\n')) if re.match(
-                r'\W*' + "Address" + r'\W*', x)]
-
-            LOG.info("Nslookup output: %s" % output)
-
-            if len(indexes) == 2:
-                LOG.info("%s is available!" % dns_to_check)
-                return True
-            sleep(wait)
-
-        return False
-    except Exception as e:
-        LOG.warn("We caught an exception %s" % e)
-        return None
-
-
 def scp_file(server, username, password, localpath, remotepath, option):
 
     try:
-        transport = paramiko.Transport((server, 22))
-        transport.connect(username=username, password=password)
-
-        sftp = paramiko.SFTPClient.from_transport(transport)
-        if option == 'PUT':
-            sftp.put(localpath, remotepath)
-        elif option == 'GET':
-            sftp.get(remotepath, localpath)
-        else:
-            raise Exception("Invalid option...")
-
-        sftp.close()
-        transport.close()
+        with ssh_session(server, username, password) as client:
+            sftp = client.open_sftp()
+            try:
+                if option == 'PUT':
+                    sftp.put(localpath, remotepath)
+                elif option == 'GET':
+                    sftp.get(remotepath, localpath)
+                else:
+                    raise Exception("Invalid option...")
+            finally:
+                sftp.close()
         return True
 
     except Exception as e:
@@ -221,34 +181,58 @@ def get_mongodb_key_file(infra):
     return get_remote_file_content('/data/mongodb.key', instance.hostname)
 
 
-def exec_remote_command(server, username, password, command, output={}):
+def _read_output(stdin, stdout, stderr):
+    log_stdout = stdout.readlines()
+    log_stderr = stderr.readlines()
+    exit_status = stdout.channel.recv_exit_status()
+    return exit_status, log_stdout, log_stderr
 
+
+def _exec_remote_command(server, username, password, command, output,
+                         read_output):
     try:
         LOG.info(
             "Executing command [%s] on remote server %s" % (command, server))
-        client = paramiko.SSHClient()
-        client.load_system_host_keys()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(server, username=username, password=password)
-
-        stdin, stdout, stderr = client.exec_command(command)
-        log_stdout = stdout.readlines()
-        log_stderr = stderr.readlines()
-        exit_status = stdout.channel.recv_exit_status()
+        exit_status, log_stdout, log_stderr = exec_command(
+            server, username, password, command, read_output
+        )
         LOG.info("Comand return code: %s, stdout: %s, stderr %s" %
                  (exit_status, log_stdout, log_stderr))
+        LOG.debug("SSH sessions pool: %s" % ssh_pool_stats())
         output['stdout'] = log_stdout
         output['stderr'] = log_stderr
         return exit_status
-    except (paramiko.ssh_exception.BadHostKeyException,
-            paramiko.ssh_exception.AuthenticationException,
-            paramiko.ssh_exception.SSHException,
-            socket.error) as e:
+    except SSH_ERRORS + (CommandTimeout,) as e:
         LOG.warning("We caught an exception: %s ." % (e))
         output['exception'] = str(e)
         return None
 
 
+def exec_remote_command(server, username, password, command, output={}):
+    return _exec_remote_command(
+        server, username, password, command, output, _read_output
+    )
+
+
+def exec_remote_command_streaming(server, username, password, command,
+                                  output={}, callback=None,
+                                  tail_size=STREAM_TAIL_SIZE):
+    """
+    Same as exec_remote_command, but the output is read while the command
+    runs: callback(line, stream) is called for each line, with stream being
+    'stdout' or 'stderr', and output keeps only the last tail_size bytes of
+    each stream.
+    """
+    def read_output(stdin, stdout, stderr):
+        return stream_output(
+            stdin, stdout, stderr, callback=callback, tail_size=tail_size
+        )
+
+    return _exec_remote_command(
+        server, username, password, command, output, read_output
+    )
+
+
 def exec_remote_command_host(host, command, output={}):
     from dbaas_cloudstack.models import HostAttr
     host_attr = HostAttr.objects.get(host=host)
@@ -262,39 +246,122 @@ def exec_remote_command_host(host, command, output={}):
     )
 
 
-def check_ssh(server, username, password, retries=30, wait=30, interval=40):
-    username = username
-    password = password
-    ssh = paramiko.SSHClient()
-    ssh.load_system_host_keys()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+REMOTE_COMMAND_MAX_WORKERS = 10
+REMOTE_COMMAND_TAIL_SIZE = 4 * 1024
+
+
+class RemoteCommandResult(object):
+
+    def __init__(self, host):
+        self.host = host
+        self.exit_status = None
+        self.stdout = []
+        self.stderr = []
+        self.error = None
+        self.duration = None
 
-    LOG.info("Waiting %s seconds to check %s ssh connection..." %
-             (wait, server))
-    sleep(wait)
+    @property
+    def ok(self):
+        return self.exit_status == 0
+
+    def __repr__(self):
+        return '<RemoteCommandResult {}: exit_status={} error={}>'.format(
+            self.host, self.exit_status, self.error
+        )
+
+
+def exec_remote_command_hosts(hosts, command,
+                              max_workers=REMOTE_COMMAND_MAX_WORKERS,
+                              timeout=None,
+                              tail_size=REMOTE_COMMAND_TAIL_SIZE):
+    """
+    Runs command on every host, at most max_workers hosts at the same time.
+
+    Returns a RemoteCommandResult for each host, in the same order of hosts,
+    with exit status, the last tail_size bytes of stdout and stderr, duration
+    and the error when the command could not run or did not finish in
+    timeout seconds. It never raises for a single host.
+    """
+    from dbaas_cloudstack.models import HostAttr
+
+    hosts = list(hosts)
+    host_attrs = {
+        host_attr.host_id: host_attr
+        for host_attr in HostAttr.objects.filter(host__in=hosts)
+    }
 
-    for attempt in range(retries):
+    def read_output(stdin, stdout, stderr):
+        return stream_output(
+            stdin, stdout, stderr, tail_size=tail_size, timeout=timeout
+        )
+
+    def run(host):
+        result = RemoteCommandResult(host)
+        started_at = time.time()
         try:
+            host_attr = host_attrs.get(host.id)
+            if not host_attr:
+                raise Exception('Host {} does not have HostAttr'.format(host))
+
+            output = {}
+            result.exit_status = _exec_remote_command(
+                server=host.address, username=host_attr.vm_user,
+                password=host_attr.vm_password, command=command,
+                output=output, read_output=read_output
+            )
+            result.stdout = output.get('stdout', [])
+            result.stderr = output.get('stderr', [])
+            result.error = output.get('exception')
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            result.duration = time.time() - started_at
+        return result
+
+    return [
+        parallel_result.value
+        for parallel_result in run_in_parallel(
+            run, hosts, max_workers=max_workers
+        )
+    ]
+
 
-            LOG.info("Login attempt number %i on %s " % (attempt + 1, server))
+def check_ssh(server, username, password, retries=30, wait=30, interval=40):
+    """ Waits up to the time the old fixed retries took, returning as soon
+    as the server is ready, see util.ssh.wait_for_ssh """
+    return wait_for_ssh(
+        server, username, password, deadline=wait + retries * interval
+    )
 
-            ssh.connect(server, port=22, username=username,
-                        password=password, timeout=None, allow_agent=True,
-                        look_for_keys=True, compress=False)
-            return True
 
-        except (paramiko.ssh_exception.BadHostKeyException,
-                paramiko.ssh_exception.AuthenticationException,
-                paramiko.ssh_exception.SSHException,
-                socket.error) as e:
+def wait_for_ssh_hosts(hosts, max_workers=REMOTE_COMMAND_MAX_WORKERS,
+                       deadline=SSH_READY_DEADLINE):
+    """
+    Waits for every host to accept SSH logins, all of them at the same time.
+    Returns the hosts not ready in deadline seconds, empty when all are.
+    """
+    from dbaas_cloudstack.models import HostAttr
+
+    hosts = list(hosts)
+    host_attrs = {
+        host_attr.host_id: host_attr
+        for host_attr in HostAttr.objects.filter(host__in=hosts)
+    }
 
-            if attempt == retries - 1:
-                LOG.error("Maximum number of login attempts : %s ." % (e))
-                return False
+    def wait(host):
+        host_attr = host_attrs.get(host.id)
+        if not host_attr:
+            raise Exception('Host {} does not have HostAttr'.format(host))
+        return wait_for_ssh(
+            host.address, host_attr.vm_user, host_attr.vm_password,
+            deadline=deadline
+        )
 
-            LOG.warning("We caught an exception: %s ." % (e))
-            LOG.info("Wating %i seconds to try again..." % (interval))
-            sleep(interval)
+    return [
+        result.item
+        for result in run_in_parallel(wait, hosts, max_workers=max_workers)
+        if not result.value
+    ]
 
 
 def get_vm_name(prefix, sufix, vm_number):
@@ -376,14 +443,29 @@ def retry(ExceptionToCheck, tries=10, delay=3, backoff=2):
     return deco_retry
 
 
+TEMPLATE_CACHE_SIZE = 256
+TEMPLATE_CACHE = LRUCache(max_size=TEMPLATE_CACHE_SIZE)
+CARRIAGE_RETURN_REGEX = re.compile(r'[\r]')
+
+
+def get_compiled_template(script):
+    """ Django Template of the script, compiled only once for the same
+    source. Compiled templates keep no render state, so they are shared """
+    from django.template import Template
+
+    script = CARRIAGE_RETURN_REGEX.sub('', str(script))
+    key = hashlib.sha1(script).hexdigest()
+    template = TEMPLATE_CACHE.get(key)
+    if template is None:
+        template = Template(script)
+        TEMPLATE_CACHE.set(key, template)
+    return template
+
+
 def build_context_script(contextdict, script):
-    from django.template import Context, Template
-    import re
-    regex = re.compile(r'[\r]')
-    script = regex.sub('', str(script))
-    context = Context(contextdict)
-    template = Template(script)
-    return template.render(context)
+    from django.template import Context
+    template = get_compiled_template(script)
+    return template.render(Context(contextdict))
 
 
 def get_worker_name():
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import logging
+import random
+import socket
+import struct
+import time
+from util.parallel import run_in_parallel
+
+LOG = logging.getLogger(__name__)
+
+DNS_PORT = 53
+QUERY_TIMEOUT = 2  # seconds
+TYPE_A = 1
+CLASS_IN = 1
+RCODE_NXDOMAIN = 3
+
+WAIT_DEADLINE = 900  # seconds, the old nslookup check gave up after 90 * 10s
+WAIT_INITIAL_BACKOFF = 1
+WAIT_MAX_BACKOFF = 30
+WAIT_MAX_WORKERS = 10
+
+
+class DNSError(Exception):
+    pass
+
+
+class UnexpectedResponse(DNSError):
+    pass
+
+
+def build_query(name, query_id):
+    """ Query for the A records of name, recursion desired """
+    header = struct.pack(b'>HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    question = b''.join(
+        struct.pack(b'B', len(label)) + label
+        for label in name.encode('idna').rstrip(b'.').split(b'.')
+    )
+    return header + question + b'\x00' + struct.pack(b'>HH', TYPE_A, CLASS_IN)
+
+
+def _skip_name(data, offset):
+    while True:
+        length = ord(data[offset:offset + 1])
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:  # compression pointer
+            return offset + 2
+        offset += length + 1
+
+
+def parse_response(data, query_id):
+    """ Returns the addresses of the A records of a response, empty when
+    the name does not exist or has no address """
+    if len(data) < 12:
+        raise DNSError("Truncated response")
+
+    response_id, flags, questions, answers, _, _ = struct.unpack(
+        b'>HHHHHH', data[:12]
+    )
+    if response_id != query_id or not flags & 0x8000:
+        raise UnexpectedResponse(response_id)
+
+    rcode = flags & 0x000F
+    if rcode == RCODE_NXDOMAIN:
+        return []
+    if rcode:
+        raise DNSError("Server error, rcode {}".format(rcode))
+
+    offset = 12
+    for _ in range(questions):
+        offset = _skip_name(data, offset) + 4
+
+    addresses = []
+    for _ in range(answers):
+        offset = _skip_name(data, offset)
+        record_type, _, _, length = struct.unpack(
+            b'>HHIH', data[offset:offset + 10]
+        )
+        offset += 10
+        if record_type == TYPE_A and length == 4:
+            addresses.append(socket.inet_ntoa(data[offset:offset + 4]))
+        offset += length
+
+    return addresses
+
+
+def resolve(name, server, port=DNS_PORT, timeout=QUERY_TIMEOUT):
+    """ Asks server for the A records of name, over UDP """
+    query_id = random.randint(0, 0xFFFF)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.settimeout(timeout)
+        sock.sendto(build_query(name, query_id), (server, port))
+        while True:
+            data, _ = sock.recvfrom(512)
+            try:
+                return parse_response(data, query_id)
+            except UnexpectedResponse:
+                continue  # late answer of another query
+    finally:
+        sock.close()
+
+
+def wait_for_dns(names, server, port=DNS_PORT, deadline=WAIT_DEADLINE,
+                 initial_backoff=WAIT_INITIAL_BACKOFF,
+                 max_backoff=WAIT_MAX_BACKOFF, max_workers=WAIT_MAX_WORKERS):
+    """
+    Waits until server resolves every name, checking all of them at the same
+    time. Each name is retried with exponential backoff until deadline
+    seconds have passed. Returns the names not resolved, empty when all of
+    them were.
+    """
+    ends_at = time.time() + deadline
+
+    def wait(name):
+        backoff = initial_backoff
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                addresses = resolve(name, server, port)
+            except (socket.error, DNSError) as e:
+                LOG.info("Checking dns %s, attempt %s: %s", name, attempt, e)
+                addresses = []
+
+            if addresses:
+                LOG.info("%s is available at %s", name, ", ".join(addresses))
+                return True
+
+            remaining = ends_at - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(backoff, remaining))
+            backoff = min(backoff * 2, max_backoff)
+
+    results = run_in_parallel(
+        wait, names, max_workers=max_workers, deadline=ends_at + QUERY_TIMEOUT
+    )
+    return [result.item for result in results if not result.value]
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
-from django.db import models
+from django.db import models, connection
 from django.utils.translation import ugettext_lazy as _
 
 
@@ -23,3 +23,87 @@ class BaseModel(models.Model):
         elif hasattr(self, '__unicode__'):
             # return super(BaseModel, self).__unicode__()
             return self.__unicode__()
+
+
+BULK_UPDATE_BATCH_SIZE = 500
+
+
+def bulk_update(model, values, fields, batch_size=BULK_UPDATE_BATCH_SIZE):
+    """
+    Writes values, a dict of pk -> {field_name: value}, skipping the rows
+    which already have those values. Returns how many rows were written.
+
+    With one field the rows are grouped by value and written with one
+    UPDATE ... WHERE pk IN (...) per value, otherwise with one
+    UPDATE ... SET field = CASE pk WHEN ... END WHERE pk IN (...) per batch.
+    Signals are not sent and auto_now fields are not touched.
+    """
+    written = 0
+    pks = sorted(values.keys())
+    for start in range(0, len(pks), batch_size):
+        batch = _changed_rows(
+            model, values, fields, pks[start:start + batch_size]
+        )
+        if not batch:
+            continue
+
+        if len(fields) == 1:
+            _update_grouped_by_value(model, values, fields[0], batch)
+        else:
+            _update_with_case(model, values, fields, batch)
+        written += len(batch)
+
+    return written
+
+
+def _changed_rows(model, values, fields, batch):
+    current_rows = model.objects.filter(pk__in=batch).values_list(
+        'pk', *fields
+    )
+    changed = []
+    for row in current_rows:
+        pk, current = row[0], row[1:]
+        new = tuple(values[pk][field] for field in fields)
+        if current != new:
+            changed.append(pk)
+    return changed
+
+
+def _update_grouped_by_value(model, values, field, batch):
+    pks_by_value = {}
+    for pk in batch:
+        pks_by_value.setdefault(values[pk][field], []).append(pk)
+
+    for value, pks in pks_by_value.items():
+        model.objects.filter(pk__in=pks).update(**{field: value})
+
+
+def _update_with_case(model, values, fields, batch):
+    opts = model._meta
+    quote_name = connection.ops.quote_name
+    pk_column = quote_name(opts.pk.column)
+
+    assignments = []
+    params = []
+    for field_name in fields:
+        field = opts.get_field(field_name)
+        column = quote_name(field.column)
+        cases = []
+        for pk in batch:
+            cases.append('WHEN %s THEN %s')
+            params.append(pk)
+            params.append(field.get_db_prep_save(
+                values[pk][field_name], connection=connection
+            ))
+        assignments.append('{} = CASE {} {} ELSE {} END'.format(
+            column, pk_column, ' '.join(cases), column
+        ))
+
+    params.extend(batch)
+    connection.cursor().execute(
+        'UPDATE {} SET {} WHERE {} IN ({})'.format(
+            quote_name(opts.db_table), ', '.join(assignments), pk_column,
+            ', '.join(['%s'] * len(batch))
+        ),
+        params
+    )
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import logging
+import threading
+import time
+from Queue import Queue, Empty
+from django.db import connection
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 10
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class ParallelResult(object):
+
+    def __init__(self, item):
+        self.item = item
+        self.value = None
+        self.error = None
+        self.started_at = None
+        self.ended_at = None
+
+    @property
+    def done(self):
+        return self.ended_at is not None
+
+    @property
+    def ok(self):
+        return self.done and self.error is None
+
+    @property
+    def timed_out(self):
+        return isinstance(self.error, DeadlineExceeded)
+
+    @property
+    def duration(self):
+        if self.started_at is None:
+            return None
+        return (self.ended_at or time.time()) - self.started_at
+
+    def __repr__(self):
+        return '<ParallelResult {}: value={} error={}>'.format(
+            self.item, self.value, self.error
+        )
+
+
+def run_in_parallel(function, items, max_workers=DEFAULT_MAX_WORKERS,
+                    deadline=None):
+    """
+    Calls function(item) for every item using at most max_workers threads
+    and returns a list of ParallelResult in the same order of items.
+
+    deadline is an absolute time.time() value. Items not finished when it is
+    reached get a DeadlineExceeded error; threads still running are left
+    behind as daemons, their results are ignored.
+    """
+    results = [ParallelResult(item) for item in items]
+    if not results:
+        return results
+
+    queue = Queue()
+    for result in results:
+        queue.put(result)
+
+    def worker():
+        try:
+            while True:
+                try:
+                    result = queue.get_nowait()
+                except Empty:
+                    return
+
+                if deadline and time.time() >= deadline:
+                    result.error = DeadlineExceeded()
+                    result.ended_at = time.time()
+                    continue
+
+                result.started_at = time.time()
+                try:
+                    result.value = function(result.item)
+                except Exception as e:
+                    LOG.warning('Error running %s for %s: %s',
+                                function, result.item, e)
+                    result.error = e
+                finally:
+                    result.ended_at = time.time()
+        finally:
+            # Each thread has its own database connection in Django
+            connection.close()
+
+    workers = []
+    for _ in range(min(max_workers, len(results))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        workers.append(thread)
+
+    for thread in workers:
+        if deadline:
+            thread.join(max(deadline - time.time(), 0))
+        else:
+            thread.join()
+
+    for result in results:
+        if not result.done:
+            result.error = DeadlineExceeded()
+
+    return results
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LOG = logging.getLogger(__name__)
+
+__all__ = ['ConnectionPoolRegistry', 'PooledConnection', 'credentials_hash']
+
+POOL_MAX_SIZE = 1000
+POOL_IDLE_TIMEOUT = 300  # seconds
+POOL_HEALTH_CHECK_INTERVAL = 30  # seconds
+
+
+def credentials_hash(user, password):
+    credentials = '{}:{}'.format(user or '', password or '')
+    return hashlib.sha1(credentials.encode('utf-8')).hexdigest()
+
+
+class PooledConnection(object):
+
+    def __init__(self, key, client, close=None, health_check=None,
+                 shared=True):
+        self.key = key
+        self.client = client
+        self.shared = shared
+        self._close = close
+        self._health_check = health_check
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+        # callers holding the connection, changed with the registry lock
+        self.in_use = 0
+        # no longer handed out, closed when the last caller releases it
+        self.unlinked = False
+
+    def is_healthy(self):
+        if not self._health_check:
+            return True
+        try:
+            self._health_check(self.client)
+        except Exception as e:
+            LOG.info('Pooled connection %s failed health check: %s',
+                     self.key, e)
+            return False
+        self.last_checked = time.time()
+        return True
+
+    def close(self):
+        if not self._close:
+            return
+        try:
+            self._close(self.client)
+        except Exception:
+            LOG.warn('Error closing pooled connection %s. Ignoring...',
+                     self.key, exc_info=True)
+
+
+class ConnectionPoolRegistry(object):
+
+    """
+    Process level registry of database connections.
+
+    Shared connections (clients which are thread safe and pool their own
+    sockets, like MongoClient and StrictRedis) are handed out to every caller
+    of the same key. Not shared connections (like MySQL sessions) are checked
+    out exclusively and returned to the pool when the caller is done.
+
+    Connections in use are never closed: expiring, discarding or
+    invalidating them only stops handing them out, and they are closed when
+    the last caller releases them.
+    """
+
+    def __init__(self, max_size=POOL_MAX_SIZE, idle_timeout=POOL_IDLE_TIMEOUT,
+                 health_check_interval=POOL_HEALTH_CHECK_INTERVAL):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = {}
+        # not shared connections checked out, so invalidate can reach them
+        self._busy = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _check_pid(self):
+        # Connections opened before a fork (celery prefork workers) belong to
+        # the parent process, so they are dropped without being closed
+        if self._pid != os.getpid():
+            self._reset()
+
+    def __len__(self):
+        with self._lock:
+            self._check_pid()
+            return sum(len(entries) for entries in self._idle.values())
+
+    @property
+    def reuse_ratio(self):
+        """ Share of acquired connections that were already open """
+        total = self.hits + self.misses
+        if not total:
+            return 0.0
+        return float(self.hits) / total
+
+    def acquire(self, key, factory, close=None, health_check=None,
+                shared=True):
+        if key is None:
+            return PooledConnection(
+                key, factory(), close=close, shared=False
+            )
+
+        entry = None
+        with self._lock:
+            self._check_pid()
+            expired = self._pop_expired()
+
+            entries = self._idle.get(key, [])
+            if entries:
+                entry = entries[-1]
+                entry.in_use += 1
+                if not shared:
+                    self._remove(entry)
+                    self._busy.setdefault(key, []).append(entry)
+
+        for expired_entry in expired:
+            expired_entry.close()
+
+        if entry:
+            now = time.time()
+            if now - entry.last_checked < self.health_check_interval or \
+                    entry.is_healthy():
+                entry.last_used = now
+                with self._lock:
+                    self.hits += 1
+                return entry
+            self.discard(entry)
+
+        with self._lock:
+            self.misses += 1
+        entry = PooledConnection(
+            key, factory(), close=close, health_check=health_check,
+            shared=shared
+        )
+        entry.in_use = 1
+        if shared:
+            self._add(entry)
+        else:
+            with self._lock:
+                self._check_pid()
+                self._busy.setdefault(key, []).append(entry)
+        return entry
+
+    def release(self, entry):
+        if entry.key is None:
+            entry.close()
+            return
+
+        to_close = []
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.time()
+            if not entry.shared:
+                self._remove(entry, self._busy)
+            if entry.unlinked and not entry.in_use:
+                to_close.append(entry)
+            elif not entry.shared:
+                to_close.extend(self._push(entry))
+
+        for pooled in to_close:
+            pooled.close()
+
+    def discard(self, entry):
+        """ Stops handing out entry and releases it """
+        with self._lock:
+            self._unlink(entry)
+        self.release(entry)
+
+    @contextmanager
+    def connection(self, key, factory, close=None, health_check=None,
+                   shared=True, discard_on=(Exception,)):
+        entry = self.acquire(
+            key, factory, close=close, health_check=health_check,
+            shared=shared
+        )
+        discarded = False
+        try:
+            yield entry.client
+        except discard_on:
+            discarded = True
+            self.discard(entry)
+            raise
+        finally:
+            if not discarded:
+                self.release(entry)
+
+    def invalidate(self, databaseinfra_id, instance_id=None):
+        """ Closes connections of a databaseinfra. When instance_id is given
+        only the connections to that instance and to the whole
+        databaseinfra are closed. Connections checked out are closed when
+        they are released """
+        invalidated = []
+        with self._lock:
+            self._check_pid()
+            for key, entries in self._all_entries():
+                if key[0] != databaseinfra_id:
+                    continue
+                if instance_id and key[1] not in (instance_id, None):
+                    continue
+                invalidated.extend(entries)
+
+            to_close = [entry for entry in invalidated if self._unlink(entry)]
+
+        for entry in to_close:
+            entry.close()
+
+        if invalidated:
+            LOG.debug('%s pooled connections invalidated for databaseinfra %s',
+                      len(invalidated), databaseinfra_id)
+
+    def clear(self):
+        with self._lock:
+            entries = [
+                entry for _, entries in self._all_entries()
+                for entry in entries
+            ]
+            to_close = [entry for entry in entries if self._unlink(entry)]
+            self._reset()
+
+        for entry in to_close:
+            entry.close()
+
+    def _add(self, entry):
+        with self._lock:
+            self._check_pid()
+            to_close = self._push(entry)
+
+        for pooled in to_close:
+            pooled.close()
+
+    def _push(self, entry):
+        """ Must be called with the lock held. Returns the connections
+        evicted to stay under max_size, to be closed out of the lock """
+        to_close = []
+        self._idle.setdefault(entry.key, []).append(entry)
+
+        size = sum(len(entries) for entries in self._idle.values())
+        exceeded = size - self.max_size
+        if exceeded > 0:
+            all_entries = [
+                pooled for entries in self._idle.values()
+                for pooled in entries if not pooled.in_use
+            ]
+            all_entries.sort(key=lambda pooled: pooled.last_used)
+            for pooled in all_entries[:exceeded]:
+                self._unlink(pooled)
+                to_close.append(pooled)
+        return to_close
+
+    def _all_entries(self):
+        """ (key, entries) of idle and checked out connections """
+        for pool in (self._idle, self._busy):
+            for key, entries in list(pool.items()):
+                yield key, list(entries)
+
+    def _unlink(self, entry):
+        """ Must be called with the lock held. Returns whether entry can
+        be closed now, when nobody is using it """
+        self._remove(entry)
+        entry.unlinked = True
+        return not entry.in_use
+
+    def _remove(self, entry, pool=None):
+        pool = self._idle if pool is None else pool
+        entries = pool.get(entry.key, [])
+        if entry in entries:
+            entries.remove(entry)
+        if not entries:
+            pool.pop(entry.key, None)
+
+    def _pop_expired(self):
+        """ Must be called with the lock held. The returned connections
+        must be closed by the caller, out of the lock """
+        limit = time.time() - self.idle_timeout
+        expired = [
+            entry for entries in self._idle.values() for entry in entries
+            if entry.last_used < limit and not entry.in_use
+        ]
+        for entry in expired:
+            self._unlink(entry)
+        return expired
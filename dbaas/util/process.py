@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import logging
+import os
+import select
+import signal
+import subprocess
+import threading
+from distutils.spawn import find_executable
+from util.ssh import OutputTail
+
+LOG = logging.getLogger(__name__)
+
+PROCESS_CHUNK_SIZE = 16384
+PROCESS_TAIL_SIZE = 1024 * 1024  # bytes of output kept in memory
+PROCESS_POLL_INTERVAL = 0.5  # seconds
+# Starts the process in its own session. preexec_fn=os.setsid is not used
+# because it is not safe when the parent runs other threads
+SETSID = find_executable('setsid')
+
+
+class ProcessResult(object):
+
+    def __init__(self, return_code, output, timed_out=False, truncated=False):
+        self.return_code = return_code
+        self.output = output
+        self.timed_out = timed_out
+        self.truncated = truncated
+
+
+def in_new_session(args, shell=False):
+    """ Command line running args, as Popen would, through setsid. setsid
+    execs args in place, so the process keeps its pid, which is also the id
+    of its new process group """
+    if isinstance(args, basestring):
+        args = [args]
+    if shell:
+        return [SETSID, '/bin/sh', '-c'] + list(args)
+    return [SETSID] + list(args)
+
+
+def run_process(args, cwd=None, env=None, shell=False, timeout=None,
+                callback=None, tail_size=PROCESS_TAIL_SIZE):
+    """
+    Runs a process reading stdout and stderr while it runs, so processes
+    with a lot of output never block on a full pipe.
+
+    callback(line, 'output') is called for each line. Only the last
+    tail_size bytes of output are kept. The process is killed after timeout
+    seconds; a timer is used instead of SIGALRM, so it works in any thread.
+    When setsid is available the process runs in its own session and the
+    whole process group is killed, so children it spawned (shell=True, dump
+    tools) die with it.
+    """
+    if SETSID:
+        args = in_new_session(args, shell)
+        shell = False
+
+    process = subprocess.Popen(
+        args,
+        stdin=None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,  # stderr and stdout are the same
+        close_fds=True,
+        cwd=cwd,
+        env=env,
+        shell=shell
+    )
+
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        LOG.error("Timeout %s exceeded for process id %s" %
+                  (timeout, process.pid))
+        try:
+            if SETSID:
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except OSError:
+            pass
+
+    timer = None
+    if timeout:
+        timer = threading.Timer(timeout, kill)
+        timer.daemon = True
+        timer.start()
+
+    output = OutputTail('output', callback=callback, tail_size=tail_size)
+    try:
+        fd = process.stdout.fileno()
+        while not timed_out.is_set():
+            # a descendant out of the process group may keep the pipe open
+            # after the timeout, so reads never block longer than the poll
+            readable, _, _ = select.select([fd], [], [], PROCESS_POLL_INTERVAL)
+            if not readable:
+                continue
+            data = os.read(fd, PROCESS_CHUNK_SIZE)
+            if not data:
+                break
+            output.feed(data)
+        output.close()
+        process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+        process.stdout.close()
+
+    return ProcessResult(
+        process.returncode, ''.join(output.lines),
+        timed_out=timed_out.is_set(), truncated=output.truncated
+    )
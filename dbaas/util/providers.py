@@ -7,12 +7,20 @@ from util import get_replication_topology_instance
 from dbaas_credentials.models import CredentialType
 from physical.models import DatabaseInfra
 from logical.models import Database
+from system.models import Configuration
 from workflow.workflow import stop_workflow
 from workflow.workflow import start_workflow
+from workflow.workflow import resume_workflow
 
 LOG = logging.getLogger(__name__)
 
 
+def rollback_failed_deploy():
+    """ A failed deploy is undone unless resumable_deploy is 1, then it is
+    kept to be resumed by resume_infra """
+    return Configuration.get_by_name_as_int('resumable_deploy', default=0) != 1
+
+
 def make_infra(
     plan, environment, name, team, project, description,
     subscribe_to_email_events=True, task=None, is_protected=False
@@ -45,7 +53,10 @@ def make_infra(
         is_protected=is_protected
     )
 
-    start_workflow(workflow_dict=workflow_dict, task=task)
+    start_workflow(
+        workflow_dict=workflow_dict, task=task,
+        rollback=rollback_failed_deploy()
+    )
     return workflow_dict
 
 
@@ -90,7 +101,21 @@ def clone_infra(
         subscribe_to_email_events=subscribe_to_email_events,
     )
 
-    start_workflow(workflow_dict=workflow_dict, task=task)
+    start_workflow(
+        workflow_dict=workflow_dict, task=task,
+        rollback=rollback_failed_deploy()
+    )
+    return workflow_dict
+
+
+def resume_infra(failed_task, task=None):
+    """ Resumes the make_infra or clone_infra of failed_task from the step
+    that failed """
+    workflow_dict = resume_workflow(
+        failed_task, task=task, rollback=rollback_failed_deploy()
+    )
+    if workflow_dict is None:
+        return build_dict(databaseinfra=None, created=False)
     return workflow_dict
 
 
@@ -212,6 +237,10 @@ def get_switch_write_instance_steps(class_path):
     return get_replication_topology_instance(class_path).get_switch_write_instance_steps()
 
 
+def get_parallel_groups_of_steps(class_path):
+    return get_replication_topology_instance(class_path).get_parallel_groups_of_steps()
+
+
 def get_engine_credentials(engine, environment):
     engine = engine.lower()
 
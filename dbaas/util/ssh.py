@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import logging
+import random
+import socket
+import time
+from collections import deque
+from contextlib import contextmanager
+import paramiko
+from util.pool import ConnectionPoolRegistry, credentials_hash
+
+LOG = logging.getLogger(__name__)
+
+SSH_POOL_MAX_SESSIONS = 200
+SSH_POOL_IDLE_TIMEOUT = 120  # seconds
+SSH_KEEPALIVE_INTERVAL = 30  # seconds
+SSH_OPEN_ATTEMPTS = 2
+SSH_PORT = 22
+SSH_CONNECT_TIMEOUT = 30  # seconds
+
+SSH_READY_DEADLINE = 600  # seconds
+SSH_READY_INITIAL_BACKOFF = 1
+SSH_READY_MAX_BACKOFF = 15
+SSH_PROBE_TIMEOUT = 3
+
+STREAM_CHUNK_SIZE = 4096
+STREAM_POLL_INTERVAL = 0.1  # seconds
+STREAM_TAIL_SIZE = 64 * 1024  # bytes of each stream kept in memory
+STREAM_MAX_LINE_SIZE = 8 * 1024
+
+# BadHostKeyException and AuthenticationException are SSHException
+SSH_ERRORS = (paramiko.ssh_exception.SSHException, socket.error, EOFError)
+
+
+class CommandTimeout(Exception):
+
+    """ Not an SSH error: only the channel of the command is closed, the
+    session stays pooled for the other commands using it """
+    pass
+
+
+# One authenticated SSH session per (server, user). Commands run on their own
+# channel, so threads can share a session
+SSH_POOL = ConnectionPoolRegistry(
+    max_size=SSH_POOL_MAX_SESSIONS,
+    idle_timeout=SSH_POOL_IDLE_TIMEOUT,
+    health_check_interval=0
+)
+
+
+def _connect(server, username, password):
+    client = paramiko.SSHClient()
+    client.load_system_host_keys()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        server, username=username, password=password,
+        timeout=SSH_CONNECT_TIMEOUT
+    )
+    client.get_transport().set_keepalive(SSH_KEEPALIVE_INTERVAL)
+    return client
+
+
+def _close(client):
+    client.close()
+
+
+def _check_session(client):
+    # Only local state, no round trip. Keepalives mark sessions dropped by
+    # the server (e.g. host restarted) as not active
+    transport = client.get_transport()
+    if not transport or not transport.is_active():
+        raise paramiko.ssh_exception.SSHException('SSH session is closed')
+
+
+@contextmanager
+def ssh_session(server, username, password):
+    """ Pooled paramiko.SSHClient. Sessions with SSH errors are closed """
+    key = (server, username, credentials_hash(username, password))
+    with SSH_POOL.connection(
+        key,
+        lambda: _connect(server, username, password),
+        close=_close,
+        health_check=_check_session,
+        discard_on=SSH_ERRORS
+    ) as client:
+        yield client
+
+
+def exec_command(server, username, password, command, handler):
+    """
+    Runs command on a pooled session and returns
+    handler(stdin, stdout, stderr).
+
+    A pooled session may have been closed by the server since its last use,
+    so opening the channel is retried on a new session. Errors after the
+    command started are not retried.
+    """
+    for attempt in range(1, SSH_OPEN_ATTEMPTS + 1):
+        opened = False
+        try:
+            with ssh_session(server, username, password) as client:
+                stdin, stdout, stderr = client.exec_command(command)
+                opened = True
+                return handler(stdin, stdout, stderr)
+        except SSH_ERRORS as e:
+            if opened or attempt == SSH_OPEN_ATTEMPTS:
+                raise
+            LOG.info("Could not open SSH channel on %s: %s. Retrying...",
+                     server, e)
+
+
+def port_is_open(server, port=SSH_PORT, timeout=SSH_PROBE_TIMEOUT):
+    try:
+        sock = socket.create_connection((server, port), timeout)
+    except socket.error:
+        return False
+    sock.close()
+    return True
+
+
+def wait_for_ssh(server, username, password, deadline=SSH_READY_DEADLINE,
+                 initial_backoff=SSH_READY_INITIAL_BACKOFF,
+                 max_backoff=SSH_READY_MAX_BACKOFF):
+    """
+    Returns True as soon as server accepts an SSH login, False when it does
+    not in deadline seconds.
+
+    The SSH port is probed before each login, which is much cheaper than a
+    handshake while the host boots. Waits between attempts grow
+    exponentially with jitter, so hosts created together do not retry in
+    lockstep. The session opened is kept in SSH_POOL for the next commands.
+    """
+    ends_at = time.time() + deadline
+    backoff = initial_backoff
+    attempt = 0
+    while True:
+        attempt += 1
+        if port_is_open(server):
+            try:
+                with ssh_session(server, username, password):
+                    LOG.info("%s is ready after %s attempts", server, attempt)
+                    return True
+            except SSH_ERRORS as e:
+                LOG.info("Login attempt %s on %s: %s", attempt, server, e)
+        else:
+            LOG.info("Attempt %s, %s port %s is closed",
+                     attempt, server, SSH_PORT)
+
+        remaining = ends_at - time.time()
+        if remaining <= 0:
+            LOG.error("%s is not ready after %s attempts", server, attempt)
+            return False
+        time.sleep(min(random.uniform(backoff / 2.0, backoff), remaining))
+        backoff = min(backoff * 2, max_backoff)
+
+
+def ssh_pool_stats():
+    return {
+        'sessions': len(SSH_POOL),
+        'hits': SSH_POOL.hits,
+        'misses': SSH_POOL.misses,
+        'reuse_ratio': SSH_POOL.reuse_ratio,
+    }
+
+
+class OutputTail(object):
+
+    """
+    Splits a stream in lines as it is read, forwards every line to callback
+    and keeps only the last tail_size bytes of lines. Lines longer than
+    max_line_size are split, so a stream without new lines is not buffered.
+    """
+
+    def __init__(self, name, callback=None, tail_size=STREAM_TAIL_SIZE,
+                 max_line_size=STREAM_MAX_LINE_SIZE):
+        self.name = name
+        self.callback = callback
+        self.tail_size = tail_size
+        self.max_line_size = max_line_size
+        self.lines = deque()
+        self._sizes = deque()
+        self.truncated = False
+        self._size = 0
+        self._partial = b''
+
+    def feed(self, data):
+        self._partial += data
+        while True:
+            index = self._partial.find(b'\n')
+            if index >= 0:
+                line, self._partial = (
+                    self._partial[:index + 1], self._partial[index + 1:]
+                )
+            elif len(self._partial) > self.max_line_size:
+                index = self._split_index()
+                line, self._partial = (
+                    self._partial[:index], self._partial[index:]
+                )
+            else:
+                return
+            self._add_line(line)
+
+    def close(self):
+        if self._partial:
+            self._add_line(self._partial)
+            self._partial = b''
+
+    def _split_index(self):
+        """ Moves the split of a long line back to the start of an utf-8
+        character, so it is not decoded as two broken halves """
+        index = self.max_line_size
+        while index > 0 and 0x80 <= ord(self._partial[index]) < 0xC0:
+            index -= 1
+        return index or self.max_line_size
+
+    def _add_line(self, raw_line):
+        line = raw_line.decode('utf-8', 'replace')
+        self.lines.append(line)
+        self._sizes.append(len(raw_line))
+        self._size += len(raw_line)
+        while self._size > self.tail_size and len(self.lines) > 1:
+            self.lines.popleft()
+            self._size -= self._sizes.popleft()
+            self.truncated = True
+
+        if self.callback:
+            try:
+                self.callback(line.rstrip('\n'), self.name)
+            except Exception as e:
+                LOG.warning("Error forwarding %s line: %s", self.name, e)
+
+
+def stream_output(stdin, stdout, stderr, callback=None,
+                  tail_size=STREAM_TAIL_SIZE, timeout=None):
+    """
+    Reads the output of a command as it is produced, calling
+    callback(line, 'stdout' or 'stderr') for each line.
+    Returns (exit_status, stdout tail lines, stderr tail lines).
+
+    When the command runs longer than timeout seconds its channel is closed
+    and CommandTimeout is raised.
+    """
+    channel = stdout.channel
+    deadline = time.time() + timeout if timeout else None
+    out = OutputTail('stdout', callback, tail_size)
+    err = OutputTail('stderr', callback, tail_size)
+
+    while True:
+        received = False
+        if channel.recv_ready():
+            out.feed(channel.recv(STREAM_CHUNK_SIZE))
+            received = True
+        if channel.recv_stderr_ready():
+            err.feed(channel.recv_stderr(STREAM_CHUNK_SIZE))
+            received = True
+
+        if received:
+            continue
+        if channel.exit_status_ready() and not channel.recv_ready() \
+                and not channel.recv_stderr_ready():
+            break
+        if deadline and time.time() > deadline:
+            channel.close()
+            raise CommandTimeout(
+                'Command did not finish in {} seconds'.format(timeout)
+            )
+        time.sleep(STREAM_POLL_INTERVAL)
+
+    out.close()
+    err.close()
+    return channel.recv_exit_status(), list(out.lines), list(err.lines)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import os
+import tempfile
+from mock import patch
+from django.template import Template
+from django.test import TestCase
+from physical.models import Script, SCRIPT_CONTENT_CACHE
+from util import build_context_script, TEMPLATE_CACHE
+
+
+class BuildContextScriptTestCase(TestCase):
+
+    def setUp(self):
+        TEMPLATE_CACHE.clear()
+
+    def test_render(self):
+        script = 'echo {{ HOST }}\r\nexit 0'
+        self.assertEqual(
+            build_context_script({'HOST': 'host-01'}, script),
+            'echo host-01\nexit 0'
+        )
+
+    @patch('django.template.Template', wraps=Template)
+    def test_template_is_compiled_once(self, template):
+        script = 'echo {{ HOST }}'
+        for host in ('host-01', 'host-02', 'host-03'):
+            self.assertEqual(
+                build_context_script({'HOST': host}, script),
+                'echo {}'.format(host)
+            )
+
+        self.assertEqual(template.call_count, 1)
+        self.assertEqual(TEMPLATE_CACHE.hits, 2)
+
+    def test_different_sources_are_not_shared(self):
+        build_context_script({}, 'echo 1')
+        self.assertEqual(build_context_script({}, 'echo 2'), 'echo 2')
+        self.assertEqual(len(TEMPLATE_CACHE), 2)
+
+
+class ScriptContentTestCase(TestCase):
+
+    def setUp(self):
+        SCRIPT_CONTENT_CACHE.clear()
+        _, self.path = tempfile.mkstemp()
+        self.write('first')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, content, modified_at=1000):
+        with open(self.path, 'w') as f:
+            f.write(content)
+        os.utime(self.path, (modified_at, modified_at))
+
+    def test_content_is_read_once(self):
+        script = Script(initialization=self.path)
+        self.assertEqual(script.initialization_template, 'first')
+
+        with patch('physical.models.open', create=True) as mock_open:
+            self.assertEqual(script.initialization_template, 'first')
+        self.assertFalse(mock_open.called)
+
+    def test_changed_file_is_read_again(self):
+        script = Script(initialization=self.path)
+        script.initialization_template
+
+        self.write('second', modified_at=2000)
+        self.assertEqual(script.initialization_template, 'second')
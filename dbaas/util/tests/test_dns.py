@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import socket
+import struct
+import threading
+from django.test import TestCase
+from util.dns import resolve, wait_for_dns, build_query, parse_response
+
+
+class StubResolver(object):
+
+    """ UDP DNS server answering names in records, after they were asked
+    available_after times """
+
+    def __init__(self, records, available_after=0):
+        self.records = records
+        self.available_after = available_after
+        self.queries = {}
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def answer(self, query):
+        query_id = struct.unpack(b'>H', query[:2])[0]
+        labels, offset = [], 12
+        while query[offset:offset + 1] != b'\x00':
+            length = ord(query[offset:offset + 1])
+            labels.append(query[offset + 1:offset + 1 + length])
+            offset += length + 1
+        name = b'.'.join(labels).decode('ascii')
+        question = query[12:offset + 5]
+
+        self.queries[name] = self.queries.get(name, 0) + 1
+        address = self.records.get(name)
+        if address is None or self.queries[name] <= self.available_after:
+            return struct.pack(
+                b'>HHHHHH', query_id, 0x8183, 1, 0, 0, 0
+            ) + question
+
+        return struct.pack(
+            b'>HHHHHH', query_id, 0x8180, 1, 1, 0, 0
+        ) + question + struct.pack(
+            b'>HHHIH', 0xC00C, 1, 1, 60, 4
+        ) + socket.inet_aton(address)
+
+    def serve(self):
+        while True:
+            try:
+                query, client = self.sock.recvfrom(512)
+            except socket.error:
+                return
+            self.sock.sendto(self.answer(query), client)
+
+    def close(self):
+        self.sock.close()
+
+
+class ResolveTestCase(TestCase):
+
+    def setUp(self):
+        self.server = StubResolver({'db.example.com': '10.0.0.1'})
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_resolve(self):
+        self.assertEqual(
+            resolve('db.example.com', '127.0.0.1', self.server.port),
+            ['10.0.0.1']
+        )
+
+    def test_resolve_unknown_name(self):
+        self.assertEqual(
+            resolve('other.example.com', '127.0.0.1', self.server.port), []
+        )
+
+    def test_ignores_answers_of_other_queries(self):
+        response = self.server.answer(build_query('db.example.com', 1))
+        self.assertEqual(parse_response(response, 1), ['10.0.0.1'])
+        with self.assertRaises(Exception):
+            parse_response(response, 2)
+
+
+class WaitForDnsTestCase(TestCase):
+
+    def setUp(self):
+        self.names = ['db-01.example.com', 'db-02.example.com']
+        self.server = StubResolver(
+            dict((name, '10.0.0.1') for name in self.names),
+            available_after=2
+        )
+
+    def tearDown(self):
+        self.server.close()
+
+    def wait(self, names, deadline=5):
+        return wait_for_dns(
+            names, '127.0.0.1', self.server.port, deadline=deadline,
+            initial_backoff=0.01, max_backoff=0.05
+        )
+
+    def test_waits_for_every_name(self):
+        self.assertEqual(self.wait(self.names), [])
+        self.assertEqual(
+            self.server.queries, dict((name, 3) for name in self.names)
+        )
+
+    def test_returns_names_not_resolved_at_deadline(self):
+        self.assertEqual(
+            self.wait(self.names + ['missing.example.com'], deadline=0.5),
+            ['missing.example.com']
+        )
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import mock
+from django.test import TestCase
+from util.pool import ConnectionPoolRegistry
+
+
+class ConnectionPoolRegistryTestCase(TestCase):
+
+    def setUp(self):
+        self.registry = ConnectionPoolRegistry(max_size=3)
+        self.key = (1, 1, 'credentials')
+        self.factory = mock.Mock(side_effect=lambda: mock.Mock())
+        self.close = mock.Mock()
+
+    def test_shared_connection_is_reused(self):
+        with self.registry.connection(self.key, self.factory) as first:
+            pass
+        with self.registry.connection(self.key, self.factory) as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(self.factory.call_count, 1)
+        self.assertEqual(self.registry.hits, 1)
+        self.assertEqual(self.registry.misses, 1)
+
+    def test_not_shared_connection_is_checked_out(self):
+        with self.registry.connection(
+            self.key, self.factory, shared=False
+        ) as first:
+            with self.registry.connection(
+                self.key, self.factory, shared=False
+            ) as second:
+                self.assertIsNot(first, second)
+
+        self.assertEqual(len(self.registry), 2)
+        with self.registry.connection(
+            self.key, self.factory, shared=False
+        ) as third:
+            self.assertIn(third, (first, second))
+
+    def test_connection_is_discarded_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.registry.connection(
+                self.key, self.factory, close=self.close
+            ) as client:
+                raise ValueError()
+
+        self.close.assert_called_once_with(client)
+        self.assertEqual(len(self.registry), 0)
+
+    def test_no_pooling_without_key(self):
+        with self.registry.connection(None, self.factory, close=self.close):
+            pass
+
+        self.assertEqual(self.close.call_count, 1)
+        self.assertEqual(len(self.registry), 0)
+
+    def test_unhealthy_connection_is_replaced(self):
+        self.registry.health_check_interval = 0
+        health_check = mock.Mock(side_effect=Exception('dead'))
+        with self.registry.connection(
+            self.key, self.factory, health_check=health_check
+        ) as first:
+            pass
+        with self.registry.connection(
+            self.key, self.factory, health_check=health_check
+        ) as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertEqual(health_check.call_count, 1)
+
+    def test_idle_connections_are_evicted(self):
+        self.registry.idle_timeout = -1
+        with self.registry.connection(
+            self.key, self.factory, close=self.close
+        ):
+            pass
+        with self.registry.connection(
+            (2, 2, 'credentials'), self.factory, close=self.close
+        ):
+            pass
+
+        self.assertEqual(self.close.call_count, 1)
+        self.assertEqual(len(self.registry), 1)
+
+    def test_max_size(self):
+        for instance_id in range(5):
+            with self.registry.connection(
+                (1, instance_id, 'credentials'), self.factory,
+                close=self.close
+            ):
+                pass
+
+        self.assertEqual(len(self.registry), 3)
+        self.assertEqual(self.close.call_count, 2)
+
+    def test_invalidate(self):
+        for key in [(1, 1, 'a'), (1, 2, 'a'), (1, None, 'a'), (2, 1, 'a')]:
+            with self.registry.connection(key, self.factory, close=self.close):
+                pass
+
+        self.registry.invalidate(1, instance_id=1)
+        self.assertEqual(len(self.registry), 2)
+
+        self.registry.invalidate(1)
+        self.assertEqual(len(self.registry), 1)
+        self.assertEqual(self.close.call_count, 3)
+
+    def test_busy_connection_is_not_evicted(self):
+        self.registry.idle_timeout = -1
+        with self.registry.connection(
+            self.key, self.factory, close=self.close
+        ):
+            with self.registry.connection(
+                (2, 2, 'credentials'), self.factory, close=self.close
+            ):
+                pass
+            self.assertFalse(self.close.called)
+
+        with self.registry.connection(
+            (3, 3, 'credentials'), self.factory, close=self.close
+        ):
+            pass
+        self.assertEqual(self.close.call_count, 2)
+
+    def test_discard_waits_for_other_callers(self):
+        with self.registry.connection(
+            self.key, self.factory, close=self.close
+        ) as first:
+            with self.assertRaises(ValueError):
+                with self.registry.connection(
+                    self.key, self.factory, close=self.close
+                ) as second:
+                    self.assertIs(first, second)
+                    raise ValueError()
+
+            self.assertFalse(self.close.called)
+            self.assertEqual(len(self.registry), 0)
+
+        self.close.assert_called_once_with(first)
+
+    def test_invalidate_waits_for_callers(self):
+        with self.registry.connection(
+            self.key, self.factory, close=self.close
+        ) as first:
+            self.registry.invalidate(1)
+            self.assertFalse(self.close.called)
+
+            with self.registry.connection(
+                self.key, self.factory, close=self.close
+            ) as second:
+                self.assertIsNot(first, second)
+
+        self.close.assert_called_once_with(first)
+
+    def test_invalidate_closes_checked_out_connection_on_release(self):
+        with self.registry.connection(
+            self.key, self.factory, close=self.close, shared=False
+        ) as client:
+            self.registry.invalidate(1)
+            self.assertFalse(self.close.called)
+
+        self.close.assert_called_once_with(client)
+        self.assertEqual(len(self.registry), 0)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import threading
+import time
+from django.test import TestCase
+from util.process import run_process
+
+
+class RunProcessTestCase(TestCase):
+
+    def test_large_output_does_not_block(self):
+        script = "awk 'BEGIN {for (i = 0; i < 200000; i++) print \"line\"}'"
+        result = run_process(['sh', '-c', script + '; exit 3'], timeout=60)
+
+        self.assertEqual(result.return_code, 3)
+        self.assertFalse(result.timed_out)
+        self.assertEqual(result.output.count('line\n'), 200000)
+
+    def test_lines_are_sent_to_callback(self):
+        lines = []
+        result = run_process(
+            ['sh', '-c', 'echo first; echo second >&2'],
+            callback=lambda line, stream: lines.append(line)
+        )
+
+        self.assertEqual(result.return_code, 0)
+        self.assertEqual(sorted(lines), ['first', 'second'])
+
+    def test_only_the_tail_is_kept(self):
+        result = run_process(
+            ['sh', '-c', 'for i in 1 2 3 4 5; do echo line$i; done'],
+            tail_size=12
+        )
+
+        self.assertEqual(result.output, 'line4\nline5\n')
+        self.assertTrue(result.truncated)
+
+    def test_timeout_out_of_the_main_thread(self):
+        results = []
+
+        def run():
+            results.append(run_process(['sleep', '30'], timeout=0.5))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join(10)
+
+        self.assertEqual(len(results), 1)
+        self.assertTrue(results[0].timed_out)
+        self.assertNotEqual(results[0].return_code, 0)
+
+    def test_timeout_kills_children(self):
+        started_at = time.time()
+        result = run_process(['sh', '-c', 'sleep 30 & sleep 30'], timeout=1)
+
+        self.assertTrue(result.timed_out)
+        self.assertLess(time.time() - started_at, 10)
+
+    def test_runs_in_its_own_session(self):
+        result = run_process('echo $$ $(ps -o sid= -p $$)', shell=True)
+
+        pid, sid = result.output.split()
+        self.assertEqual(pid, sid)
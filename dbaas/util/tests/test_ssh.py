@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from mock import patch, MagicMock
+from django.test import TestCase
+import paramiko
+from util import exec_remote_command, scp_file
+from util.ssh import SSH_POOL, OutputTail, ssh_session, stream_output, \
+    wait_for_ssh
+
+
+def fake_client():
+    client = MagicMock()
+    client.get_transport.return_value.is_active.return_value = True
+
+    stdout = MagicMock()
+    stdout.readlines.return_value = ['ok\n']
+    stdout.channel.recv_exit_status.return_value = 0
+    stderr = MagicMock()
+    stderr.readlines.return_value = []
+    client.exec_command.return_value = (MagicMock(), stdout, stderr)
+    return client
+
+
+@patch('util.ssh.paramiko.SSHClient', side_effect=fake_client)
+class SSHSessionPoolTestCase(TestCase):
+
+    def setUp(self):
+        SSH_POOL.clear()
+
+    def tearDown(self):
+        SSH_POOL.clear()
+
+    def exec_command(self, server='10.0.0.1', password='pass'):
+        output = {}
+        code = exec_remote_command(server, 'user', password, 'ls', output)
+        return code, output
+
+    def test_session_is_reused(self, ssh_client):
+        self.assertEqual(self.exec_command(), (0, {'stdout': ['ok\n'],
+                                                   'stderr': []}))
+        self.exec_command()
+
+        self.assertEqual(ssh_client.call_count, 1)
+        self.assertEqual(SSH_POOL.reuse_ratio, 0.5)
+
+    def test_session_per_server_and_credentials(self, ssh_client):
+        self.exec_command()
+        self.exec_command(server='10.0.0.2')
+        self.exec_command(password='new_pass')
+
+        self.assertEqual(ssh_client.call_count, 3)
+
+    def test_closed_session_is_replaced(self, ssh_client):
+        self.exec_command()
+        first = SSH_POOL._idle.values()[0][0].client
+        first.get_transport.return_value.is_active.return_value = False
+
+        self.exec_command()
+
+        self.assertEqual(ssh_client.call_count, 2)
+        first.close.assert_called_once_with()
+
+    def test_session_in_use_is_not_evicted(self, ssh_client):
+        with patch.object(SSH_POOL, 'idle_timeout', -1):
+            with ssh_session('10.0.0.1', 'user', 'pass') as client:
+                self.exec_command(server='10.0.0.2')
+                self.assertFalse(client.close.called)
+
+            self.exec_command(server='10.0.0.3')
+            client.close.assert_called_once_with()
+
+    def test_command_timeout_keeps_session(self, ssh_client):
+        client = fake_client()
+        channel = client.exec_command.return_value[1].channel
+        channel.recv_ready.return_value = False
+        channel.recv_stderr_ready.return_value = False
+        channel.exit_status_ready.return_value = False
+        ssh_client.side_effect = [client]
+
+        from util import _exec_remote_command
+        output = {}
+        code = _exec_remote_command(
+            '10.0.0.1', 'user', 'pass', 'sleep 60', output,
+            lambda stdin, stdout, stderr: stream_output(
+                stdin, stdout, stderr, timeout=0.01
+            )
+        )
+
+        self.assertIsNone(code)
+        self.assertIn('did not finish', output['exception'])
+        channel.close.assert_called_once_with()
+        self.assertFalse(client.close.called)
+        self.assertEqual(len(SSH_POOL), 1)
+
+    def test_channel_is_retried_on_new_session(self, ssh_client):
+        self.exec_command()
+        first = SSH_POOL._idle.values()[0][0].client
+        first.exec_command.side_effect = paramiko.SSHException('closed')
+
+        code, _ = self.exec_command()
+
+        self.assertEqual(code, 0)
+        self.assertEqual(ssh_client.call_count, 2)
+
+    def test_returns_none_on_connection_error(self, ssh_client):
+        ssh_client.side_effect = None
+        ssh_client.return_value.connect.side_effect = paramiko.SSHException(
+            'error'
+        )
+
+        code, output = self.exec_command()
+
+        self.assertIsNone(code)
+        self.assertEqual(output['exception'], 'error')
+        self.assertEqual(len(SSH_POOL), 0)
+
+    def test_scp_uses_pooled_session(self, ssh_client):
+        self.exec_command()
+        self.assertTrue(
+            scp_file('10.0.0.1', 'user', 'pass', '/tmp/a', '/tmp/b', 'PUT')
+        )
+
+        self.assertEqual(ssh_client.call_count, 1)
+        sftp = SSH_POOL._idle.values()[0][0].client.open_sftp.return_value
+        sftp.put.assert_called_once_with('/tmp/a', '/tmp/b')
+
+
+class FakeChannel(object):
+
+    def __init__(self, stdout_chunks, stderr_chunks, exit_status=0):
+        self.stdout_chunks = list(stdout_chunks)
+        self.stderr_chunks = list(stderr_chunks)
+        self.exit_status = exit_status
+
+    def recv_ready(self):
+        return bool(self.stdout_chunks)
+
+    def recv(self, size):
+        return self.stdout_chunks.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr_chunks)
+
+    def recv_stderr(self, size):
+        return self.stderr_chunks.pop(0)
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+
+class StreamOutputTestCase(TestCase):
+
+    def test_lines_are_forwarded_as_read(self):
+        lines = []
+        stdout = MagicMock(channel=FakeChannel(
+            [b'first li', b'ne\nsecond line\nlast'], [b'warning\n'], 2
+        ))
+
+        exit_status, out, err = stream_output(
+            None, stdout, None,
+            callback=lambda line, stream: lines.append((stream, line))
+        )
+
+        self.assertEqual(exit_status, 2)
+        self.assertEqual(out, ['first line\n', 'second line\n', 'last'])
+        self.assertEqual(err, ['warning\n'])
+        self.assertEqual(sorted(lines), [
+            ('stderr', 'warning'), ('stdout', 'first line'),
+            ('stdout', 'last'), ('stdout', 'second line'),
+        ])
+
+    def test_keeps_only_the_tail(self):
+        tail = OutputTail('stdout', tail_size=21)
+        for i in range(10):
+            tail.feed(b'line {}\n'.format(i))
+
+        self.assertEqual(list(tail.lines), ['line 7\n', 'line 8\n',
+                                            'line 9\n'])
+        self.assertTrue(tail.truncated)
+
+    def test_long_lines_are_split(self):
+        tail = OutputTail('stdout', max_line_size=4)
+        tail.feed(b'0123456789')
+        tail.close()
+
+        self.assertEqual(list(tail.lines), ['0123', '4567', '89'])
+
+    def test_invalid_utf8_is_counted_by_its_bytes(self):
+        tail = OutputTail('stdout', tail_size=4)
+        for _ in range(10):
+            tail.feed(b'\xff\n')
+
+        self.assertEqual(list(tail.lines), ['\ufffd\n', '\ufffd\n'])
+        self.assertEqual(tail._size, 4)
+
+    def test_long_lines_are_not_split_inside_a_character(self):
+        tail = OutputTail('stdout', max_line_size=4)
+        tail.feed('aaa\xe7\xe3o'.encode('utf-8'))
+        tail.close()
+
+        self.assertEqual(list(tail.lines), ['aaa', '\xe7\xe3', 'o'])
+
+    def test_callback_errors_do_not_stop_reading(self):
+        tail = OutputTail('stdout', callback=MagicMock(side_effect=Exception))
+        tail.feed(b'a\nb\n')
+
+        self.assertEqual(list(tail.lines), ['a\n', 'b\n'])
+
+
+class ExecRemoteCommandHostsTestCase(TestCase):
+
+    def setUp(self):
+        from physical.tests.factory import HostFactory
+        self.hosts = [HostFactory() for _ in range(3)]
+        self.host_attrs = [
+            MagicMock(host_id=host.id, vm_user='user', vm_password='pass')
+            for host in self.hosts[:2]
+        ]
+
+    def exec_remote_command(self, server, username, password, command,
+                            output, read_output):
+        if server == self.hosts[1].address:
+            output['exception'] = 'timeout'
+            return None
+        output['stdout'] = ['ok\n']
+        output['stderr'] = []
+        return 0
+
+    @patch('util._exec_remote_command')
+    @patch('dbaas_cloudstack.models.HostAttr.objects')
+    def test_results_by_host(self, host_attr_objects, exec_remote_command):
+        host_attr_objects.filter.return_value = self.host_attrs
+        exec_remote_command.side_effect = self.exec_remote_command
+
+        from util import exec_remote_command_hosts
+        results = exec_remote_command_hosts(self.hosts, 'ls', timeout=10)
+
+        self.assertEqual([result.host for result in results], self.hosts)
+        self.assertTrue(results[0].ok)
+        self.assertEqual(results[0].stdout, ['ok\n'])
+        self.assertFalse(results[1].ok)
+        self.assertEqual(results[1].error, 'timeout')
+        self.assertFalse(results[2].ok)
+        self.assertIn('HostAttr', results[2].error)
+        for result in results:
+            self.assertIsNotNone(result.duration)
+
+
+@patch('util.ssh.time.sleep')
+@patch('util.ssh.paramiko.SSHClient', side_effect=fake_client)
+class WaitForSSHTestCase(TestCase):
+
+    def setUp(self):
+        SSH_POOL.clear()
+
+    def tearDown(self):
+        SSH_POOL.clear()
+
+    @patch('util.ssh.port_is_open', side_effect=[False, False, True])
+    def test_login_only_when_port_is_open(self, port_is_open, ssh_client,
+                                          sleep):
+        self.assertTrue(wait_for_ssh('10.0.0.1', 'user', 'pass'))
+
+        self.assertEqual(port_is_open.call_count, 3)
+        self.assertEqual(ssh_client.call_count, 1)
+        self.assertEqual(len(SSH_POOL), 1)
+        first, second = [call[0][0] for call in sleep.call_args_list]
+        self.assertTrue(0.5 <= first <= 1)
+        self.assertTrue(1 <= second <= 2)
+
+    @patch('util.ssh.port_is_open', return_value=True)
+    def test_retries_login_errors(self, port_is_open, ssh_client, sleep):
+        clients = [fake_client(), fake_client()]
+        clients[0].connect.side_effect = paramiko.SSHException('Banner')
+        ssh_client.side_effect = clients
+
+        self.assertTrue(wait_for_ssh('10.0.0.1', 'user', 'pass'))
+        self.assertEqual(ssh_client.call_count, 2)
+
+    @patch('util.ssh.port_is_open', return_value=False)
+    def test_gives_up_at_deadline(self, port_is_open, ssh_client, sleep):
+        self.assertFalse(
+            wait_for_ssh('10.0.0.1', 'user', 'pass', deadline=0)
+        )
+        self.assertFalse(ssh_client.called)
+
+
+class WaitForSSHHostsTestCase(TestCase):
+
+    def setUp(self):
+        from physical.tests.factory import HostFactory
+        self.hosts = [HostFactory() for _ in range(3)]
+        self.host_attrs = [
+            MagicMock(host_id=host.id, vm_user='user', vm_password='pass')
+            for host in self.hosts
+        ]
+
+    @patch('util.wait_for_ssh')
+    @patch('dbaas_cloudstack.models.HostAttr.objects')
+    def test_returns_hosts_not_ready(self, host_attr_objects, wait_for_ssh):
+        host_attr_objects.filter.return_value = self.host_attrs
+        wait_for_ssh.side_effect = (
+            lambda server, *args, **kwargs: server != self.hosts[1].address
+        )
+
+        from util import wait_for_ssh_hosts
+        self.assertEqual(wait_for_ssh_hosts(self.hosts), [self.hosts[1]])
+        self.assertEqual(wait_for_ssh.call_count, 3)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.test import TestCase
+from mock import patch
+from util.waiter import wait_for_lag, wait_until
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class WaiterTestCase(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch.multiple(
+            'util.waiter.time', time=self.clock.time, sleep=self.clock.sleep
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_wait_until_backs_off_exponentially(self):
+        answers = iter([False, False, False, True])
+
+        result = wait_until(lambda: next(answers), deadline=60)
+
+        self.assertTrue(result)
+        self.assertEqual(result.attempts, 4)
+        self.assertEqual(self.clock.sleeps, [0.2, 0.4, 0.8])
+        self.assertAlmostEqual(result.waited, 1.4)
+
+    def test_wait_until_gives_up_at_deadline(self):
+        result = wait_until(lambda: False, deadline=5, max_backoff=2)
+
+        self.assertFalse(result)
+        self.assertAlmostEqual(result.waited, 5)
+        self.assertEqual(max(self.clock.sleeps), 2)
+
+    def test_lag_already_caught_up(self):
+        result = wait_for_lag(lambda: 0, max_lag=0, deadline=60)
+
+        self.assertTrue(result)
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_predicts_when_lag_is_caught_up(self):
+        lags = iter([20, 19, 2, 0])
+
+        result = wait_for_lag(
+            lambda: next(lags), max_lag=0, deadline=60, max_backoff=30
+        )
+
+        self.assertTrue(result)
+        self.assertEqual(result.value, 0)
+        first, second, third = self.clock.sleeps
+        self.assertEqual(first, 0.2)
+        # 1 second of lag cleared in 0.2s, so 19 seconds take 3.8s
+        self.assertAlmostEqual(second, 3.8)
+        self.assertTrue(third < 1)
+
+    def test_lag_not_going_down(self):
+        result = wait_for_lag(lambda: 10, max_lag=0, deadline=30)
+
+        self.assertFalse(result)
+        self.assertEqual(result.value, 10)
+        self.assertAlmostEqual(result.waited, 30)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import logging
+import time
+
+LOG = logging.getLogger(__name__)
+
+WAIT_INITIAL_BACKOFF = 0.2  # seconds
+WAIT_MAX_BACKOFF = 10
+
+
+class WaitResult(object):
+
+    def __init__(self, ok, waited, attempts, value=None):
+        self.ok = ok
+        self.waited = waited
+        self.attempts = attempts
+        self.value = value
+
+    def __nonzero__(self):
+        return self.ok
+
+    def __repr__(self):
+        return '<WaitResult ok={} waited={:.1f}s attempts={}>'.format(
+            self.ok, self.waited, self.attempts
+        )
+
+
+def wait_until(condition, deadline, initial_backoff=WAIT_INITIAL_BACKOFF,
+               max_backoff=WAIT_MAX_BACKOFF):
+    """
+    Calls condition until it returns True or deadline seconds have passed,
+    waiting exponentially longer between calls.
+    """
+    started_at = time.time()
+    ends_at = started_at + deadline
+    backoff = initial_backoff
+    attempts = 0
+    while True:
+        attempts += 1
+        if condition():
+            return WaitResult(True, time.time() - started_at, attempts)
+
+        remaining = ends_at - time.time()
+        if remaining <= 0:
+            return WaitResult(False, time.time() - started_at, attempts)
+        time.sleep(min(backoff, remaining))
+        backoff = min(backoff * 2, max_backoff)
+
+
+def wait_for_lag(get_lag, max_lag, deadline,
+                 initial_backoff=WAIT_INITIAL_BACKOFF,
+                 max_backoff=WAIT_MAX_BACKOFF):
+    """
+    Calls get_lag until it returns at most max_lag or deadline seconds have
+    passed. Waits grow exponentially, but while the lag is going down the
+    next call is made when its trend says it will reach max_lag. The last
+    lag read is in the value of the result.
+    """
+    started_at = time.time()
+    ends_at = started_at + deadline
+    backoff = initial_backoff
+    attempts = 0
+    previous = None
+    while True:
+        attempts += 1
+        lag = get_lag()
+        now = time.time()
+        if lag is not None and lag <= max_lag:
+            return WaitResult(True, now - started_at, attempts, lag)
+
+        remaining = ends_at - now
+        if remaining <= 0:
+            return WaitResult(False, now - started_at, attempts, lag)
+
+        wait = backoff
+        if previous is not None and None not in (lag, previous[1]):
+            rate = (previous[1] - lag) / (now - previous[0])
+            if rate > 0:
+                predicted = (lag - max_lag) / rate
+                wait = max(initial_backoff, min(predicted, max_backoff))
+                LOG.debug("Lag %s going down %.2f/s, next check in %.1fs",
+                          lag, rate, wait)
+
+        previous = (now, lag)
+        time.sleep(min(wait, remaining))
+        backoff = min(backoff * 2, max_backoff)
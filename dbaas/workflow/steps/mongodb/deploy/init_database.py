@@ -7,7 +7,7 @@ from dbaas_nfsaas.models import HostAttr
 from dbaas_cloudstack.models import HostAttr as CsHostAttr
 from physical.configurations import configuration_factory
 from util import full_stack
-from util import check_ssh
+from util import wait_for_ssh_hosts
 from util import get_credentials_for
 from util import exec_remote_command
 from util import build_context_script
@@ -57,22 +57,20 @@ class InitDatabaseMongoDB(BaseStep):
             )
             plan = workflow_dict['plan']
 
+            LOG.info("Cheking hosts ssh...")
+            hosts_not_ready = wait_for_ssh_hosts(
+                [instance.hostname for instance in workflow_dict['instances']]
+            )
+            if hosts_not_ready:
+                LOG.warn("Hosts %s are not ready..." % hosts_not_ready)
+                return False
+
             for index, instance in enumerate(workflow_dict['instances']):
                 host = instance.hostname
 
                 LOG.info("Getting vm credentials...")
                 host_csattr = CsHostAttr.objects.get(host=host)
 
-                LOG.info("Cheking host ssh...")
-                host_ready = check_ssh(
-                    server=host.address, username=host_csattr.vm_user,
-                    password=host_csattr.vm_password, wait=5, interval=10
-                )
-
-                if not host_ready:
-                    LOG.warn("Host %s is not ready..." % host)
-                    return False
-
                 host.update_os_description()
 
                 if instance.instance_type == instance.MONGODB_ARBITER:
@@ -28,15 +28,19 @@ class ChangeMongoDBStorageEngine(BaseStep):
             databaseinfra = workflow_dict['databaseinfra']
             driver = databaseinfra.get_driver()
 
-            secondary_instance = driver.get_slave_instances()[0]
+            secondary_instance = driver.get_slave_instances(
+                force_refresh=True
+            )[0]
             LOG.info('Changing Secondary binaries {}...'.format(secondary_instance))
             self.change_instance_binaries(instance=secondary_instance)
 
-            master_instance = driver.get_master_instance()
+            master_instance = driver.get_master_instance(
+                force_refresh=True
+            )
 
             LOG.info('Switching Databases')
             driver.check_replication_and_switch(instance=secondary_instance,
-                                                attempts=10000)
+                                                deadline=100000)
             new_secondary = master_instance
 
             LOG.info('Changing old master binaries {}...'.format(new_secondary))
@@ -44,7 +48,7 @@ class ChangeMongoDBStorageEngine(BaseStep):
 
             LOG.info('Switching Databases')
             driver.check_replication_and_switch(instance=new_secondary,
-                                                attempts=10000)
+                                                deadline=100000)
 
             return True
 
@@ -39,13 +39,17 @@ class UpgradeMongoDB_24_to_26(BaseStep):
                                           connect_string=connect_string,
                                           run_authschemaupgrade=False)
 
-            secondary_instance = driver.get_slave_instances()[0]
+            secondary_instance = driver.get_slave_instances(
+                force_refresh=True
+            )[0]
             LOG.info('Changing Secondary binaries {}...'.format(secondary_instance))
             self.change_instance_binaries(instance=secondary_instance,
                                           connect_string=connect_string,
                                           run_authschemaupgrade=False)
 
-            master_instance = driver.get_master_instance()
+            master_instance = driver.get_master_instance(
+                force_refresh=True
+            )
 
             LOG.info('Switching Databases')
             driver.check_replication_and_switch(instance=secondary_instance)
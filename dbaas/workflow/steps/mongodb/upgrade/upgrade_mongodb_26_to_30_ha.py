@@ -33,13 +33,17 @@ class UpgradeMongoDB_26_to_30(BaseStep):
                                           connect_string=connect_string,
                                           is_primary=False)
 
-            secondary_instance = driver.get_slave_instances()[0]
+            secondary_instance = driver.get_slave_instances(
+                force_refresh=True
+            )[0]
             LOG.info('Changing Secondary binaries {}...'.format(secondary_instance))
             self.change_instance_binaries(instance=secondary_instance,
                                           connect_string=connect_string,
                                           is_primary=False)
 
-            master_instance = driver.get_master_instance()
+            master_instance = driver.get_master_instance(
+                force_refresh=True
+            )
 
             LOG.info('Switching Databases')
             driver.check_replication_and_switch(instance=secondary_instance)
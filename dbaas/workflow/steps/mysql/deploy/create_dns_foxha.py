@@ -15,6 +15,7 @@ LOG = logging.getLogger(__name__)
 
 
 class CreateDnsFoxHA(BaseStep):
+    independent_undo = True
 
     def __unicode__(self):
         return "Requesting DNS..."
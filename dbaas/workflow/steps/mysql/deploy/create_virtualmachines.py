@@ -13,6 +13,8 @@ from django.core.exceptions import ObjectDoesNotExist
 from physical.models import Host
 from physical.models import Instance
 from ...util.base import BaseStep
+from ...util.deploy.virtual_machines import deploy_virtual_machines, \
+    undo_virtual_machines
 from ....exceptions.error_codes import DBAAS_0011
 
 LOG = logging.getLogger(__name__)
@@ -56,6 +58,7 @@ class CreateVirtualMachine(BaseStep):
                 bundle = LastUsedBundle.get_next_infra_bundle(
                     plan=workflow_dict['plan'], bundles=bundles)
 
+            vms = []
             for index, vm_name in enumerate(workflow_dict['names']['vms']):
                 offering = cs_plan_attrs.get_stronger_offering()
 
@@ -70,24 +73,17 @@ class CreateVirtualMachine(BaseStep):
                         'databaseinfra']
                     dbinfra_offering.save()
 
-                LOG.debug(
-                    "Deploying new vm on cs with bundle %s and offering %s" % (bundle, offering))
+                vms.append((vm_name, offering, bundle))
 
-                error, vm = cs_provider.deploy_virtual_machine(
-                    offering=offering.serviceofferingid,
-                    bundle=bundle,
-                    project_id=cs_credentials.project,
-                    vmname=vm_name,
-                    affinity_group_id=cs_credentials.get_parameter_by_name(
-                        'affinity_group_id'),
-                )
-
-                if error:
-                    raise Exception(error)
-
-                LOG.debug("New virtualmachine: %s" % vm)
+            deployed_vms = deploy_virtual_machines(
+                cs_provider, cs_credentials, workflow_dict['environment'], vms
+            )
+            workflow_dict['vms_id'] = [
+                vm['virtualmachine'][0]['id'] for vm in deployed_vms
+            ]
 
-                workflow_dict['vms_id'].append(vm['virtualmachine'][0]['id'])
+            for index, vm in enumerate(deployed_vms):
+                vm_name, offering, bundle = vms[index]
 
                 host = Host()
                 host.address = vm['virtualmachine'][0]['nic'][0]['ipaddress']
@@ -156,46 +152,10 @@ class CreateVirtualMachine(BaseStep):
 
             cs_provider = CloudStackProvider(credentials=cs_credentials)
 
-            instances = workflow_dict['databaseinfra'].instances.all()
-
-            if not instances:
-
-                for vm_id in workflow_dict['vms_id']:
-                    cs_provider.destroy_virtual_machine(
-                        project_id=cs_credentials.project,
-                        environment=workflow_dict['environment'],
-                        vm_id=vm_id)
-
-                for host in workflow_dict['hosts']:
-                    host_attr = HostAttr.objects.filter(host=host)
-
-                    host.delete()
-                    LOG.info("Host deleted!")
-
-                    if host_attr:
-                        host_attr[0].delete()
-                        LOG.info("HostAttr deleted!")
-
-            for instance in instances:
-                host = instance.hostname
-
-                host_attr = HostAttr.objects.get(host=host)
-
-                LOG.info("Destroying virtualmachine %s" % host_attr.vm_id)
-
-                cs_provider.destroy_virtual_machine(
-                    project_id=cs_credentials.project,
-                    environment=workflow_dict['environment'],
-                    vm_id=host_attr.vm_id)
-
-                host_attr.delete()
-                LOG.info("HostAttr deleted!")
-
-                instance.delete()
-                LOG.info("Instance deleted")
-
-                host.delete()
-                LOG.info("Host deleted!")
+            undo_virtual_machines(
+                cs_provider, cs_credentials, workflow_dict,
+                workflow_dict['databaseinfra'].instances.all()
+            )
 
             return True
         except Exception:
@@ -5,7 +5,7 @@ from dbaas_nfsaas.models import HostAttr
 from dbaas_cloudstack.models import HostAttr as CsHostAttr
 from itertools import permutations
 from physical.configurations import configuration_factory
-from util import check_ssh
+from util import wait_for_ssh_hosts
 from util import get_credentials_for
 from util import exec_remote_command
 from util import full_stack
@@ -39,21 +39,19 @@ class InitDatabase(BaseStep):
 
             plan = workflow_dict['plan']
 
+            LOG.info("Cheking hosts ssh...")
+            hosts_not_ready = wait_for_ssh_hosts(
+                workflow_dict['hosts']
+            )
+            if hosts_not_ready:
+                LOG.warn("Hosts %s are not ready..." % hosts_not_ready)
+                return False
+
             for index, hosts in enumerate(permutations(workflow_dict['hosts'])):
 
                 LOG.info("Getting vm credentials...")
                 host_csattr = CsHostAttr.objects.get(host=hosts[0])
 
-                LOG.info("Cheking host ssh...")
-                host_ready = check_ssh(
-                    server=hosts[0].address, username=host_csattr.vm_user,
-                    password=host_csattr.vm_password, wait=5, interval=10
-                )
-
-                if not host_ready:
-                    LOG.warn("Host %s is not ready..." % hosts[0])
-                    return False
-
                 host_nfsattr = HostAttr.objects.get(host=hosts[0])
 
                 contextdict = {
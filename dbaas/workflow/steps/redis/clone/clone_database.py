@@ -2,6 +2,7 @@
 import logging
 from util import full_stack
 from util import call_script
+from util import log_script_line
 from django.conf import settings
 from drivers import factory_for
 from system.models import Configuration
@@ -32,7 +33,10 @@ class CloneDatabase(BaseStep):
             python_bin = Configuration.get_by_name('python_venv_bin')
 
             return_code, output = call_script(
-                script_name, working_dir=settings.SCRIPTS_PATH, args=args, split_lines=False, python_bin=python_bin)
+                script_name, working_dir=settings.SCRIPTS_PATH, args=args,
+                split_lines=False, python_bin=python_bin,
+                callback=log_script_line
+            )
 
             LOG.info("Script Output: {}".format(output))
             LOG.info("Return code: {}".format(return_code))
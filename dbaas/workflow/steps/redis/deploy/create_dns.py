@@ -14,6 +14,7 @@ LOG = logging.getLogger(__name__)
 
 
 class CreateDns(BaseStep):
+    independent_undo = True
 
     def __unicode__(self):
         return "Requesting DNS..."
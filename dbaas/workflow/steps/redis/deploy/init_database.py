@@ -3,7 +3,7 @@ import logging
 from dbaas_cloudstack.models import HostAttr as CsHostAttr
 from dbaas_credentials.models import CredentialType
 from dbaas_nfsaas.models import HostAttr
-from util import check_ssh, get_credentials_for, exec_remote_command, \
+from util import wait_for_ssh_hosts, get_credentials_for, exec_remote_command, \
     build_context_script
 from physical.models import Instance
 from physical.configurations import configuration_factory
@@ -37,20 +37,19 @@ class InitDatabaseRedis(BaseStep):
 
             plan = workflow_dict['plan']
 
+            LOG.info("Cheking hosts ssh...")
+            hosts_not_ready = wait_for_ssh_hosts(
+                workflow_dict['hosts']
+            )
+            if hosts_not_ready:
+                LOG.warn("Hosts %s are not ready..." % hosts_not_ready)
+                return False
+
             for index, host in enumerate(workflow_dict['hosts']):
 
                 LOG.info("Getting vm credentials...")
                 host_csattr = CsHostAttr.objects.get(host=host)
 
-                LOG.info("Cheking host ssh...")
-                host_ready = check_ssh(
-                    server=host.address, username=host_csattr.vm_user,
-                    password=host_csattr.vm_password, wait=5, interval=10)
-
-                if not host_ready:
-                    LOG.warn("Host %s is not ready..." % host)
-                    return False
-
                 host.update_os_description()
 
                 instances_redis = Instance.objects.filter(
@@ -10,7 +10,7 @@ class AddInstanceToRedisCluster(DatabaseStep):
         return "Adding instance to Redis Cluster..."
 
     def do(self):
-        master = self.driver.get_master_instance()
+        master = self.driver.get_master_instance(force_refresh=True)
         client = self.driver.get_client(self.instance)
         client.slaveof(master.address, master.port)
 
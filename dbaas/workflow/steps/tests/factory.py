@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import logging
-from ..util.base import BaseStep
+import time
+from ..util.base import BaseStep, BaseInstanceStep
 
 LOG = logging.getLogger(__name__)
 
@@ -52,3 +53,95 @@ class TestStep4(BaseStep):
     def undo(self, workflow_dict):
         raise Exception
         return False
+
+
+class TestStepCounter(BaseStep):
+
+    runs = 0
+
+    def __unicode__(self):
+        return "TestStepCounter"
+
+    def do(self, workflow_dict):
+        TestStepCounter.runs += 1
+        return True
+
+    def undo(self, workflow_dict):
+        return True
+
+
+class TestStepFailure(BaseStep):
+
+    fail = True
+
+    def __unicode__(self):
+        return "TestStepFailure"
+
+    def do(self, workflow_dict):
+        return not self.fail
+
+    def undo(self, workflow_dict):
+        return True
+
+
+class TestStepIndependentUndo(BaseStep):
+
+    independent_undo = True
+    undone = []
+
+    def __unicode__(self):
+        return "TestStepIndependentUndo"
+
+    def do(self, workflow_dict):
+        return True
+
+    def undo(self, workflow_dict):
+        self.undone.append(self.__class__)
+        return True
+
+
+class TestInstanceStep(BaseInstanceStep):
+
+    done = []
+
+    def __unicode__(self):
+        return "TestInstanceStep"
+
+    def do(self):
+        self.done.append(self.instance)
+
+    def undo(self):
+        pass
+
+
+class TestInstanceStepWaitDetails(TestInstanceStep):
+
+    """ Waits on wait_for until the details of the other instances show
+    up in the task """
+
+    task = None
+    wait_for = None
+    details_seen = False
+
+    def do(self):
+        if self.instance == self.wait_for:
+            started_at = time.time()
+            while time.time() - started_at < 5:
+                if 'SUCCESS!' in (self.task.last_detail_line() or ''):
+                    TestInstanceStepWaitDetails.details_seen = True
+                    break
+                time.sleep(0.05)
+        super(TestInstanceStepWaitDetails, self).do()
+
+
+class TestInstanceStepFailure(TestInstanceStep):
+
+    fail_for = None
+
+    def __unicode__(self):
+        return "TestInstanceStepFailure"
+
+    def do(self):
+        if self.instance == self.fail_for:
+            raise Exception('Step failure')
+        super(TestInstanceStepFailure, self).do()
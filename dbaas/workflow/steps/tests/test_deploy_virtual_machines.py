@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import threading
+import time
+from mock import Mock, patch
+from django.test import TestCase
+from ..util.deploy.virtual_machines import deploy_virtual_machines, \
+    destroy_virtual_machines, undo_virtual_machines
+
+
+class DeployVirtualMachinesTestCase(TestCase):
+
+    def setUp(self):
+        self.credentials = Mock(project='project')
+        self.offering = Mock(serviceofferingid='offering')
+        self.vms = [
+            ('vm-01', self.offering, 'bundle-1'),
+            ('vm-02', self.offering, 'bundle-2'),
+            ('vm-03', self.offering, 'bundle-1'),
+        ]
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def deploy_virtual_machine(self, offering, bundle, project_id, vmname,
+                               affinity_group_id):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+
+        if vmname == 'vm-02' and self.fail:
+            return 'Deploy error', None
+        return None, {'virtualmachine': [{'id': vmname + '-id'}]}
+
+    def deploy(self, fail=False):
+        self.fail = fail
+        self.provider = Mock()
+        self.provider.deploy_virtual_machine.side_effect = \
+            self.deploy_virtual_machine
+        return deploy_virtual_machines(
+            self.provider, self.credentials, 'environment', self.vms
+        )
+
+    def test_deploys_at_the_same_time(self):
+        vms = self.deploy()
+
+        self.assertEqual(
+            [vm['virtualmachine'][0]['id'] for vm in vms],
+            ['vm-01-id', 'vm-02-id', 'vm-03-id']
+        )
+        self.assertEqual(self.max_running, 3)
+        self.assertFalse(self.provider.destroy_virtual_machine.called)
+
+    def test_keeps_bundle_of_each_vm(self):
+        self.deploy()
+
+        bundles = {
+            call[1]['vmname']: call[1]['bundle']
+            for call in self.provider.deploy_virtual_machine.call_args_list
+        }
+        self.assertEqual(
+            bundles,
+            {'vm-01': 'bundle-1', 'vm-02': 'bundle-2', 'vm-03': 'bundle-1'}
+        )
+
+    def test_destroys_deployed_vms_when_any_fails(self):
+        with self.assertRaises(Exception):
+            self.deploy(fail=True)
+
+        destroyed = sorted(
+            call[1]['vm_id']
+            for call in self.provider.destroy_virtual_machine.call_args_list
+        )
+        self.assertEqual(destroyed, ['vm-01-id', 'vm-03-id'])
+
+
+class DestroyVirtualMachinesTestCase(TestCase):
+
+    def test_tries_every_vm(self):
+        provider = Mock()
+
+        def destroy_virtual_machine(project_id, environment, vm_id):
+            if vm_id == 'vm-02-id':
+                raise Exception('Destroy error')
+
+        provider.destroy_virtual_machine.side_effect = destroy_virtual_machine
+
+        errors = destroy_virtual_machines(
+            provider, Mock(project='project'), 'environment',
+            ['vm-01-id', 'vm-02-id', 'vm-03-id']
+        )
+
+        self.assertEqual(errors.keys(), ['vm-02-id'])
+        self.assertEqual(provider.destroy_virtual_machine.call_count, 3)
+
+
+class UndoVirtualMachinesTestCase(TestCase):
+
+    def setUp(self):
+        self.provider = Mock()
+        self.hosts = [Mock(pk=i) for i in range(1, 4)]
+        self.host_attrs = {
+            host.pk: Mock(vm_id='vm-0{}-id'.format(host.pk))
+            for host in self.hosts
+        }
+
+        patcher = patch(
+            'workflow.steps.util.deploy.virtual_machines.HostAttr'
+        )
+        host_attr = patcher.start()
+        self.addCleanup(patcher.stop)
+        host_attr.objects.get.side_effect = \
+            lambda host: self.host_attrs[host.pk]
+        host_attr.objects.filter.side_effect = \
+            lambda host: [self.host_attrs[host.pk]]
+
+        patcher = patch(
+            'workflow.steps.util.deploy.virtual_machines.Instance'
+        )
+        instance = patcher.start()
+        self.addCleanup(patcher.stop)
+        instance.objects.filter.return_value.exists.return_value = False
+
+    def test_destroys_vms_deployed_before_the_instances(self):
+        instance = Mock(hostname=self.hosts[0], hostname_id=1)
+        workflow_dict = {
+            'environment': 'environment',
+            'vms_id': ['vm-01-id', 'vm-02-id', 'vm-03-id'],
+            'hosts': self.hosts[:2],
+        }
+
+        undo_virtual_machines(
+            self.provider, Mock(project='project'), workflow_dict, [instance]
+        )
+
+        destroyed = sorted(
+            call[1]['vm_id']
+            for call in self.provider.destroy_virtual_machine.call_args_list
+        )
+        self.assertEqual(destroyed, ['vm-01-id', 'vm-02-id', 'vm-03-id'])
+        self.assertTrue(instance.delete.called)
+        self.assertTrue(self.hosts[0].delete.called)
+        self.assertTrue(self.hosts[1].delete.called)
+        self.assertTrue(self.host_attrs[2].delete.called)
+
+    def test_keeps_hosts_of_vms_not_destroyed(self):
+        def destroy_virtual_machine(project_id, environment, vm_id):
+            if vm_id == 'vm-02-id':
+                raise Exception('Destroy error')
+
+        self.provider.destroy_virtual_machine.side_effect = \
+            destroy_virtual_machine
+        workflow_dict = {
+            'environment': 'environment',
+            'vms_id': ['vm-01-id', 'vm-02-id'],
+            'hosts': self.hosts[:2],
+        }
+
+        with self.assertRaises(Exception):
+            undo_virtual_machines(
+                self.provider, Mock(project='project'), workflow_dict, []
+            )
+
+        self.assertTrue(self.hosts[0].delete.called)
+        self.assertFalse(self.hosts[1].delete.called)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import json
+import mock
+from django.test import TestCase
+from logical.tests.factory import DatabaseFactory
+from notification.models import TaskCheckpoint, TaskHistory
+from notification.tests.factory import TaskHistoryFactory
+from physical.tests.factory import InstanceFactory
+from workflow.workflow import steps_for_instances
+from .factory import TestInstanceStep, TestInstanceStepFailure, \
+    TestInstanceStepWaitDetails
+
+STEP = 'workflow.steps.tests.factory.TestInstanceStep'
+STEP_FAILURE = 'workflow.steps.tests.factory.TestInstanceStepFailure'
+STEP_WAIT_DETAILS = 'workflow.steps.tests.factory.TestInstanceStepWaitDetails'
+
+
+class StepsForInstancesParallelTestCase(TestCase):
+
+    def setUp(self):
+        self.database = DatabaseFactory()
+        self.instances = [
+            InstanceFactory(databaseinfra=self.database.databaseinfra,
+                            port=27017 + i)
+            for i in range(3)
+        ]
+        self.task = TaskHistoryFactory()
+        self.step_counter = mock.Mock()
+        TestInstanceStep.done = []
+        TestInstanceStepFailure.fail_for = None
+
+    def run_steps(self, steps, since_step=0):
+        return steps_for_instances(
+            [{'Parallel group': steps}], self.instances, self.task,
+            step_counter_method=self.step_counter, since_step=since_step,
+            parallel_groups={'Parallel group': 3}
+        )
+
+    def test_runs_all_instances(self):
+        self.assertTrue(self.run_steps((STEP, STEP)))
+
+        self.assertEqual(len(TestInstanceStep.done), 6)
+        self.assertEqual(set(TestInstanceStep.done), set(self.instances))
+        self.step_counter.assert_called_once_with(6)
+
+    def test_details_keep_serial_step_numbers(self):
+        self.run_steps((STEP, STEP))
+
+        details = self.task.details
+        for instance in self.instances:
+            self.assertIn('Instance: {}'.format(instance), details)
+        for step in range(1, 7):
+            self.assertIn('Step {} of 6 - TestInstanceStep'.format(step),
+                          details)
+
+    def test_details_are_written_as_instances_finish(self):
+        TestInstanceStepWaitDetails.task = self.task
+        TestInstanceStepWaitDetails.wait_for = self.instances[2]
+        TestInstanceStepWaitDetails.details_seen = False
+
+        self.assertTrue(self.run_steps((STEP_WAIT_DETAILS, )))
+
+        self.assertTrue(TestInstanceStepWaitDetails.details_seen)
+
+    def test_stops_at_first_failed_step(self):
+        TestInstanceStepFailure.fail_for = self.instances[0]
+
+        self.assertFalse(self.run_steps((STEP, STEP_FAILURE)))
+
+        self.step_counter.assert_called_once_with(2)
+        self.assertIn('FAILED!', self.task.details)
+        self.assertIn('Step failure', self.task.details)
+
+    def test_since_step(self):
+        self.assertTrue(self.run_steps((STEP, STEP), since_step=4))
+
+        self.assertEqual(
+            sorted(TestInstanceStep.done),
+            sorted([self.instances[1], self.instances[2], self.instances[2]])
+        )
+        self.assertIn('SKIPPED!', self.task.details)
+
+    def test_retry_skips_steps_done_by_other_instances(self):
+        failed_task = TaskHistoryFactory(
+            task_name='test_task', task_status=TaskHistory.STATUS_ERROR
+        )
+        self.database.pin_task(failed_task)
+        TaskCheckpoint.objects.create(
+            task=failed_task, step=1,
+            state=json.dumps({'done_steps': [3, 4, 5, 6]})
+        )
+        self.task = TaskHistoryFactory(task_name='test_task')
+
+        self.assertTrue(self.run_steps((STEP, STEP), since_step=2))
+
+        self.assertEqual(TestInstanceStep.done, [self.instances[0]])
+
+    def test_failure_keeps_steps_done_after_it(self):
+        TestInstanceStepFailure.fail_for = self.instances[0]
+
+        self.assertFalse(self.run_steps((STEP, STEP_FAILURE)))
+
+        # the other instances may stop before their next step
+        done_steps = []
+        for instance, first_step in zip(self.instances[1:], (3, 5)):
+            done = TestInstanceStep.done.count(instance)
+            done_steps.extend(range(first_step, first_step + done))
+        checkpoint = TaskCheckpoint.objects.filter(task=self.task).first()
+        if done_steps:
+            self.assertEqual(checkpoint.step, 1)
+            self.assertEqual(
+                json.loads(checkpoint.state)['done_steps'], done_steps
+            )
+        else:
+            self.assertIsNone(checkpoint)
+
+    def test_groups_not_declared_run_serially(self):
+        with mock.patch(
+            'workflow.workflow._steps_for_instances_in_parallel'
+        ) as in_parallel:
+            steps_for_instances(
+                [{'Serial group': (STEP, )}], self.instances, self.task
+            )
+
+        self.assertFalse(in_parallel.called)
+        self.assertEqual(TestInstanceStep.done, self.instances)
+
+    def test_invalid_step_fails_before_locking(self):
+        with mock.patch(
+            'logical.models.Database.update_task'
+        ) as update_task:
+            self.assertFalse(self.run_steps(
+                (STEP, 'workflow.steps.tests.factory.InvalidStep')
+            ))
+
+        self.assertFalse(update_task.called)
+        self.assertEqual(TestInstanceStep.done, [])
+        self.assertIn('Invalid steps', self.task.details)
+
+    def test_registers_step_timings(self):
+        TestInstanceStepFailure.fail_for = self.instances[1]
+
+        steps_for_instances(
+            [{'Serial group': (STEP, STEP_FAILURE)}], self.instances,
+            self.task
+        )
+
+        timings = self.task.step_timings.order_by('started_at', 'id')
+        self.assertEqual(
+            [(timing.step.split('.')[-1], timing.outcome)
+             for timing in timings],
+            [('TestInstanceStep', 'SUCCESS'),
+             ('TestInstanceStepFailure', 'SUCCESS'),
+             ('TestInstanceStep', 'SUCCESS'),
+             ('TestInstanceStepFailure', 'FAILED')]
+        )
+        self.assertEqual(timings[0].instance, '{}'.format(self.instances[0]))
@@ -2,8 +2,15 @@
 from __future__ import absolute_import, unicode_literals
 import logging
 from django.test import TestCase
+from logical.tests.factory import DatabaseFactory
+from notification.models import TaskCheckpoint
+from notification.tests.factory import TaskHistoryFactory
 from workflow.workflow import start_workflow
 from workflow.workflow import stop_workflow
+from workflow.workflow import resume_workflow
+from workflow.workflow import undo_batches
+from .factory import TestStep1, TestStepCounter, TestStepFailure
+from .factory import TestStepIndependentUndo
 
 LOG = logging.getLogger(__name__)
 
@@ -76,3 +83,91 @@ class StopWorkflowTestCase(TestCase):
                          ('DBAAS_0001', 'Workflow error')])
         self.assertEqual(self.workflow_dict['steps'], ('workflow.steps.tests.factory.TestStep4',
                                                        'workflow.steps.tests.factory.TestStep3'))
+
+
+class ResumeWorkflowTestCase(TestCase):
+
+    def setUp(self):
+        TestStepCounter.runs = 0
+        TestStepFailure.fail = True
+        self.database = DatabaseFactory()
+        self.task = TaskHistoryFactory()
+        self.workflow_dict = {
+            'steps': ('workflow.steps.tests.factory.TestStepCounter',
+                      'workflow.steps.tests.factory.TestStepFailure',
+                      'workflow.steps.tests.factory.TestStepCounter'),
+            'database': self.database,
+            'names': {'vms': ['vm1', 'vm2']},
+        }
+
+    def test_failed_workflow_is_checkpointed(self):
+        self.assertFalse(
+            start_workflow(self.workflow_dict, self.task, rollback=False)
+        )
+
+        checkpoint = TaskCheckpoint.objects.get(task=self.task)
+        self.assertEqual(checkpoint.step, 1)
+        self.assertEqual(TestStepCounter.runs, 1)
+
+    def test_resume_from_failed_step(self):
+        start_workflow(self.workflow_dict, self.task, rollback=False)
+        TestStepFailure.fail = False
+        task = TaskHistoryFactory()
+
+        workflow_dict = resume_workflow(self.task, task)
+
+        self.assertTrue(workflow_dict['created'])
+        self.assertEqual(workflow_dict['database'], self.database)
+        self.assertEqual(workflow_dict['names'], {'vms': ['vm1', 'vm2']})
+        self.assertEqual(TestStepCounter.runs, 2)
+        self.assertEqual(TaskCheckpoint.objects.get(task=task).step, 3)
+        self.assertFalse(
+            TaskCheckpoint.objects.filter(task=self.task).exists()
+        )
+
+    def test_resume_without_checkpoint(self):
+        self.assertIsNone(resume_workflow(self.task, TaskHistoryFactory()))
+
+    def test_rollback_drops_checkpoint(self):
+        self.assertFalse(start_workflow(self.workflow_dict, self.task))
+
+        self.assertFalse(
+            TaskCheckpoint.objects.filter(task=self.task).exists()
+        )
+        self.assertIsNone(resume_workflow(self.task, TaskHistoryFactory()))
+
+    def test_state_that_can_not_be_checkpointed(self):
+        self.workflow_dict['provider'] = object()
+
+        start_workflow(self.workflow_dict, self.task, rollback=False)
+
+        self.assertFalse(
+            TaskCheckpoint.objects.filter(task=self.task).exists()
+        )
+
+
+class ConcurrentRollbackTestCase(TestCase):
+
+    def setUp(self):
+        TestStepIndependentUndo.undone = []
+
+    def test_undo_batches(self):
+        self.assertEqual(
+            undo_batches([
+                TestStepIndependentUndo, TestStepIndependentUndo, TestStep1,
+                TestStepIndependentUndo, TestStep1, TestStep1
+            ]),
+            [[TestStepIndependentUndo, TestStepIndependentUndo], [TestStep1],
+             [TestStepIndependentUndo], [TestStep1], [TestStep1]]
+        )
+
+    def test_stop_workflow_undoes_independent_steps(self):
+        workflow_dict = {
+            'steps': ('workflow.steps.tests.factory.TestStep1',
+                      'workflow.steps.tests.factory.TestStepIndependentUndo',
+                      'workflow.steps.tests.factory.TestStepIndependentUndo')
+        }
+
+        self.assertTrue(stop_workflow(workflow_dict))
+        self.assertEqual(len(TestStepIndependentUndo.undone), 2)
+        self.assertEqual(workflow_dict['step_counter'], 0)
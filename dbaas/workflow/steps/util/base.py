@@ -10,6 +10,11 @@ LOG = logging.getLogger(__name__)
 @python_2_unicode_compatible
 class BaseStep(object):
 
+    # True when undo only releases resources of external services, like DNS
+    # or monitoring, so it may run at the same time as neighbouring steps
+    # with independent_undo, see workflow.undo_batches
+    independent_undo = False
+
     def __str__(self):
         return "I am a step"
 
@@ -23,6 +28,9 @@ class BaseStep(object):
 @python_2_unicode_compatible
 class BaseInstanceStep(object):
 
+    # See BaseStep.independent_undo
+    independent_undo = False
+
     def __str__(self):
         return "I am a step"
 
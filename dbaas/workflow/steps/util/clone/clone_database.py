@@ -2,6 +2,7 @@
 import logging
 from util import full_stack
 from util import call_script
+from util import log_script_line
 from django.conf import settings
 from drivers import factory_for
 from notification.util import get_clone_args
@@ -29,7 +30,9 @@ class CloneDatabase(BaseStep):
                 workflow_dict['clone'].databaseinfra).clone()
 
             return_code, output = call_script(
-                script_name, working_dir=settings.SCRIPTS_PATH, args=args, split_lines=False,)
+                script_name, working_dir=settings.SCRIPTS_PATH, args=args,
+                split_lines=False, callback=log_script_line
+            )
 
             LOG.info("Script Output: {}".format(output))
             LOG.info("Return code: {}".format(return_code))
@@ -140,7 +140,7 @@ class CheckIfSwitchMaster(DatabaseStep):
 
     def do(self):
         for _ in range(CHECK_ATTEMPTS):
-            master = self.driver.get_master_instance()
+            master = self.driver.get_master_instance(force_refresh=True)
             if master and master != self.instance:
                 return
             sleep(CHECK_SECONDS)
@@ -309,7 +309,9 @@ class SetSlave(DatabaseStep):
         if not self.instance.is_database:
             return
 
-        master = self.infra.get_driver().get_master_instance()
+        master = self.infra.get_driver().get_master_instance(
+            force_refresh=True
+        )
         if master == self.instance:
             return
 
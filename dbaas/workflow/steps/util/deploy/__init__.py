@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import logging
 from dbaas_cloudstack.models import HostAttr
-from util import exec_remote_command, check_ssh
+from util import exec_remote_command, wait_for_ssh_hosts
 from workflow.exceptions.error_codes import DBAAS_0015
 from util import full_stack
 from util import build_context_script
@@ -64,16 +64,14 @@ def start_vm(workflow_dict):
             if not started:
                 raise Exception, "Could not start host {}".format(host)
 
-        for instance_detail in instances_detail:
-            instance = instance_detail['instance']
-            host = instance.hostname
-            host_csattr = HostAttr.objects.get(host=host)
-            host_ready = check_ssh(
-                server=host.address, username=host_csattr.vm_user, password=host_csattr.vm_password, wait=5, interval=10)
-            if not host_ready:
-                error = "Host %s is not ready..." % host
-                LOG.warn(error)
-                raise Exception, error
+        hosts_not_ready = wait_for_ssh_hosts(
+            instance_detail['instance'].hostname
+            for instance_detail in instances_detail
+        )
+        if hosts_not_ready:
+            error = "Hosts %s are not ready..." % hosts_not_ready
+            LOG.warn(error)
+            raise Exception, error
 
         return True
     except Exception, e:
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import logging
 from util import full_stack
-from util import check_nslookup
+from util.dns import wait_for_dns
 from util import get_credentials_for
 from dbaas_dnsapi.models import DatabaseInfraDNSList
 from dbaas_credentials.models import CredentialType
@@ -24,11 +24,18 @@ class CheckDns(BaseStep):
             dns_credentials = get_credentials_for(environment=workflow_dict['environment'],
                                                   credential_type=CredentialType.DNSAPI)
 
-            dns_list = DatabaseInfraDNSList.objects.filter(databaseinfra=workflow_dict['databaseinfra'].id)
-
-            for dns in dns_list:
-                LOG.info("Checking dns %s on %s" % (dns.dns, dns_credentials.project))
-                check_nslookup(dns.dns, dns_credentials.project)
+            dns_list = DatabaseInfraDNSList.objects.filter(
+                databaseinfra=workflow_dict['databaseinfra'].id
+            ).values_list('dns', flat=True)
+
+            LOG.info("Checking dns %s on %s" % (
+                ", ".join(dns_list), dns_credentials.project
+            ))
+            not_resolved = wait_for_dns(dns_list, dns_credentials.project)
+            if not_resolved:
+                raise Exception("DNS not propagated: {}".format(
+                    ", ".join(not_resolved)
+                ))
 
             return True
         except Exception:
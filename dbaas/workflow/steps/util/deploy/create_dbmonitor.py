@@ -9,6 +9,7 @@ LOG = logging.getLogger(__name__)
 
 
 class CreateDbMonitor(BaseStep):
+    independent_undo = True
 
     def __unicode__(self):
         return "Registering dbmonitor monitoring..."
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import logging
 from util import full_stack
+from util.parallel import run_in_parallel
 from physical.models import Instance
 from workflow.steps.util.nfsaas_utils import create_disk, delete_disk
 from workflow.steps.util.base import BaseStep
@@ -8,8 +9,11 @@ from workflow.exceptions.error_codes import DBAAS_0009
 
 LOG = logging.getLogger(__name__)
 
+UNDO_MAX_WORKERS = 10
+
 
 class CreateNfs(BaseStep):
+    independent_undo = True
 
     def __unicode__(self):
         return "Requesting NFS volume..."
@@ -51,11 +55,17 @@ class CreateNfs(BaseStep):
 
     def undo(self, workflow_dict):
         try:
-            for host in workflow_dict['hosts']:
-                if not delete_disk(workflow_dict['environment'], host):
-                    return False
+            def delete(host):
+                return delete_disk(workflow_dict['environment'], host)
 
-            return True
+            results = run_in_parallel(
+                delete, workflow_dict['hosts'], max_workers=UNDO_MAX_WORKERS
+            )
+            for result in results:
+                if result.error:
+                    raise result.error
+
+            return all(result.value for result in results)
         except Exception:
             traceback = full_stack()
 
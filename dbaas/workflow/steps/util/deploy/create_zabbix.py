@@ -11,6 +11,7 @@ LOG = logging.getLogger(__name__)
 
 
 class CreateZabbix(BaseStep):
+    independent_undo = True
 
     def __unicode__(self):
         return "Registering zabbix monitoring..."
@@ -1,8 +1,7 @@
 # -*- coding: utf-8 -*-
 import logging
 from util import full_stack
-from util import exec_remote_command
-from dbaas_cloudstack.models import HostAttr as CS_HostAttr
+from util import exec_remote_command_hosts
 from workflow.steps.util.base import BaseStep
 from workflow.steps.util import test_bash_script_error
 from workflow.steps.util import monit_script
@@ -19,24 +18,24 @@ class StartMonit(BaseStep):
     def do(self, workflow_dict):
         try:
             option = 'start'
-            for host in workflow_dict['hosts']:
-                LOG.info("{} monit on host {}".format(option, host))
-                cs_host_attr = CS_HostAttr.objects.get(host=host)
-
-                script = test_bash_script_error()
-                script += monit_script(option)
-
-                LOG.info(script)
-                output = {}
-                return_code = exec_remote_command(server=host.address,
-                                                  username=cs_host_attr.vm_user,
-                                                  password=cs_host_attr.vm_password,
-                                                  command=script,
-                                                  output=output)
-                LOG.info(output)
-                if return_code != 0:
+            LOG.info("{} monit on hosts {}".format(
+                option, workflow_dict['hosts']
+            ))
+            script = test_bash_script_error()
+            script += monit_script(option)
+            LOG.info(script)
+
+            results = exec_remote_command_hosts(
+                workflow_dict['hosts'], script
+            )
+            for result in results:
+                LOG.info(result)
+                if not result.ok:
                     LOG.error("Error monit")
-                    LOG.error(str(output))
+                    LOG.error(str({
+                        'stdout': result.stdout, 'stderr': result.stderr,
+                        'exception': result.error
+                    }))
 
             return True
         except Exception:
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import logging
+from dbaas_cloudstack.models import HostAttr
+from physical.models import Instance
+from util.parallel import run_in_parallel
+
+LOG = logging.getLogger(__name__)
+
+DEPLOY_MAX_WORKERS = 10
+
+
+def deploy_virtual_machines(cs_provider, cs_credentials, environment, vms,
+                            max_workers=DEPLOY_MAX_WORKERS):
+    """
+    Deploys the virtual machines at the same time, so a deploy takes the
+    time of the slowest virtual machine instead of the sum of all of them.
+
+    vms is a list of (vm_name, offering, bundle). Returns the deployed
+    virtual machines in the same order. When any deploy fails the virtual
+    machines already deployed are destroyed and an Exception is raised.
+    """
+    affinity_group_id = cs_credentials.get_parameter_by_name(
+        'affinity_group_id'
+    )
+
+    def deploy(vm):
+        vm_name, offering, bundle = vm
+        LOG.debug(
+            "Deploying new vm %s on cs with bundle %s and offering %s" % (
+                vm_name, bundle, offering
+            )
+        )
+        error, virtual_machine = cs_provider.deploy_virtual_machine(
+            offering=offering.serviceofferingid,
+            bundle=bundle,
+            project_id=cs_credentials.project,
+            vmname=vm_name,
+            affinity_group_id=affinity_group_id,
+        )
+        if error:
+            raise Exception(error)
+
+        LOG.debug("New virtualmachine: %s" % virtual_machine)
+        return virtual_machine
+
+    results = run_in_parallel(deploy, vms, max_workers=max_workers)
+
+    errors = [result.error for result in results if result.error]
+    if not errors:
+        return [result.value for result in results]
+
+    for result in results:
+        if not result.ok:
+            continue
+
+        vm_id = result.value['virtualmachine'][0]['id']
+        LOG.info("Destroying virtualmachine %s" % vm_id)
+        try:
+            cs_provider.destroy_virtual_machine(
+                project_id=cs_credentials.project,
+                environment=environment,
+                vm_id=vm_id
+            )
+        except Exception as e:
+            LOG.error("Could not destroy virtualmachine %s: %s" % (vm_id, e))
+
+    raise errors[0]
+
+
+def destroy_virtual_machines(cs_provider, cs_credentials, environment, vm_ids,
+                             max_workers=DEPLOY_MAX_WORKERS):
+    """
+    Destroys the virtual machines at the same time. Every virtual machine is
+    tried; returns the errors by vm_id, empty when all were destroyed.
+    """
+    def destroy(vm_id):
+        LOG.info("Destroying virtualmachine %s" % vm_id)
+        cs_provider.destroy_virtual_machine(
+            project_id=cs_credentials.project,
+            environment=environment,
+            vm_id=vm_id
+        )
+
+    results = run_in_parallel(destroy, vm_ids, max_workers=max_workers)
+    return dict(
+        (result.item, result.error) for result in results if result.error
+    )
+
+
+def undo_virtual_machines(cs_provider, cs_credentials, workflow_dict,
+                          instances):
+    """
+    Destroys the virtual machines of a deploy and deletes their rows: the
+    instances given, with their hosts, and also the virtual machines and
+    hosts created before the deploy failed, which have no instance yet.
+    Every virtual machine is tried; rows are kept for the ones not
+    destroyed and the first error is raised.
+    """
+    vm_ids = list(workflow_dict.get('vms_id', []))
+    destroy = []
+    for instance in instances:
+        host_attr = HostAttr.objects.get(host=instance.hostname)
+        destroy.append((instance, host_attr))
+        if host_attr.vm_id not in vm_ids:
+            vm_ids.append(host_attr.vm_id)
+
+    instance_hosts = set(instance.hostname_id for instance, _ in destroy)
+    orphan_hosts = [
+        host for host in workflow_dict.get('hosts', [])
+        if host.pk not in instance_hosts and
+        not Instance.objects.filter(hostname=host).exists()
+    ]
+
+    errors = destroy_virtual_machines(
+        cs_provider, cs_credentials, workflow_dict['environment'], vm_ids
+    )
+
+    for instance, host_attr in destroy:
+        if host_attr.vm_id in errors:
+            continue
+
+        host = instance.hostname
+
+        host_attr.delete()
+        LOG.info("HostAttr deleted!")
+
+        instance.delete()
+        LOG.info("Instance deleted")
+
+        host.delete()
+        LOG.info("Host deleted!")
+
+    for host in orphan_hosts:
+        host_attrs = HostAttr.objects.filter(host=host)
+        if any(host_attr.vm_id in errors for host_attr in host_attrs):
+            continue
+
+        for host_attr in host_attrs:
+            host_attr.delete()
+            LOG.info("HostAttr deleted!")
+
+        host.delete()
+        LOG.info("Host deleted!")
+
+    if errors:
+        raise Exception(errors.values()[0])
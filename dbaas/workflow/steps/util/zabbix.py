@@ -60,6 +60,7 @@ class DestroyAlarms(ZabbixStep):
 
 
 class CreateAlarms(ZabbixStep):
+    independent_undo = True
 
     def __unicode__(self):
         return "Creating Zabbix alarms..."
@@ -1,14 +1,191 @@
 # -*- coding: utf-8 -*-
+import json
 import logging
+import threading
 import time
+from contextlib import contextmanager
+from Queue import Queue, Empty
+from datetime import datetime
 from util import full_stack
+from util.parallel import run_in_parallel
+from django.db.models import Model, get_model
 from django.utils.module_loading import import_by_path
 from exceptions.error_codes import DBAAS_0001
 from logical.models import Database
+from notification.models import TaskCheckpoint, TaskStepTiming
 from physical.models import DatabaseInfra, Instance
 
 LOG = logging.getLogger(__name__)
 
+# Step classes by class path, imported once per process
+STEP_CLASSES = {}
+VALID_TOPOLOGIES = set()
+
+
+def get_step_class(step):
+    step_class = STEP_CLASSES.get(step)
+    if step_class is None:
+        step_class = import_by_path(step)
+        STEP_CLASSES[step] = step_class
+    return step_class
+
+
+def get_step_classes(steps):
+    """ Imports every step before any of them runs, raising
+    ImproperlyConfigured for the first invalid class path """
+    return [get_step_class(step) for step in steps]
+
+
+def compile_groups_of_steps(list_of_groups_of_steps):
+    """ Returns a list of (group description, step paths, step classes) """
+    compiled = []
+    for group_of_steps in list_of_groups_of_steps:
+        group_name, steps = group_of_steps.items()[0]
+        compiled.append((group_name, steps, get_step_classes(steps)))
+    return compiled
+
+
+def validate_topology_steps(topology):
+    """ Imports the steps of every get_*_steps method of a replication
+    topology, once per topology class """
+    topology_class = topology.__class__
+    if topology_class in VALID_TOPOLOGIES:
+        return
+
+    get_step_classes(topology.get_all_steps())
+    VALID_TOPOLOGIES.add(topology_class)
+
+
+@contextmanager
+def step_timing(step_class, task=None, instance=None, undo=False,
+                workflow_dict=None):
+    """ Registers how long the step inside the block took and whether it
+    raised """
+    started_at = datetime.now()
+
+    def register(succeeded):
+        databaseinfra = None
+        if workflow_dict:
+            databaseinfra = workflow_dict.get('databaseinfra')
+        TaskStepTiming.register(
+            step_class, started_at, succeeded, task=task, instance=instance,
+            databaseinfra=databaseinfra, undo=undo
+        )
+
+    try:
+        yield
+    except Exception:
+        register(False)
+        raise
+    register(True)
+
+
+ROLLBACK_MAX_WORKERS = 5
+PARALLEL_DETAILS_INTERVAL = 0.5  # seconds
+
+# Keys of workflow_dict rebuilt by start_workflow on every run
+CHECKPOINT_IGNORED_KEYS = (
+    'exceptions', 'msgs', 'status', 'database_pinned', 'created',
+    'step_counter', 'total_steps',
+)
+
+
+def _dump_state(value):
+    if isinstance(value, Model):
+        if value.pk is None:
+            raise ValueError("{!r} was not saved".format(value))
+        return {
+            '__model__': '{}.{}'.format(
+                value._meta.app_label, value._meta.object_name
+            ),
+            'pk': value.pk
+        }
+    if isinstance(value, dict):
+        return dict(
+            (key, _dump_state(item)) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return [_dump_state(item) for item in value]
+    if value is None or isinstance(value, (basestring, bool, int, long, float)):
+        return value
+    raise ValueError("Cannot checkpoint {!r}".format(value))
+
+
+def _load_state(value):
+    if isinstance(value, dict):
+        if '__model__' in value:
+            model = get_model(*value['__model__'].split('.'))
+            return model.objects.get(pk=value['pk'])
+        return dict(
+            (key, _load_state(item)) for key, item in value.items()
+        )
+    if isinstance(value, list):
+        return [_load_state(item) for item in value]
+    return value
+
+
+def checkpoint_workflow(workflow_dict, task):
+    """ Stores workflow_dict, with models as references by pk, so a failed
+    start_workflow can be resumed from the step after the last one done """
+    state = dict(
+        (key, value) for key, value in workflow_dict.items()
+        if key not in CHECKPOINT_IGNORED_KEYS
+    )
+    try:
+        state = json.dumps(_dump_state(state))
+    except ValueError as e:
+        LOG.warn("Workflow of task {} can not be resumed: {}".format(
+            task.id, e
+        ))
+        TaskCheckpoint.objects.filter(task=task).delete()
+        return False
+
+    TaskCheckpoint.objects.filter(task=task).delete()
+    TaskCheckpoint.objects.create(
+        task=task, step=workflow_dict['step_counter'], state=state
+    )
+    return True
+
+
+def undo_batches(step_classes):
+    """
+    Splits the step classes, keeping their order, in batches of consecutive
+    steps with independent_undo, which may be undone at the same time.
+    Every other step is a batch by itself.
+    """
+    batches = []
+    for step_class in step_classes:
+        independent = getattr(step_class, 'independent_undo', False)
+        if independent and batches and getattr(
+            batches[-1][0], 'independent_undo', False
+        ):
+            batches[-1].append(step_class)
+        else:
+            batches.append([step_class])
+    return batches
+
+
+def _resolve_workflow_steps(workflow_dict, task):
+    if 'steps' not in workflow_dict:
+        return True
+
+    try:
+        get_step_classes(workflow_dict['steps'])
+    except Exception:
+        traceback = full_stack()
+        exceptions = workflow_dict.setdefault(
+            'exceptions', {'traceback': [], 'error_codes': []}
+        )
+        exceptions['error_codes'].append(DBAAS_0001)
+        exceptions['traceback'].append(traceback)
+        LOG.warn("Invalid workflow steps: {}".format(traceback))
+        if task:
+            task.add_detail('Invalid workflow steps')
+            task.add_detail(traceback)
+        return False
+
+    return True
+
 
 def _get_databases(params):
     databases = set()
@@ -57,7 +234,17 @@ def _unlock_databases(params, task):
         database.unpin_task()
 
 
-def start_workflow(workflow_dict, task=None):
+def start_workflow(workflow_dict, task=None, since_step=0, rollback=True):
+    """
+    Runs workflow_dict['steps'] one after the other. When a task is given the
+    state is checkpointed after each step, see resume_workflow.
+
+    Steps before since_step are skipped. With rollback=False a failed
+    workflow keeps what it created instead of undoing the steps done.
+    """
+    if not _resolve_workflow_steps(workflow_dict, task):
+        return False
+
     if not _lock_databases(workflow_dict, task):
         return False
 
@@ -75,10 +262,9 @@ def start_workflow(workflow_dict, task=None):
         workflow_dict['exceptions']['traceback'] = []
         workflow_dict['exceptions']['error_codes'] = []
 
-        for step in workflow_dict['steps']:
+        for my_class in get_step_classes(workflow_dict['steps']):
             workflow_dict['step_counter'] += 1
 
-            my_class = import_by_path(step)
             my_instance = my_class()
 
             time_now = str(time.strftime("%m/%d/%Y %H:%M:%S"))
@@ -92,14 +278,21 @@ def start_workflow(workflow_dict, task=None):
                 workflow_dict['msgs'].append(msg)
                 task.update_details(persist=True, details=msg)
 
-            if not my_instance.do(workflow_dict):
-                workflow_dict['status'] = 0
-                raise Exception(
-                    "We caught an error while executing the steps...")
+            if workflow_dict['step_counter'] < since_step:
+                if task:
+                    task.update_details(persist=True, details="SKIPPED!")
+                continue
+
+            with step_timing(my_class, task, workflow_dict=workflow_dict):
+                if not my_instance.do(workflow_dict):
+                    workflow_dict['status'] = 0
+                    raise Exception(
+                        "We caught an error while executing the steps...")
 
             workflow_dict['status'] = 1
             if task:
                 task.update_details(persist=True, details="DONE!")
+                checkpoint_workflow(workflow_dict, task)
 
         workflow_dict['created'] = True
 
@@ -117,13 +310,65 @@ def start_workflow(workflow_dict, task=None):
         LOG.warn("\nException Traceback\n".join(
             workflow_dict['exceptions']['traceback']))
 
+        if not rollback:
+            if task:
+                task.add_detail(
+                    'Rollback skipped, the workflow can be resumed from '
+                    'step {}'.format(workflow_dict['step_counter'])
+                )
+            _unlock_databases(workflow_dict, task)
+            return False
+
         workflow_dict['steps'] = workflow_dict[
             'steps'][:workflow_dict['step_counter']]
         stop_workflow(workflow_dict, task)
+        if task:
+            # The checkpoint references what was just undone
+            TaskCheckpoint.objects.filter(task=task).delete()
         return False
 
 
+def resume_workflow(failed_task, task=None, rollback=True):
+    """
+    Runs again the start_workflow of failed_task from the step after the
+    last one done, with the state checkpointed by it. Returns the
+    workflow_dict, or None when failed_task has no checkpoint, because it
+    was rolled back or already resumed.
+    """
+    try:
+        checkpoint = TaskCheckpoint.objects.get(task=failed_task)
+    except TaskCheckpoint.DoesNotExist:
+        LOG.warn("Task {} has no checkpoint".format(failed_task.id))
+        if task:
+            task.add_detail(
+                'Task {} can not be resumed, it has no checkpoint'.format(
+                    failed_task.id
+                )
+            )
+        return None
+
+    workflow_dict = _load_state(json.loads(checkpoint.state))
+    if task:
+        task.add_detail('Resuming task {} from step {}'.format(
+            failed_task.id, checkpoint.step + 1
+        ))
+        # The checkpoint moves to the new task, so it can be resumed even
+        # if it fails at once, and failed_task is not resumed twice
+        TaskCheckpoint.objects.filter(task=task).delete()
+        checkpoint.task = task
+        checkpoint.save()
+
+    start_workflow(
+        workflow_dict, task, since_step=checkpoint.step + 1,
+        rollback=rollback
+    )
+    return workflow_dict
+
+
 def stop_workflow(workflow_dict, task=None):
+    if not _resolve_workflow_steps(workflow_dict, task):
+        return False
+
     if 'database_pinned' not in workflow_dict:
         if not _lock_databases(workflow_dict, task):
             return False
@@ -142,29 +387,50 @@ def stop_workflow(workflow_dict, task=None):
     workflow_dict['msgs'] = []
     workflow_dict['created'] = False
 
-    try:
-        for step in workflow_dict['steps'][::-1]:
-
-            my_class = import_by_path(step)
-            my_instance = my_class()
-
-            time_now = str(time.strftime("%m/%d/%Y %H:%M:%S"))
+    def undo(my_instance):
+        with step_timing(
+            my_instance.__class__, task, undo=True, workflow_dict=workflow_dict
+        ):
+            my_instance.undo(workflow_dict)
 
-            msg = "\n%s - Rollback Step %i of %i - %s" % (
-                time_now, workflow_dict['step_counter'], workflow_dict['total_steps'], str(my_instance))
+    def add_rollback_message(my_instance):
+        time_now = str(time.strftime("%m/%d/%Y %H:%M:%S"))
 
-            LOG.info(msg)
+        msg = "\n%s - Rollback Step %i of %i - %s" % (
+            time_now, workflow_dict['step_counter'], workflow_dict['total_steps'], str(my_instance))
 
-            workflow_dict['step_counter'] -= 1
+        LOG.info(msg)
 
-            if task:
-                workflow_dict['msgs'].append(msg)
-                task.update_details(persist=True, details=msg)
+        workflow_dict['step_counter'] -= 1
 
-            my_instance.undo(workflow_dict)
+        if task:
+            workflow_dict['msgs'].append(msg)
+            task.update_details(persist=True, details=msg)
 
-            if task:
-                task.update_details(persist=True, details="DONE!")
+    try:
+        step_classes = get_step_classes(workflow_dict['steps'])[::-1]
+        for batch in undo_batches(step_classes):
+            step_instances = [my_class() for my_class in batch]
+
+            if len(step_instances) == 1:
+                my_instance = step_instances[0]
+                add_rollback_message(my_instance)
+                undo(my_instance)
+                if task:
+                    task.update_details(persist=True, details="DONE!")
+                continue
+
+            LOG.info("Rolling back {} independent steps at the same "
+                     "time".format(len(step_instances)))
+            results = run_in_parallel(
+                undo, step_instances, max_workers=ROLLBACK_MAX_WORKERS
+            )
+            for result in results:
+                add_rollback_message(result.item)
+                if result.error:
+                    raise result.error
+                if task:
+                    task.update_details(persist=True, details="DONE!")
 
         _unlock_databases(workflow_dict, task)
         return True
@@ -218,28 +484,51 @@ def steps_for_instances_with_rollback(group_of_steps, instances, task):
 
     task.add_detail('Starting undo for instance {}'.format(instance))
 
-    undo_step_current = len(steps)
-    for step in reversed(steps):
+    def undo(item):
+        _, step_class = item
+        with step_timing(step_class, task, instance, undo=True):
+            step_class(instance).undo()
 
-        try:
-            step_class = import_by_path(step)
-            step_instance = step_class(instance)
-
-            task.add_step(undo_step_current, len(steps), 'Rollback ' + str(step_instance))
-
-            if instance_current_step < undo_step_current:
-                task.update_details("SKIPPED!", persist=True)
-            else:
-                step_instance.undo()
+    undo_step_current = len(steps)
+    for batch in undo_batches(get_step_classes(steps)[::-1]):
+        numbered = zip(
+            range(undo_step_current, undo_step_current - len(batch), -1),
+            batch
+        )
+        undo_step_current -= len(batch)
+
+        not_skipped = [
+            item for item in numbered if instance_current_step >= item[0]
+        ]
+        results = {}
+        if len(not_skipped) > 1:
+            for result in run_in_parallel(
+                undo, not_skipped, max_workers=ROLLBACK_MAX_WORKERS
+            ):
+                results[result.item[0]] = result
+
+        for step_number, step_class in numbered:
+            try:
+                step_instance = step_class(instance)
+
+                task.add_step(step_number, len(steps), 'Rollback ' + str(step_instance))
+
+                if instance_current_step < step_number:
+                    task.update_details("SKIPPED!", persist=True)
+                    continue
+
+                if step_number in results:
+                    if results[step_number].error:
+                        raise results[step_number].error
+                else:
+                    with step_timing(step_class, task, instance, undo=True):
+                        step_instance.undo()
                 task.update_details("SUCCESS!", persist=True)
 
-        except Exception as e:
-            task.update_details("FAILED!", persist=True)
-            task.add_detail(str(e))
-            task.add_detail(full_stack())
-
-        finally:
-            undo_step_current -= 1
+            except Exception as e:
+                task.update_details("FAILED!", persist=True)
+                task.add_detail(str(e))
+                task.add_detail(full_stack())
 
     databases = set()
     for instance in instances:
@@ -251,14 +540,258 @@ def steps_for_instances_with_rollback(group_of_steps, instances, task):
     return ret
 
 
+class ParallelStepsDetails(object):
+
+    """
+    Steps of instances running at the same time, reported by each instance
+    as it finishes them. They are written to the task by the thread running
+    the workflow, which keeps the task and its database connection.
+    """
+
+    def __init__(self, task, steps_total):
+        self.task = task
+        self.steps_total = steps_total
+        self._reported = Queue()
+        self._instance = None
+
+    def add_step(self, instance, step_number, description, status):
+        self._reported.put((instance, self._write_step, (
+            step_number, description, status
+        )))
+
+    def add_error(self, instance, error, traceback=None):
+        self._reported.put((instance, self._write_error, (error, traceback)))
+
+    def write_until_done(self, thread):
+        """ Writes the reported steps until thread ends """
+        while True:
+            alive = thread.is_alive()
+            self._write_reported()
+            if not alive:
+                return
+            thread.join(PARALLEL_DETAILS_INTERVAL)
+
+    def _write_reported(self):
+        while True:
+            try:
+                instance, write, args = self._reported.get_nowait()
+            except Empty:
+                return
+
+            if instance is not self._instance:
+                self.task.add_detail('Instance: {}'.format(instance))
+                self._instance = instance
+            write(*args)
+
+    def _write_step(self, step_number, description, status):
+        self.task.add_step(step_number, self.steps_total, description)
+        self.task.update_details(status, persist=True)
+
+    def _write_error(self, error, traceback):
+        self.task.add_detail(str(error))
+        if traceback:
+            self.task.add_detail(traceback)
+
+
+class InstanceStepsResult(object):
+
+    def __init__(self, instance, first_step, details=None):
+        self.instance = instance
+        self.first_step = first_step
+        self.details = details
+        self.steps = []
+        self.error = None
+        self.traceback = None
+
+    def add_step(self, step_number, description, status):
+        self.steps.append((step_number, description, status))
+        if self.details:
+            self.details.add_step(
+                self.instance, step_number, description, status
+            )
+
+    @property
+    def done_steps(self):
+        """ Numbers of the steps done now or in a previous run """
+        return [
+            step_number for step_number, _, status in self.steps
+            if status in ('SUCCESS!', 'SKIPPED!')
+        ]
+
+    @property
+    def first_not_done_step(self):
+        """ Number of the first step that did not finish with success """
+        if self.steps and self.steps[-1][2] == 'FAILED!':
+            return self.steps[-1][0]
+        return self.first_step + len(self.steps)
+
+
+def _run_steps_for_instance(
+        step_classes, instance, first_step, since_step, undo, cancelled,
+        task=None, done_steps=(), details=None
+):
+    result = InstanceStepsResult(instance, first_step, details)
+    for step_current, step_class in enumerate(step_classes, start=first_step):
+        if cancelled.is_set():
+            break
+
+        str_step_instance = step_class.__name__
+        try:
+            step_instance = step_class(instance)
+            str_step_instance = str(step_instance)
+            if undo:
+                str_step_instance = 'Rollback ' + str_step_instance
+
+            if step_current < since_step or step_current in done_steps:
+                result.add_step(step_current, str_step_instance, "SKIPPED!")
+                continue
+
+            with step_timing(step_class, task, instance, undo=undo):
+                if undo:
+                    step_instance.undo()
+                else:
+                    step_instance.do()
+            result.add_step(step_current, str_step_instance, "SUCCESS!")
+        except Exception as e:
+            result.add_step(step_current, str_step_instance, "FAILED!")
+            result.error = e
+            result.traceback = full_stack()
+            if details:
+                details.add_error(instance, e, result.traceback)
+            cancelled.set()
+            break
+
+    return result
+
+
+def _load_done_steps(databases):
+    """ Steps a failed parallel run finished after its first step not done,
+    read from the checkpoint of the task being retried """
+    for database in databases:
+        failed_task = database.current_locked_task
+        if not failed_task:
+            continue
+        try:
+            checkpoint = TaskCheckpoint.objects.get(task=failed_task)
+            return set(json.loads(checkpoint.state).get('done_steps') or [])
+        except (TaskCheckpoint.DoesNotExist, ValueError, AttributeError):
+            continue
+    return set()
+
+
+def _checkpoint_done_steps(task, first_not_done, done_steps):
+    """ Keeps the steps done after first_not_done, so a retry from
+    first_not_done does not run them again """
+    done_steps = sorted(step for step in done_steps if step > first_not_done)
+    TaskCheckpoint.objects.filter(task=task).delete()
+    if done_steps:
+        TaskCheckpoint.objects.create(
+            task=task, step=first_not_done - 1,
+            state=json.dumps({'done_steps': done_steps})
+        )
+
+
+def _steps_for_instances_in_parallel(
+        step_classes, instances, task, first_step, steps_total, since_step,
+        undo, max_workers, done_steps
+):
+    """
+    Runs the steps of every instance at the same time, at most max_workers
+    instances together. When one instance fails the others stop before their
+    next step.
+
+    Each step is written to the task as its instance finishes it, with the
+    same step number of the serial execution. Steps in done_steps are
+    skipped. Returns the number of the first step not done, or None when
+    all steps are done; done_steps is updated with the steps done.
+    """
+    task.add_detail('Running on {} instances at the same time'.format(
+        min(max_workers, len(instances))
+    ))
+
+    cancelled = threading.Event()
+    details = ParallelStepsDetails(task, steps_total)
+
+    def run_steps(item):
+        instance, instance_first_step = item
+        return _run_steps_for_instance(
+            step_classes, instance, instance_first_step, since_step, undo,
+            cancelled, task, done_steps, details
+        )
+
+    steps = step_classes
+    items = [
+        (instance, first_step + (index * len(steps)))
+        for index, instance in enumerate(instances)
+    ]
+    outcome = {}
+
+    def run():
+        try:
+            outcome['results'] = run_in_parallel(
+                run_steps, items, max_workers=max_workers
+            )
+        except Exception as e:
+            outcome['error'] = e
+
+    runner = threading.Thread(target=run)
+    runner.daemon = True
+    runner.start()
+    details.write_until_done(runner)
+    if 'error' in outcome:
+        raise outcome['error']
+
+    first_not_done = None
+    for result in outcome['results']:
+        instance, instance_first_step = result.item
+
+        if result.error:
+            details.add_error(instance, result.error)
+            details.write_until_done(runner)
+            instance_result = InstanceStepsResult(
+                instance, instance_first_step
+            )
+        else:
+            instance_result = result.value
+
+        done_steps.update(instance_result.done_steps)
+        if instance_result.first_not_done_step < \
+                instance_first_step + len(steps):
+            if first_not_done is None:
+                first_not_done = instance_result.first_not_done_step
+
+    return first_not_done
+
+
 def steps_for_instances(
         list_of_groups_of_steps, instances, task, step_counter_method=None,
-        since_step=0, undo=False
+        since_step=0, undo=False, parallel_groups=None
 ):
+    """
+    Runs each group of steps for every instance.
+
+    parallel_groups maps group descriptions to the max number of instances
+    that may run that group at the same time, see
+    BaseTopology.get_parallel_groups_of_steps. Other groups run one instance
+    after the other.
+
+    Every step class is imported before the databases are locked, so an
+    invalid class path fails the task without running any step.
+    """
+    try:
+        compiled_groups = compile_groups_of_steps(list_of_groups_of_steps)
+    except Exception as e:
+        task.add_detail('Invalid steps: {}'.format(e))
+        task.add_detail(full_stack())
+        return False
+
     databases = set()
     for instance in instances:
         databases.add(instance.databaseinfra.databases.first())
 
+    # read before the lock moves from the task being retried to this one
+    done_steps = _load_done_steps(databases) if since_step else set()
+
     for database in databases:
         databases_locked = []
         if not database.update_task(task):
@@ -271,8 +804,8 @@ def steps_for_instances(
         databases_locked.append(database)
 
     steps_total = 0
-    for group_of_steps in list_of_groups_of_steps:
-        steps_total += len(group_of_steps.items()[0][1])
+    for _, steps, _ in compiled_groups:
+        steps_total += len(steps)
 
     steps_total = steps_total * len(instances)
     step_current = 0
@@ -285,21 +818,43 @@ def steps_for_instances(
     if since_step:
         task.add_detail('Skipping until step {}\n'.format(since_step))
 
-    for count, group_of_steps in enumerate(list_of_groups_of_steps, start=1):
+    for count, (group_name, steps, step_classes) in enumerate(
+            compiled_groups, start=1
+    ):
         task.add_detail('Starting group of steps {} of {} - {}'.format(
-            count, len(list_of_groups_of_steps), group_of_steps.keys()[0])
+            count, len(compiled_groups), group_name)
         )
-        steps = group_of_steps.items()[0][1]
+
+        max_workers = (parallel_groups or {}).get(group_name, 1)
+        if max_workers > 1 and len(instances) > 1:
+            first_not_done = _steps_for_instances_in_parallel(
+                step_classes, instances, task, step_current + 1, steps_total,
+                since_step, undo, max_workers, done_steps
+            )
+            if first_not_done:
+                if step_counter_method:
+                    step_counter_method(first_not_done)
+                _checkpoint_done_steps(task, first_not_done, done_steps)
+                return False
+
+            step_current += len(steps) * len(instances)
+            if step_counter_method:
+                step_counter_method(step_current)
+
+            task.add_detail('Ending group of steps: {} of {}\n'.format(
+                count, len(compiled_groups))
+            )
+            continue
+
         for instance in instances:
             task.add_detail('Instance: {}'.format(instance))
-            for step in steps:
+            for step_class in step_classes:
                 step_current += 1
 
                 if step_counter_method:
                     step_counter_method(step_current)
 
                 try:
-                    step_class = import_by_path(step)
                     step_instance = step_class(instance)
 
                     if undo:
@@ -308,23 +863,28 @@ def steps_for_instances(
                         str_step_instance = str(step_instance)
                     task.add_step(step_current, steps_total, str_step_instance)
 
-                    if step_current < since_step:
+                    if step_current < since_step or \
+                            step_current in done_steps:
                         task.update_details("SKIPPED!", persist=True)
                     else:
-                        if undo:
-                            step_instance.undo()
-                        else:
-                            step_instance.do()
+                        with step_timing(
+                            step_class, task, instance, undo=undo
+                        ):
+                            if undo:
+                                step_instance.undo()
+                            else:
+                                step_instance.do()
                         task.update_details("SUCCESS!", persist=True)
 
                 except Exception as e:
                     task.update_details("FAILED!", persist=True)
                     task.add_detail(str(e))
                     task.add_detail(full_stack())
+                    _checkpoint_done_steps(task, step_current, done_steps)
                     return False
 
         task.add_detail('Ending group of steps: {} of {}\n'.format(
-            count, len(list_of_groups_of_steps))
+            count, len(compiled_groups))
         )
 
     for database in databases: